@@ -8,58 +8,418 @@ MIBs and commands.
 """
 
 import sys
-import math
 import time
+import errno
 import select
 import socket
 import string
+import struct
 import logging
 import traceback
+from collections import OrderedDict
 
 try:
     from cStringIO import StringIO
 except ImportError:
     from io import StringIO
     
-from datetime import datetime, timezone
 
 __version__ = "0.3"
-__all__ = ['MCS_RCV_BYTES', 'getTime', 'Communicate']
+__all__ = ['MCS_RCV_BYTES', 'MCS_MAX_DATA_BYTES', 'getTime', 'getMonotonicTime', 'decodePacket', 'encodeResponse', 'MIBDispatcher', 'ResponseCache', 'Communicate']
 
 
 # Maximum number of bytes to receive from MCS
 MCS_RCV_BYTES = 16*1024
 
 
+# Default maximum number of datagrams to read from the socket each time it
+# becomes readable
+MCS_BURST_BUDGET = 64
+
+
+# Default size and time window for the cache of recent responses that is used
+# to answer retransmitted commands
+MCS_DEDUP_ENTRIES = 256
+MCS_DEDUP_WINDOW = 30.0     # seconds
+
+
+# Socket option for reporting the number of datagrams dropped by the kernel.
+# This is only available on Linux and not every Python exposes the constant.
+try:
+    SO_RXQ_OVFL = socket.SO_RXQ_OVFL
+except AttributeError:
+    SO_RXQ_OVFL = 40 if sys.platform.startswith('linux') else None
+
+
+# Maximum size of the data section of a response.  This is limited both by
+# MCS_RCV_BYTES less the 46 byte header and by the four digit data length
+# field in the header.
+MCS_MAX_DATA_BYTES = min([MCS_RCV_BYTES - 46, 9999 - 8])
+
+
+# Fixed-width fields at the start of an MCS packet:  destination, sender,
+# command, reference, data length, MJD, and MPM.  The header is followed by a
+# single space and then the data section.
+_MCS_HEADER = struct.Struct('3s3s3s9s4s6s9s')
+MCS_HEADER_BYTES = _MCS_HEADER.size + 1
+
+
+def decodePacket(buffer):
+    """
+    Decode a MCS UDP packet stored in a bytes-like object, e.g., a memoryview
+    of a receive buffer, and return the eight-element tuple described in 
+    Communicate.parsePacket().
+    """
+    
+    destination, sender, command, reference, datalen, mjd, mpm = _MCS_HEADER.unpack_from(buffer)
+    datalen = int(datalen)
+    data = bytes(buffer[MCS_HEADER_BYTES:MCS_HEADER_BYTES+datalen])
+    
+    return (destination.decode('ascii'), sender.decode('ascii'), command.decode('ascii'), int(reference), 
+            datalen, int(mjd), int(mpm), data.decode('ascii'))
+
+
+def encodeResponse(buffer, destination, sender, command, reference, mjd, mpm, status, systemStatus, data):
+    """
+    Encode a MCS UDP response into the provided bytearray and return the 
+    number of bytes used.  'status' is True for an accepted command and False
+    for a rejected one.
+    """
+    
+    header = "%3s%3s%3s%9i%4i%6i%9i %s%7s" % (destination, sender, command, reference, 
+                                             len(data)+8, mjd, mpm, 'A' if status else 'R', systemStatus)
+    header = header.encode('ascii')
+    if not isinstance(data, bytes):
+        data = data.encode('ascii')
+        
+    nHeader = len(header)
+    nBytes = nHeader + len(data)
+    buffer[:nHeader] = header
+    buffer[nHeader:nBytes] = data
+    return nBytes
+
+
+# Cache of the current UTC day used by getTime() as a three-element tuple of
+# the MJD, the epoch time of the start of the day in ns, and the epoch time of
+# the next midnight in ns.  The tuple is replaced as a whole so that readers 
+# always see a consistent set of values.
+_DAY_CACHE = (0, 0, 0)
+
+
+# Wall clock/monotonic clock pair, in ns, used to anchor getMonotonicTime()
+_MONOTONIC_ANCHOR = (time.time_ns(), time.monotonic_ns())
+
+
+def _getTime(t):
+    """
+    Convert a UNIX timestamp in integer ns into a two-element tuple of MJD and
+    MPM.
+    """
+    
+    global _DAY_CACHE
+    
+    mjd, tDay, tNext = _DAY_CACHE
+    if t < tDay or t >= tNext:
+        # Day boundary - the MJD of the UNIX epoch is 40587 and UNIX time 
+        # has no leap seconds so every day is 86400 s
+        day = t // 86400000000000
+        mjd = 40587 + day
+        tDay = day*86400000000000
+        tNext = tDay + 86400000000000
+        _DAY_CACHE = (mjd, tDay, tNext)
+        
+    mpm = (t - tDay) // 1000000
+    
+    return (mjd, mpm)
+
+
 def getTime():
     """
     Return a two-element tuple of the current MJD and MPM.
     """
     
-    # determine current time
-    dt = datetime.now(tz=timezone.utc)
-    year        = dt.year             
-    month       = dt.month      
-    day         = dt.day    
-    hour        = dt.hour
-    minute      = dt.minute
-    second      = dt.second     
-    millisecond = dt.microsecond / 1000
+    return _getTime(time.time_ns())
+
+
+def getMonotonicTime():
+    """
+    Return a two-element tuple of the current MJD and MPM derived from the
+    monotonic clock.  This is anchored to the wall clock when the module is
+    loaded so it is not affected by later clock steps and is suitable for 
+    measuring latencies.
+    """
     
-    # compute MJD         
-    # adapted from http://paste.lisp.org/display/73536
-    # can check result using http://www.csgnetwork.com/julianmodifdateconv.html
-    a = (14 - month) // 12
-    y = year + 4800 - a          
-    m = month + (12 * a) - 3                    
-    p = day + (((153 * m) + 2) // 5) + (365 * y)   
-    q = (y // 4) - (y // 100) + (y // 400) - 32045
-    mjd = int(math.floor( (p+q) - 2400000.5))  
+    tWall, tMono = _MONOTONIC_ANCHOR
+    return _getTime(tWall + (time.monotonic_ns() - tMono))
+
+
+class MIBDispatcher(object):
+    """
+    Class for looking up the handler for a MIB entry name.  Handlers can be
+    registered for either an exact name, e.g., 'SUMMARY', or for a prefix 
+    that is followed by a parameter, e.g., 'CURRENT-R' for 'CURRENT-R1'.  
+    Exact names are stored in a dictionary and prefixes in a character trie
+    so that the cost of a lookup depends only on the length of the name and
+    not on how many entries are registered.
     
-    # compute MPM
-    mpm = int(math.floor( (hour*3600 + minute*60 + second)*1000 + millisecond ))
+    If a store is provided, i.e., an object with a get() method that returns
+    an already formatted value for a MIB entry name or None, it is checked 
+    before the handlers are called.
+    """
     
-    return (mjd, mpm)
+    def __init__(self, store=None):
+        self.store = store
+        self.exact = {}
+        self.prefixes = {}
+        self.expanders = {}
+        
+    def register(self, name, handler):
+        """
+        Register a handler for the exact MIB entry name.
+        """
+        
+        self.exact[name] = handler
+        
+    def registerPrefix(self, prefix, handler, expander=None):
+        """
+        Register a handler for all MIB entry names that start with the 
+        prefix.  When more than one prefix matches a name the longest one
+        is used.  The optional expander is a callable that takes no 
+        arguments and returns a list of the valid parameters for the prefix.
+        It is used to expand wildcard entries, e.g., 'PWR-R3-*'.
+        """
+        
+        node = self.prefixes
+        for c in prefix:
+            node = node.setdefault(c, {})
+        node[None] = (prefix, handler)
+        if expander is not None:
+            self.expanders[prefix] = expander
+        
+    def lookup(self, name):
+        """
+        Find the handler for a MIB entry name and return a two-element tuple
+        of the handler and the parameter, i.e., whatever follows a registered
+        prefix or '' for an exact match.  Returns (None, None) if there is no
+        handler for the name.
+        """
+        
+        # Exact match
+        try:
+            return self.exact[name], ''
+        except KeyError:
+            pass
+            
+        # Longest prefix match
+        best = None
+        node = self.prefixes
+        for c in name:
+            try:
+                node = node[c]
+            except KeyError:
+                break
+            if None in node:
+                best = node[None]
+        if best is None:
+            return None, None
+        prefix, handler = best
+        return handler, name[len(prefix):]
+        
+    @staticmethod
+    def _matchesStem(name, stem):
+        """
+        Return whether a MIB entry name matches a wildcard stem, i.e., the 
+        part before the '*'.  Numbers are matched as whole fields so that 
+        'PWR-R1' matches 'PWR-R1-3' but not 'PWR-R10-3'.
+        """
+        
+        if not name.startswith(stem):
+            return False
+        if len(stem) == 0 or len(name) == len(stem):
+            return True
+        return not (stem[-1].isdigit() and name[len(stem)].isdigit())
+        
+    def expand(self, name):
+        """
+        Expand a MIB entry name that may end in a '*' wildcard into a list of
+        MIB entry names.  The wildcard matches both the registered exact names
+        and, for prefixes with an expander, the parameterized names.
+        """
+        
+        if not name.endswith('*'):
+            return [name,]
+        stem = name[:-1]
+        
+        names = sorted([n for n in self.exact.keys() if self._matchesStem(n, stem)])
+        for prefix,expander in self.expanders.items():
+            if stem.startswith(prefix):
+                ## The stem is more specific than the prefix, e.g., 'PWR-R3-'
+                ## for 'PWR-R'
+                paramStem = stem[len(prefix):]
+            elif prefix.startswith(stem):
+                ## The stem is less specific than the prefix, e.g., 'PWR-' for
+                ## 'PWR-R'
+                paramStem = ''
+            else:
+                continue
+            for param in expander():
+                param = str(param)
+                if param.startswith(paramStem) and self._matchesStem(prefix+param, stem):
+                    names.append(prefix+param)
+        return names
+        
+    def dispatch(self, name):
+        """
+        Call the handler for a single MIB entry name and return its two-
+        element tuple of status and packed response.
+        """
+        
+        if self.store is not None:
+            value = self.store.get(name)
+            if value is not None:
+                return True, value
+                
+        handler, param = self.lookup(name)
+        if handler is None:
+            return False, 'Unknown MIB entry: %s' % name
+        return handler(name, param)
+        
+    def dispatchMany(self, request, maxBytes=MCS_MAX_DATA_BYTES):
+        """
+        Process a batched request of '&'-separated MIB entry names, each of 
+        which may end in a '*' wildcard, and return a two-element tuple of the
+        status and the packed response.  The response is a '&'-separated list
+        of 'NAME=value' entries for successful lookups and 'NAME!reason' 
+        entries for failed ones.  If the response would be larger than 
+        'maxBytes' the remaining entries are dropped and a final 
+        'TRUNCATED=<count>' entry reports how many were left off.  The status
+        is False only if every entry failed or no entries were requested.
+        """
+        
+        names = []
+        for name in request.split('&'):
+            name = name.strip()
+            if len(name) > 0:
+                names.extend(self.expand(name))
+        if len(names) == 0:
+            return False, 'No MIB entries requested'
+            
+        entries = []
+        size = 0
+        ngood = 0
+        for i,name in enumerate(names):
+            try:
+                status, value = self.dispatch(name)
+            except Exception as e:
+                status, value = False, str(e)
+            entry = "%s%s%s" % (name, '=' if status else '!', value)
+            
+            ## Leave room for the truncation marker if this isn't the last entry
+            reserve = 0
+            if i < len(names) - 1:
+                reserve = len("&TRUNCATED=%i" % len(names))
+            if size + len(entry) + (1 if entries else 0) + reserve > maxBytes:
+                entries.append("TRUNCATED=%i" % (len(names) - i))
+                break
+            entries.append(entry)
+            size += len(entry) + (1 if len(entries) > 1 else 0)
+            if status:
+                ngood += 1
+                
+        return (ngood > 0), '&'.join(entries)
+        
+    def names(self):
+        """
+        Return a list of the registered exact names and prefixes.
+        """
+        
+        names = list(self.exact.keys())
+        stack = [self.prefixes]
+        while len(stack) > 0:
+            node = stack.pop()
+            for c,child in node.items():
+                if c is None:
+                    names.append(child[0])
+                else:
+                    stack.append(child)
+        return names
+
+
+class ResponseCache(object):
+    """
+    Class for storing the responses to recent commands so that commands that
+    MCS retransmits can be answered without running them again.  Every 
+    command is cached, including the ones that change the state of the
+    subsystem, so that a retransmitted INI or PWR is acknowledged with the
+    original response rather than being run a second time.  A command is 
+    only considered to be a retransmission if it is identical to the 
+    original, including the reference number, MJD, MPM, and data.  The cache
+    holds at most 'maxEntries' responses, evicting the least recently used
+    first, and responses expire 'window' seconds after they are stored.
+    """
+    
+    def __init__(self, maxEntries=MCS_DEDUP_ENTRIES, window=MCS_DEDUP_WINDOW):
+        self.maxEntries = maxEntries
+        self.window = window
+        
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        
+    @staticmethod
+    def getKey(packet):
+        """
+        Return the cache key for a MCS packet stored in a bytes-like object, 
+        i.e., everything after the destination, or None if the packet is too
+        short to be a command.
+        """
+        
+        if len(packet) < MCS_HEADER_BYTES:
+            return None
+        return bytes(packet[3:])
+        
+    def get(self, key):
+        """
+        Return the stored response for the key or None if there is not one.
+        """
+        
+        if key is None or self.maxEntries <= 0:
+            return None
+            
+        try:
+            tStored, response = self.entries[key]
+        except KeyError:
+            self.misses += 1
+            return None
+            
+        if time.monotonic() - tStored > self.window:
+            del self.entries[key]
+            self.misses += 1
+            return None
+            
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return response
+        
+    def put(self, key, response):
+        """
+        Store the response for the key.
+        """
+        
+        if key is None or self.maxEntries <= 0:
+            return None
+            
+        self.entries[key] = (time.monotonic(), response)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxEntries:
+            self.entries.popitem(last=False)
+            
+    def clear(self):
+        """
+        Remove all stored responses.
+        """
+        
+        self.entries.clear()
 
 
 class Communicate(object):
@@ -78,6 +438,21 @@ class Communicate(object):
         # Setup the poller
         self.poller = None
         
+        # Packet buffers - one receive buffer per packet in a burst and one 
+        # send buffer
+        self.rcvBuffers = []
+        self.sndBuffer = bytearray(MCS_HEADER_BYTES + 8 + MCS_MAX_DATA_BYTES)
+        self.sndView = memoryview(self.sndBuffer)
+        
+        # Cache of recent responses for retransmitted commands
+        self.responseCache = ResponseCache(maxEntries=self.config['mcs'].get('dedup_entries', MCS_DEDUP_ENTRIES), 
+                                           window=self.config['mcs'].get('dedup_window', MCS_DEDUP_WINDOW))
+        
+        # Receive statistics
+        self.nReceived = 0
+        self.nDropped = 0
+        self.dropCounting = False
+        
         # Set the logger
         self.logger = logging.getLogger('__main__')
         
@@ -88,8 +463,21 @@ class Communicate(object):
         
         # Update the current configuration
         if config is not None:
-            self.config = config
+            oldConfig, self.config = self.config, config
             
+            ## Rebuild the response cache if its settings have changed
+            if getattr(self, 'responseCache', None) is not None:
+                for key in ('dedup_entries', 'dedup_window'):
+                    if oldConfig['mcs'].get(key, None) != config['mcs'].get(key, None):
+                        self.responseCache = ResponseCache(maxEntries=config['mcs'].get('dedup_entries', MCS_DEDUP_ENTRIES), 
+                                                           window=config['mcs'].get('dedup_window', MCS_DEDUP_WINDOW))
+                        break
+                        
+            ## The socket settings only take effect when the sockets are opened
+            for key in ('message_host', 'message_in_port', 'message_out_port', 'receive_buffer'):
+                if oldConfig['mcs'].get(key, None) != config['mcs'].get(key, None):
+                    logging.getLogger('__main__').warning("Change to 'mcs/%s' requires a restart to take effect", key)
+                    
     def start(self):
         """
         Start the recieve thread - send will run only when needed.
@@ -99,8 +487,10 @@ class Communicate(object):
         ## Receive
         try:
             self.socketIn =  socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            if self.config['mcs'].get('receive_buffer', None) is not None:
+                self.socketIn.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, int(self.config['mcs']['receive_buffer']))
             self.socketIn.bind(("0.0.0.0", self.config['mcs']['message_in_port']))
-            #self.socketIn.setblocking(0)
+            self.socketIn.setblocking(0)
         except socket.error as err:
             code, e = err
             self.logger.critical('Cannot bind to listening port %i: %s', self.config['mcs']['message_in_port'], str(e))
@@ -120,6 +510,16 @@ class Communicate(object):
             logging.shutdown()
             sys.exit(1)
             
+        ## Kernel drop counting
+        self.dropCounting = False
+        if SO_RXQ_OVFL is not None:
+            try:
+                self.socketIn.setsockopt(socket.SOL_SOCKET, SO_RXQ_OVFL, 1)
+                self.dropCounting = True
+            except (socket.error, OSError) as e:
+                self.logger.warning('Cannot enable kernel drop counting: %s', str(e))
+        self.logger.info('Receive buffer is %i B', self.socketIn.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF))
+        
         # Create the incoming socket poller
         self.poller = select.poll()
         self.poller.register(self.socketIn, select.POLLIN | select.POLLPRI)
@@ -137,53 +537,105 @@ class Communicate(object):
         self.socketIn.close()
         self.socketOut.close()
         
+    def _readPacket(self, slot):
+        """
+        Read a single datagram from the non-blocking receive socket into the
+        receive buffer for the specified burst slot and return a memoryview of
+        it.  Returns None if there is nothing left to read.
+        """
+        
+        while len(self.rcvBuffers) <= slot:
+            self.rcvBuffers.append(memoryview(bytearray(MCS_RCV_BYTES)))
+        buffer = self.rcvBuffers[slot]
+        
+        try:
+            if self.dropCounting:
+                nBytes, ancdata, flags, addr = self.socketIn.recvmsg_into([buffer,], socket.CMSG_SPACE(4))
+                for level,type,value in ancdata:
+                    if level == socket.SOL_SOCKET and type == SO_RXQ_OVFL and len(value) >= 4:
+                        nDropped = struct.unpack('=I', value[:4])[0]
+                        if nDropped > self.nDropped:
+                            self.logger.warning('Kernel dropped %i MCS packet(s), %i total', nDropped - self.nDropped, nDropped)
+                        self.nDropped = nDropped
+            else:
+                nBytes, addr = self.socketIn.recvfrom_into(buffer)
+        except socket.error as err:
+            if err.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                return None
+            raise
+            
+        self.nReceived += 1
+        return buffer[:nBytes]
+        
     def receiveCommand(self):
         """
         Recieve and process MCS command over the network and add it to the packet 
-        processing queue.
+        processing queue.  Each time the socket becomes readable all of the 
+        queued packets, up to the 'burst_budget' in the 'mcs' configuration 
+        section, are read and processed and then the responses are sent as a
+        batch.
         """
         
+        budget = self.config['mcs'].get('burst_budget', MCS_BURST_BUDGET)
+        
         ngood = 0
         nerr = 0
         for fd,flag in self.poller.poll(1000):
             # Read - we are only listening to one socket
-            data, addr = self.socketIn.recvfrom(MCS_RCV_BYTES)
-            try:
-                data = data.decode('ascii')
-            except AttributeError:
-                pass
+            packets = []
+            while len(packets) < budget:
+                data = self._readPacket(len(packets))
+                if data is None:
+                    break
+                packets.append(data)
                 
             # Process
-            try:
-                sender, status, command, reference, packed_data = self.processCommand(data)
-            except Exception as e:
-                nerr += 1
-                self.logger.error("processCommand failed with: %s", str(e))
-                continue
+            payloads = []
+            for data in packets:
+                ## Retransmitted commands get the original response
+                key = self.responseCache.getKey(data)
+                payload = self.responseCache.get(key)
+                if payload is not None:
+                    self.logger.debug("Answering retransmitted command from the cache")
+                    payloads.append(payload)
+                    continue
+                    
+                try:
+                    sender, status, command, reference, packed_data = self.processCommand(data)
+                except Exception as e:
+                    nerr += 1
+                    self.logger.error("processCommand failed with: %s", str(e))
+                    continue
+                    
+                try:
+                    payload = self.buildResponse(sender, status, command, reference, packed_data)
+                except Exception as e:
+                    nerr += 1
+                    self.logger.error("buildResponse failed with: %s", str(e))
+                    continue
+                self.responseCache.put(key, payload)
+                payloads.append(payload)
                 
             # Respond
-            try:
-                self.sendResponse(sender, status, command, reference, packed_data)
-            except Exception as e:
-                nerr += 1
-                self.logger.error("sendResponse failed with: %s", str(e))
-                continue
+            for payload in payloads:
+                try:
+                    self.socketOut.sendto(payload, self.destAddress)
+                    self.logger.debug("mcsSend - Sent to MCS '%s'", payload)
+                except Exception as e:
+                    nerr += 1
+                    self.logger.error("sendResponse failed with: %s", str(e))
+                    continue
+                    
+                # Increment
+                ngood += 1
                 
-            # Increment
-            ngood += 1
-            
         return ngood, nerr
-                
-    def sendResponse(self, destination, status, command, reference, data):
+        
+    def buildResponse(self, destination, status, command, reference, data):
         """
-        Send a response to MCS via UDP.
+        Build a response to MCS and return it as bytes.
         """
         
-        if status:
-            response = 'A'
-        else:
-            response = 'R'
-            
         # Set the sender
         sender = self.SubSystemInstance.subSystem
         
@@ -193,15 +645,22 @@ class Communicate(object):
         # Get the current system status
         systemStatus = self.SubSystemInstance.currentState['status']
         
-        # Build the payload
-        payload = "%3s%3s%3s%9i" % (destination, sender, command, reference)
-        payload += "%4i%6i%9i" % (len(data)+8, mjd, mpm)
-        payload += ' ' + response + ("%7s" % systemStatus) + data
-        try:
-            payload = bytes(payload, 'ascii')
-        except TypeError:
-            pass
-            
+        # Build the payload - oversized responses get their own buffer
+        buffer, view = self.sndBuffer, self.sndView
+        if MCS_HEADER_BYTES + 8 + len(data) > len(buffer):
+            buffer = bytearray(MCS_HEADER_BYTES + 8 + len(data))
+            view = memoryview(buffer)
+        nBytes = encodeResponse(buffer, destination, sender, command, reference, 
+                                mjd, mpm, status, systemStatus, data)
+        return view[:nBytes].tobytes()
+        
+    def sendResponse(self, destination, status, command, reference, data):
+        """
+        Send a response to MCS via UDP.
+        """
+        
+        payload = self.buildResponse(destination, status, command, reference, data)
+        
         bytes_sent = self.socketOut.sendto(payload, self.destAddress)
         self.logger.debug("mcsSend - Sent to MCS '%s'", payload)
         return True
@@ -218,8 +677,14 @@ class Communicate(object):
           6. MJD
           7. MPM
           8. Data section
+          
+        The packet can either be a string or a bytes-like object, e.g., a 
+        memoryview of the receive buffer.
         """
         
+        if not isinstance(data, str):
+            return decodePacket(data)
+            
         destination = data[:3]
         sender      = data[3:6]
         command     = data[6:9]
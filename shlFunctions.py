@@ -5,19 +5,25 @@ turning on/off ports, etc.)
 """
 
 import os
+import json
 import time
 import logging
+import itertools
 import threading
 from functools import reduce
+from contextlib import contextmanager
+from collections import OrderedDict, deque, namedtuple
+from datetime import datetime
 
 from pysnmp.entity.rfc3413.oneliner import cmdgen
 
 from shlThreads import *
+from shlThreads import STATE_DIR
 from shlBard import *
 from shlQube import *
 
 __version__ = "0.5"
-__all__ = ["commandExitCodes", "isHalfIncrements", "ShippingContainer"]
+__all__ = ["commandExitCodes", "RACK_MIBS", "UPS_MIBS", "WEATHER_MIBS", "isHalfIncrements", "StateSnapshot", "SystemState", "ConditionRegistry", "EventQueue", "MIBStore", "TemperatureTracker", "ShippingContainer"]
 
 
 shlFunctionsLogger = logging.getLogger('__main__')
@@ -39,6 +45,44 @@ commandExitCodes = {0x00: 'Process accepted without error',
                     0x09: 'Subsystem needs to be initialized'}
 
 
+# MIB entries that are reported through one of the ShippingContainer get* 
+# methods.  Each entry is a four-element tuple of the MIB name, the name of the
+# method, the value to report if the method returns None, and the format for 
+# the value.  Rack-based entries take the rack number as their argument.
+RACK_MIBS = (('PORTS-AVAILABLE-R', 'getOutletCount',    'UNK', '%s'),
+             ('CURRENT-R',         'getCurrentDraw',    '0',   '%s'),
+             ('VOLTAGE-R',         'getInputVoltage',   '0',   '%s'),
+             ('FREQUENCY-R',       'getInputFrequency', '0',   '%s'),
+             ('POLL-PERIOD-R',     'getPollPeriod',     'UNK', '%.1f'),
+             ('PWR-LATENCY-R',     'getCommandLatency', 'UNK', '%.3f'))
+UPS_MIBS = (('BATCHARGE-R', 'getBatteryCharge', 'UNK', '%s'),
+            ('BATSTATUS-R', 'getBatteryStatus', 'UNK', '%s'),
+            ('OUTSOURCE-R', 'getOutputSource',  'UNK', '%s'))
+WEATHER_MIBS = (('WX-UPDATED',        'getWeatherUpdateTime',  'UNK', '%s'),
+                ('WX-TEMPERATURE',    'getOutsideTemperature', 'UNK', '%s'),
+                ('WX-HUMIDITY',       'getOutsideHumidity',    'UNK', '%s'),
+                ('WX-PRESSURE',       'getBarometricPressure', 'UNK', '%s'),
+                ('WX-WIND',           'getWind',               'UNK', '%s'),
+                ('WX-GUST',           'getGust',               'UNK', '%s'),
+                ('WX-RAINFALL-RATE',  'getRainfallRate',       'UNK', '%s'),
+                ('WX-RAINFALL-TOTAL', 'getTotalRainfall',      'UNK', '%s'))
+
+
+# Number of monitoring periods after which a value in the MIB store is 
+# considered stale
+MIB_STALE_PERIODS = 3
+
+# Length of the rolling window, in seconds, for the TEMPERATURE-MIN, 
+# TEMPERATURE-MAX, and TEMPERATURE-MEAN MIB entries
+TEMPERATURE_WINDOW = 3600.0
+
+# File that the warm-restart snapshot of the device state is saved to, how 
+# often it is saved in seconds, and the oldest snapshot that is loaded
+SNAPSHOT_FILENAME = os.path.join(STATE_DIR, 'snapshot.json')
+SNAPSHOT_PERIOD = 60.0
+SNAPSHOT_MAX_AGE = 3600.0
+
+
 def isHalfIncrements(value):
     """
     Check if a value is one half-increments, i.e., 0.0 or 0.5, or not.  Return True
@@ -52,6 +96,526 @@ def isHalfIncrements(value):
         return True
 
 
+# Immutable view of the part of the system state that is reported to MCS
+StateSnapshot = namedtuple('StateSnapshot', ['version', 'status', 'info', 'lastLog'])
+
+
+class SystemState(dict):
+    """
+    Dictionary for holding the SHL system state.  The 'status', 'info', and
+    'lastLog' entries are not stored in the dictionary itself but in an 
+    immutable StateSnapshot that is replaced as a whole on every change.  
+    Readers can call getSnapshot() to get a consistent view of all three 
+    without locking and writers that need to change more than one of them, 
+    or change them based on their current values, should use transaction().
+    """
+    
+    _snapshotKeys = ('status', 'info', 'lastLog')
+    
+    def __init__(self, *args, **kwds):
+        dict.__init__(self, *args, **kwds)
+        self._lock = threading.RLock()
+        self._snapshot = StateSnapshot(0, '', '', '')
+        
+    def __getitem__(self, key):
+        if key in self._snapshotKeys:
+            return getattr(self._snapshot, key)
+        return dict.__getitem__(self, key)
+        
+    def __setitem__(self, key, value):
+        if key in self._snapshotKeys:
+            self._publish({key: value})
+        else:
+            dict.__setitem__(self, key, value)
+            
+    def _publish(self, changes):
+        """
+        Replace the snapshot with one that includes the provided changes and 
+        return the new snapshot.
+        """
+        
+        with self._lock:
+            self._snapshot = self._snapshot._replace(version=self._snapshot.version+1, **changes)
+            return self._snapshot
+            
+    def getSnapshot(self):
+        """
+        Return the current StateSnapshot.
+        """
+        
+        return self._snapshot
+        
+    @contextmanager
+    def transaction(self):
+        """
+        Context manager that yields a dictionary of the current 'status', 
+        'info', and 'lastLog' values.  Any changes made to the dictionary are
+        published as a single new snapshot when the context exits.  Other 
+        writers are blocked while the context is active.
+        """
+        
+        with self._lock:
+            current = self._snapshot
+            state = {key: getattr(current, key) for key in self._snapshotKeys}
+            yield state
+            
+            changes = {}
+            for key in self._snapshotKeys:
+                if state[key] != getattr(current, key):
+                    changes[key] = state[key]
+            if len(changes) > 0:
+                self._publish(changes)
+
+
+class ConditionRegistry(object):
+    """
+    Class for tracking the active WARNING and ERROR conditions, keyed by MIB
+    tag, e.g., 'TEMPERATURE' or 'SUMMARY', in the order they were raised.  
+    The status and info strings reported to MCS are rendered from the 
+    registry.  At most one ERROR condition is active at a time and, while it
+    is, it is the only thing reported.
+    """
+    
+    def __init__(self):
+        self.conditions = OrderedDict()
+        
+    def __contains__(self, tag):
+        return tag in self.conditions
+        
+    def __len__(self):
+        return len(self.conditions)
+        
+    def set(self, tag, severity, description):
+        """
+        Add or update a condition.  Returns True if anything changed.
+        """
+        
+        if self.conditions.get(tag, None) == (severity, description):
+            return False
+        self.conditions[tag] = (severity, description)
+        return True
+        
+    def clear(self, tag):
+        """
+        Remove a condition.  Returns True if the condition was active.
+        """
+        
+        try:
+            del self.conditions[tag]
+            return True
+        except KeyError:
+            return False
+            
+    def clearAll(self):
+        """
+        Remove all conditions.
+        """
+        
+        self.conditions.clear()
+        
+    def getError(self):
+        """
+        Return the tag of the active ERROR condition or None if there is not
+        one.
+        """
+        
+        for tag,(severity, description) in self.conditions.items():
+            if severity == 'ERROR':
+                return tag
+        return None
+        
+    def render(self):
+        """
+        Render the active conditions as a two-element tuple of status and 
+        info.  Returns None if there are no active conditions.
+        """
+        
+        if len(self.conditions) == 0:
+            return None
+            
+        error = self.getError()
+        if error is not None:
+            return 'ERROR', "%s! %s" % (error, self.conditions[error][1])
+            
+        tags = list(self.conditions.keys())
+        descriptions = [description for severity,description in self.conditions.values()]
+        return 'WARNING', "%s! %s" % ('! '.join(tags), '; '.join(descriptions))
+
+
+class EventQueue(object):
+    """
+    Class for passing events from the monitoring threads to the single thread
+    that updates the system state.  Posting an event never blocks on the 
+    state.  An event with the same key and the same arguments as the last
+    event for that key still waiting to be processed is coalesced into it.
+    Events with different arguments are queued in order so that a condition
+    that is raised and then cleared before the handler runs is still seen by
+    the handler.  The queue also keeps statistics on its depth and on the
+    time between when an event is posted and when it is processed.
+    """
+    
+    def __init__(self):
+        self.lock = threading.Condition()
+        self.pending = OrderedDict()
+        
+        # Last pending entry for each key
+        self.latest = {}
+        self.counter = itertools.count()
+        
+        # Statistics
+        self.nPosted = 0
+        self.nCoalesced = 0
+        self.nProcessed = 0
+        self.maxDepth = 0
+        self.totalLatency = 0.0
+        self.maxLatency = 0.0
+        
+    def post(self, key, handler, *args):
+        """
+        Post an event that calls 'handler' with the provided arguments.
+        """
+        
+        with self.lock:
+            self.nPosted += 1
+            try:
+                slot = self.latest[key]
+                _, lastArgs, tPost = self.pending[slot]
+                if lastArgs == args:
+                    self.pending[slot] = (handler, args, tPost)
+                    self.nCoalesced += 1
+                    return
+            except KeyError:
+                pass
+                
+            slot = (key, next(self.counter))
+            self.latest[key] = slot
+            self.pending[slot] = (handler, args, time.time())
+            self.maxDepth = max([self.maxDepth, len(self.pending)])
+            self.lock.notify()
+                
+    def get(self, timeout=None):
+        """
+        Wait for the next event and return it as a three-element tuple of the
+        handler, the arguments, and the time it was posted.  Returns None if
+        no event arrives within the timeout.
+        """
+        
+        with self.lock:
+            if len(self.pending) == 0:
+                self.lock.wait(timeout)
+            if len(self.pending) == 0:
+                return None
+            slot, event = self.pending.popitem(last=False)
+            if self.latest.get(slot[0]) == slot:
+                del self.latest[slot[0]]
+            return event
+            
+    def done(self, tPost):
+        """
+        Record that an event posted at 'tPost' has been processed.
+        """
+        
+        latency = time.time() - tPost
+        with self.lock:
+            self.nProcessed += 1
+            self.totalLatency += latency
+            self.maxLatency = max([self.maxLatency, latency])
+            
+    def getStats(self):
+        """
+        Return a dictionary of the queue statistics.
+        """
+        
+        with self.lock:
+            meanLatency = 0.0
+            if self.nProcessed > 0:
+                meanLatency = self.totalLatency / self.nProcessed
+            return {'depth': len(self.pending), 'maxDepth': self.maxDepth, 
+                    'posted': self.nPosted, 'coalesced': self.nCoalesced, 
+                    'processed': self.nProcessed, 'meanLatency': meanLatency, 
+                    'maxLatency': self.maxLatency}
+
+
+class MIBStore(object):
+    """
+    Class for holding the formatted values of MIB entries as they are 
+    published by the monitoring threads.  Each entry records when it was last
+    updated and how long it stays valid for so that stale values are not 
+    reported.
+    """
+    
+    def __init__(self):
+        self.entries = {}
+        
+    def update(self, name, value, maxAge):
+        """
+        Store a formatted value for the MIB entry that is valid for 'maxAge'
+        seconds.
+        """
+        
+        self.entries[name] = (value, time.time(), maxAge)
+        
+    def remove(self, name):
+        """
+        Remove the MIB entry from the store.
+        """
+        
+        self.entries.pop(name, None)
+        
+    def removePrefix(self, prefix):
+        """
+        Remove all MIB entries whose names start with the prefix from the 
+        store.
+        """
+        
+        for name in list(self.entries.keys()):
+            if name.startswith(prefix):
+                self.entries.pop(name, None)
+                
+    def getNames(self, prefix=''):
+        """
+        Return a list of the names of the MIB entries in the store that start
+        with the prefix.
+        """
+        
+        return [name for name in list(self.entries.keys()) if name.startswith(prefix)]
+        
+    def clear(self):
+        """
+        Remove all MIB entries from the store.
+        """
+        
+        self.entries.clear()
+        
+    def get(self, name):
+        """
+        Return the formatted value for the MIB entry or None if there is no 
+        value or the value is stale.
+        """
+        
+        try:
+            value, tUpdate, maxAge = self.entries[name]
+        except KeyError:
+            return None
+            
+        if time.time() - tUpdate > maxAge:
+            return None
+        return value
+        
+    def preload(self, name, value, tUpdate, maxAge):
+        """
+        Store a formatted value for the MIB entry that was updated at 'tUpdate'
+        by a previous instance of SHL.  The value keeps its original age and
+        is valid for 'maxAge' seconds from now so that it is reported until a
+        new value is published.
+        """
+        
+        self.entries[name] = (value, tUpdate, (time.time() - tUpdate) + maxAge)
+        
+    def getEntries(self):
+        """
+        Return a list of (name, value, update time, maximum age) tuples for all
+        of the MIB entries that are not stale.
+        """
+        
+        tNow = time.time()
+        return [(name, value, tUpdate, maxAge) for name,(value,tUpdate,maxAge) in list(self.entries.items()) if tNow - tUpdate <= maxAge]
+        
+    def getAge(self, name):
+        """
+        Return how long ago in seconds the MIB entry was updated or None if 
+        there is no value.
+        """
+        
+        try:
+            value, tUpdate, maxAge = self.entries[name]
+        except KeyError:
+            return None
+            
+        return time.time() - tUpdate
+
+
+class TemperatureTracker(object):
+    """
+    Class for keeping the shelter temperatures and the mean-max temperature
+    up to date as samples arrive from the temperature monitoring threads.  
+    Sensors are numbered across all of the devices using an index that is 
+    built at INI time.  The mean-max temperature is also kept over a rolling
+    window so that the minimum, maximum, and mean over the window can be 
+    reported without scanning it.  All temperatures are stored in Celsius.
+    """
+    
+    def __init__(self, window=TEMPERATURE_WINDOW):
+        self.lock = threading.RLock()
+        self.window = window
+        
+        # Sensor index
+        self.index = []
+        self.lookup = {}
+        self.values = []
+        
+        # Current mean-max temperature
+        self.meanMax = None
+        self.tMeanMax = 0.0
+        self.maxAge = 0.0
+        
+        # Rolling window as (sequence, time, value) with the monotonic queues
+        # for the minimum and maximum and the running sum for the mean
+        self.nSeq = 0
+        self.history = deque()
+        self.minQueue = deque()
+        self.maxQueue = deque()
+        self.total = 0.0
+        
+    def setDevices(self, devices):
+        """
+        Build the sensor index from a list of temperature monitoring threads.
+        Sensor numbers start at one and follow the order of the devices and 
+        then the channels on each device.  Values for devices that were 
+        already in the index are kept.
+        """
+        
+        with self.lock:
+            previous = {}
+            for (device,channel),value in zip(self.index, self.values):
+                previous[(device,channel)] = value
+                
+            self.index = []
+            self.lookup = {}
+            for device in devices:
+                self.lookup[device] = []
+                for channel in range(len(device.temp)):
+                    self.lookup[device].append(len(self.index))
+                    self.index.append((device, channel))
+            self.values = [previous.get(sensor, (None, 0.0, 0.0)) for sensor in self.index]
+            
+    def getSensorCount(self):
+        """
+        Return the number of sensors in the index.
+        """
+        
+        return len(self.index)
+        
+    def getDeviceSensors(self, device):
+        """
+        Return a list of the sensor numbers that belong to a device.
+        """
+        
+        return [s+1 for s in self.lookup.get(device, [])]
+        
+    def update(self, device, maxAge):
+        """
+        Update the sensors that belong to a device with its latest values, 
+        where the values are valid for 'maxAge' seconds.  Returns False if the
+        device is not in the sensor index, True otherwise.
+        """
+        
+        with self.lock:
+            try:
+                sensors = self.lookup[device]
+            except KeyError:
+                return False
+                
+            tNow = time.time()
+            for s in sensors:
+                value = None
+                if device.alive.isSet():
+                    value = device.getTemperature(self.index[s][1], DegreesF=False)
+                self.values[s] = (value, tNow, maxAge)
+                
+            # Recompute the mean-max temperature from all of the sensors that
+            # have a current value
+            temps = [value for value,tUpdate,age in self.values if value is not None and tNow - tUpdate <= age]
+            if len(temps) == 0:
+                self.meanMax = None
+                return True
+                
+            if max(temps) - min(temps) > 10*5/9.:
+                self.meanMax = max(temps)
+            else:
+                self.meanMax = sum(temps) / len(temps)
+            self.tMeanMax = tNow
+            self.maxAge = maxAge
+            
+            # Add it to the window
+            tMono = time.monotonic()
+            entry = (self.nSeq, tMono, self.meanMax)
+            self.nSeq += 1
+            
+            self.history.append(entry)
+            self.total += self.meanMax
+            while len(self.minQueue) > 0 and self.minQueue[-1][2] >= self.meanMax:
+                self.minQueue.pop()
+            self.minQueue.append(entry)
+            while len(self.maxQueue) > 0 and self.maxQueue[-1][2] <= self.meanMax:
+                self.maxQueue.pop()
+            self.maxQueue.append(entry)
+            
+            # Expire anything that has fallen out of the window
+            while tMono - self.history[0][1] > self.window:
+                old = self.history.popleft()
+                self.total -= old[2]
+                if self.minQueue[0][0] == old[0]:
+                    self.minQueue.popleft()
+                if self.maxQueue[0][0] == old[0]:
+                    self.maxQueue.popleft()
+                    
+            return True
+            
+    @staticmethod
+    def _convert(value, DegreesF=True):
+        """
+        Convert a temperature in Celsius to the requested units.
+        """
+        
+        if value is None:
+            return None
+        if DegreesF:
+            return 1.8*value + 32
+        return value
+        
+    def getSensor(self, sensor, DegreesF=True):
+        """
+        Return the current temperature for a sensor or None if there is no 
+        current value.  Raises an IndexError if the sensor number is not in 
+        the index.
+        """
+        
+        if sensor < 1:
+            raise IndexError("Invalid sensor number %i" % sensor)
+            
+        value, tUpdate, maxAge = self.values[sensor-1]
+        if time.time() - tUpdate > maxAge:
+            return None
+        return self._convert(value, DegreesF=DegreesF)
+        
+    def getMeanMax(self, DegreesF=True):
+        """
+        Return the current mean-max temperature or None if there is no current
+        value.
+        """
+        
+        with self.lock:
+            if self.meanMax is None or time.time() - self.tMeanMax > self.maxAge:
+                return None
+            return self._convert(self.meanMax, DegreesF=DegreesF)
+            
+    def getWindow(self, DegreesF=True):
+        """
+        Return the minimum, maximum, and mean of the mean-max temperature over
+        the rolling window as a three-element tuple.  Returns None if there are
+        no values in the window.
+        """
+        
+        with self.lock:
+            if len(self.history) == 0:
+                return None
+                
+            return (self._convert(self.minQueue[0][2], DegreesF=DegreesF), 
+                    self._convert(self.maxQueue[0][2], DegreesF=DegreesF), 
+                    self._convert(self.total / len(self.history), DegreesF=DegreesF))
+
+
 class ShippingContainer(object):
     """
     Class for interacting with the Shelter subsystem.
@@ -69,10 +633,11 @@ class ShippingContainer(object):
         self.version = str(__version__)
         
         # SHL system state
-        self.currentState = {}
-        self.currentState['status'] = 'SHUTDWN'
-        self.currentState['info'] = 'Need to INI SHL'
-        self.currentState['lastLog'] = 'Welcome to SHL S/N %s, version %s' % (self.serialNumber, self.version)
+        self.currentState = SystemState()
+        with self._updateState() as state:
+            state['status'] = 'SHUTDWN'
+            state['info'] = 'Need to INI SHL'
+            state['lastLog'] = 'Welcome to SHL S/N %s, version %s' % (self.serialNumber, self.version)
         
         ## Operational state
         self.currentState['ready'] = False
@@ -84,6 +649,9 @@ class ShippingContainer(object):
         self.currentState['unreachableDevices'] = {}
         
         ## Monitoring and background threads
+        self.devices = {}
+        self.deviceConfigs = {}
+        self.pollingConfig = None
         self.currentState['tempThreads'] = None
         self.currentState['enviroThread'] = None
         self.currentState['pduThreads'] = None
@@ -91,6 +659,35 @@ class ShippingContainer(object):
         self.currentState['strikeThread'] = None
         self.currentState['outageThread'] = None
         
+        ## Active warning and error conditions
+        self.conditions = ConditionRegistry()
+        
+        ## Set when a SHT has finished
+        self.shutdownComplete = threading.Event()
+        
+        ## Power sequencing state
+        self.sequenceLock = threading.Lock()
+        self.sequence = None
+        
+        ## MIB values published by the monitoring threads
+        self.mibStore = MIBStore()
+        
+        ## Shelter temperatures indexed across all of the temperature sensors
+        self.temperatures = TemperatureTracker()
+        
+        ## Events from the monitoring threads and the thread that processes them
+        self.events = EventQueue()
+        self.eventThread = threading.Thread(target=self._processEvents)
+        self.eventThread.setDaemon(1)
+        self.eventThread.start()
+        
+        ## Warm-restart snapshot of the device state
+        self.restored = {}
+        self.loadSnapshot()
+        self.snapshotThread = threading.Thread(target=self._checkpointSnapshot)
+        self.snapshotThread.setDaemon(1)
+        self.snapshotThread.start()
+        
         # Update the configuration
         self.updateConfig()
         
@@ -103,6 +700,107 @@ class ShippingContainer(object):
             self.config = config
         return True
         
+    @staticmethod
+    def validateConfig(config):
+        """
+        Check that a configuration has all of the sections and device settings
+        that SHL needs.  Raises a ValueError describing the first problem 
+        found.
+        """
+        
+        for section in ('mcs', 'hvac', 'thermometers', 'enviromux', 'pdus', 'weather', 'lightning', 'outage'):
+            if section not in config:
+                raise ValueError("Missing the '%s' section" % section)
+                
+        for key in ('message_host', 'message_in_port', 'message_out_port'):
+            if key not in config['mcs']:
+                raise ValueError("Missing 'mcs/%s'" % key)
+        for key in ('temp_min', 'temp_max', 'diff_min', 'diff_max'):
+            if key not in config['hvac']:
+                raise ValueError("Missing 'hvac/%s'" % key)
+        for section in ('thermometers', 'enviromux'):
+            for key in ('warning_temp', 'critical_temp', 'critical_list'):
+                if key not in config[section]:
+                    raise ValueError("Missing '%s/%s'" % (section, key))
+                    
+        for section,required in (('thermometers', ('type', 'nsensor')), ('enviromux', ('sensor_list',)), ('pdus', ('type',))):
+            if 'monitor_period' not in config[section] or 'devices' not in config[section]:
+                raise ValueError("Missing '%s/monitor_period' or '%s/devices'" % (section, section))
+            if float(config[section]['monitor_period']) <= 0:
+                raise ValueError("Invalid '%s/monitor_period'" % section)
+            for k,v in config[section]['devices'].items():
+                for key in ('ip', 'port', 'security_model', 'description') + required:
+                    if key not in v:
+                        raise ValueError("Missing '%s/devices/%s/%s'" % (section, k, key))
+                        
+        for key in ('monitor_period', 'database'):
+            if key not in config['weather']:
+                raise ValueError("Missing 'weather/%s'" % key)
+        for section in ('lightning', 'outage'):
+            for key in ('ip', 'port'):
+                if key not in config[section]:
+                    raise ValueError("Missing '%s/%s'" % (section, key))
+                    
+        if config.get('polling', {}).get('engine', 'threads') not in ('threads', 'asyncio'):
+            raise ValueError("Unknown polling engine '%s'" % config['polling']['engine'])
+        if config.get('polling', {}).get('engine', 'threads') == 'asyncio' and not isAsyncPollingAvailable():
+            raise ValueError("The 'asyncio' polling engine is not supported by the installed pysnmp")
+            
+    def reload(self, config):
+        """
+        Validate and apply a new configuration while SHL is running.  Only the
+        monitoring threads whose configuration changed are rebuilt.  If SHL 
+        has not been initialized then the new configuration is used by the
+        next INI.  The outcome is recorded in currentState['lastLog'].
+        
+        .. note::
+            This is the only path where the incremental rebuild keeps the
+            readings of the unchanged monitors.  INI can only follow a SHT,
+            which stops every monitor and clears the MIB store, so INI 
+            restarts every monitor and republishes from scratch.
+        """
+        
+        # Check for other operations in progress that could be blocking (INI, SHT, or RELOAD)
+        if 'INI' in self.currentState['activeProcess'] or 'SHT' in self.currentState['activeProcess'] or 'RELOAD' in self.currentState['activeProcess']:
+            shlFunctionsLogger.warning("Configuration reload rejected due to process list %s", ' '.join(self.currentState['activeProcess']))
+            self.currentState['lastLog'] = 'RELOAD: %s - %s is active and blocking' % (commandExitCodes[0x07], self.currentState['activeProcess'])
+            return False
+            
+        # Validate the new configuration
+        try:
+            self.validateConfig(config)
+        except (ValueError, TypeError, AttributeError) as e:
+            shlFunctionsLogger.error("Configuration reload rejected: %s", str(e))
+            self.currentState['lastLog'] = 'RELOAD: rejected - %s' % str(e)
+            return False
+            
+        tStart = time.time()
+        self.currentState['activeProcess'].append('RELOAD')
+        
+        try:
+            # Update the configuration
+            self.updateConfig(config=config)
+            
+            # Rebuild and restart any devices that have changed
+            nChanged = 0
+            if self.currentState['ready']:
+                restartPolled, changed = self._updateDevices()
+                self._startDevices(restartPolled)
+                nChanged = len(changed)
+                
+            self.currentState['lastLog'] = 'RELOAD: finished in %.3f s, %i monitor(s) rebuilt' % (time.time() - tStart, nChanged)
+            shlFunctionsLogger.info("Finished the configuration reload in %.3f s, %i monitor(s) rebuilt", time.time() - tStart, nChanged)
+            
+        except Exception as e:
+            shlFunctionsLogger.error("Configuration reload failed: %s", str(e))
+            self.currentState['lastLog'] = 'RELOAD: failed - %s' % str(e)
+            return False
+            
+        finally:
+            self.currentState['activeProcess'].remove('RELOAD')
+            
+        return True
+        
     def getState(self):
         """
         Return the current system state as a dictionary.
@@ -110,13 +808,29 @@ class ShippingContainer(object):
         
         return self.currentState
         
+    def getSnapshot(self):
+        """
+        Return a consistent, immutable snapshot of the current status, info,
+        and last log entry as a StateSnapshot.
+        """
+        
+        return self.currentState.getSnapshot()
+        
+    def _updateState(self):
+        """
+        Return a context manager for atomically updating the status, info, and
+        last log entry.  See SystemState.transaction().
+        """
+        
+        return self.currentState.transaction()
+        
     def ini(self, data, config=None):
         """
         Initialize SHL (in a separate thread).
         """
         
-        # Check for other operations in progress that could be blocking (INI or SHT)
-        if 'INI' in self.currentState['activeProcess'] or 'SHT' in self.currentState['activeProcess']:
+        # Check for other operations in progress that could be blocking (INI, SHT, or RELOAD)
+        if 'INI' in self.currentState['activeProcess'] or 'SHT' in self.currentState['activeProcess'] or 'RELOAD' in self.currentState['activeProcess']:
             shlFunctionsLogger.warning("INI command rejected due to process list %s", ' '.join(self.currentState['activeProcess']))
             self.currentState['lastLog'] = 'INI: %s - %s is active and blocking' % (commandExitCodes[0x07], self.currentState['activeProcess'])
             return False, 0x07
@@ -171,88 +885,15 @@ class ShippingContainer(object):
         
         # Update system state
         self.currentState['ready'] = False
-        self.currentState['status'] = 'BOOTING'
-        self.currentState['info'] = 'Running INI sequence'
+        with self._updateState() as state:
+            state['status'] = 'BOOTING'
+            state['info'] = 'Running INI sequence'
+            self.conditions.clearAll()
         self.currentState['activeProcess'].append('INI')
         
-        # Stop all threads.  If the don't exist yet, create them.
-        ## Enviromenal monitor
-        if self.currentState['enviroThread'] is not None:
-            self.currentState['enviroThread'].stop()
-        else:
-            self.currentState['enviroThread'] = None
-            for c,k in enumerate(sorted(self.config['enviromux']['devices'].keys())):
-                v = self.config['enviromux']['devices'][k]
-                
-                nT = EnviroMux(v['ip'], v['port'], cmdgen.CommunityData(*v['security_model']),
-                               c+1, sensorList=v['sensor_list'], description=v['description'], 
-                               MonitorPeriod=self.config['enviromux']['monitor_period'], SHLCallbackInstance=self)
-                self.currentState['enviroThread'] = nT
-                break
-        ## Temperature
-        if self.currentState['tempThreads'] is not None:
-            for t in self.currentState['tempThreads']:
-                t.stop()
-        else:
-            self.currentState['tempThreads'] = []
-            for c,k in enumerate(sorted(self.config['thermometers']['devices'].keys())):
-                v = self.config['thermometers']['devices'][k]
-                
-                ### Figure out the thermometer type
-                if v['type'] == 'Comet':
-                    ThermoBaseType = Comet
-                else:
-                    ThermoBaseType = HWg
-                    
-                nT = ThermoBaseType(v['ip'], v['port'], cmdgen.CommunityData(*v['security_model']),
-                                c+1, nSensors=v['nsensor'], description=v['description'], 
-                                MonitorPeriod=self.config['thermometers']['monitor_period'], SHLCallbackInstance=self)
-                self.currentState['tempThreads'].append(nT)
-        ## PDUs
-        if self.currentState['pduThreads'] is not None:
-            for t in self.currentState['pduThreads']:
-                t.stop()
-        else:
-            self.currentState['pduThreads'] = []
-            for c,k in enumerate(sorted(self.config['pdus']['devices'].keys())):
-                v = self.config['pdus']['devices'][k]
-                
-                ### Figure out the PDU type
-                if v['type'] == 'TrippLite':
-                    PDUBaseType = TrippLite
-                elif v['type'] == 'TrippLiteUPS':
-                    PDUBaseType = TrippLiteUPS
-                elif v['type'] == 'Raritan':
-                    PDUBaseType = Raritan
-                elif v['type'] == 'Dominion':
-                    PDUBaseType = Dominion
-                elif v['type'] == 'APC':
-                    PDUBaseType = APC
-                else:
-                    PDUBaseType = APCUPS
-                    
-                nP = PDUBaseType(v['ip'], v['port'], cmdgen.CommunityData(*v['security_model']),
-                                 c+1, nOutlets=v['noutlet'], description=v['description'], 
-                                 MonitorPeriod=self.config['pdus']['monitor_period'], SHLCallbackInstance=self)
-                                
-                self.currentState['pduThreads'].append(nP)
-        ## Weather station
-        if self.currentState['wxThread'] is not None:
-            self.currentState['wxThread'].stop()
-        else:
-            self.currentState['wxThread'] = Weather(self.config, MonitorPeriod=self.config['weather']['monitor_period'],
-                                                    SHLCallbackInstance=self)
-        ## Lightning monitor
-        if self.currentState['strikeThread'] is not None:
-            self.currentState['strikeThread'].stop()
-        else:
-            self.currentState['strikeThread'] = Lightning(self.config, SHLCallbackInstance=self)
-        ## Line voltage monitor
-        if self.currentState['outageThread'] is not None:
-            self.currentState['outageThread'].stop()
-        else:
-            self.currentState['outageThread'] = Outage(self.config, SHLCallbackInstance=self)
-            
+        # Rebuild the devices whose configuration has changed
+        restartPolled, changed = self._updateDevices()
+        
         # Set configuration values
         self.currentState['setPoint'] = setPoint
         self.currentState['diffPoint'] = diffPoint
@@ -297,25 +938,20 @@ class ShippingContainer(object):
             if diffPoint is not None:
                 self.currentState['diffPoint'] = diffPoint
                 
-        # Start the monitoring threads back up
-        if self.currentState['enviroThread'] is not None:
-            self.currentState['enviroThread'].start()
-        for t in self.currentState['tempThreads']:
-            t.start()
-        for t,p in zip(self.currentState['pduThreads'], self.currentState['rackPresent']):
-            if p:
-                t.start()
-        if self.config['weather']['monitor_period'] > 0:
-            self.currentState['wxThread'].start()
-        self.currentState['strikeThread'].start()
-        self.currentState['outageThread'].start()
+        # Start the monitoring threads
+        self._startDevices(restartPolled)
         
         # Update the current state
         self.currentState['ready'] = True
-        self.currentState['status'] = 'NORMAL'
-        self.currentState['info'] = 'SHL ready'
+        with self._updateState() as state:
+            state['status'] = 'NORMAL'
+            state['info'] = 'SHL ready'
+            self.conditions.clearAll()
         self.currentState['lastLog'] = 'INI: finished in %.3f s' % (time.time() - tStart,)
         
+        # Restore anything left from the warm-restart snapshot
+        self._applySnapshot()
+        
         shlFunctionsLogger.info("Finished the INI process in %.3f s", time.time() - tStart)
         self.currentState['activeProcess'].remove('INI')
         
@@ -326,8 +962,8 @@ class ShippingContainer(object):
         Issue the SHT command to SHL.
         """
         
-        # Check for other operations in progress that could be blocking (INI and SHT)
-        if 'INI' in self.currentState['activeProcess'] or 'SHT' in self.currentState['activeProcess']:
+        # Check for other operations in progress that could be blocking (INI, SHT, and RELOAD)
+        if 'INI' in self.currentState['activeProcess'] or 'SHT' in self.currentState['activeProcess'] or 'RELOAD' in self.currentState['activeProcess']:
             self.currentState['lastLog'] = 'SHT: %s - %s is active and blocking' % (commandExitCodes[0x07], self.currentState['activeProcess'])
             return False, 0x07
         
@@ -341,11 +977,321 @@ class ShippingContainer(object):
             #self.currentState['lastLog'] = 'SHT: %s' % commandExitCodes[0x09]
             #return False, 0x09
         
+        self.shutdownComplete.clear()
         thread = threading.Thread(target=self.__shtProcess, kwargs={'mode': mode})
         thread.setDaemon(1)
         thread.start()
         return True, 0
         
+    def waitForShutdown(self, timeout=None):
+        """
+        Wait for a SHT to finish.  Returns True if it has finished, False if
+        the timeout expired first.
+        """
+        
+        return self.shutdownComplete.wait(timeout)
+        
+    def shutdown(self, mode='', timeout=None):
+        """
+        Run SHT and wait for it to finish.  If an INI or RELOAD is in progress
+        the SHT is retried until it is accepted and, if a SHT is already 
+        running, that one is waited on instead.  Returns True if the shutdown
+        finished and False if the SHT was rejected or the timeout expired 
+        first.
+        """
+        
+        tStart = time.time()
+        while 'SHT' not in self.currentState['activeProcess']:
+            status, exitCode = self.sht(mode=mode)
+            if status:
+                break
+            if exitCode != 0x07:
+                return False
+            if timeout is not None and time.time() - tStart > timeout:
+                shlFunctionsLogger.error("SHT still blocked by %s after %.1f s", ' '.join(self.currentState['activeProcess']), timeout)
+                return False
+            time.sleep(0.1)
+            
+        if timeout is not None:
+            timeout = max([0.0, timeout - (time.time() - tStart)])
+        return self.waitForShutdown(timeout)
+        
+    def _updateDevices(self):
+        """
+        Compare the device configurations with the ones the monitoring threads 
+        were built with, stop and rebuild the threads that changed, and update
+        the lists of threads in currentState.  Returns a two-element tuple of 
+        whether or not the polling engine changed, which means that all polled
+        devices need to be restarted, and a list of the rebuilt devices.
+        
+        .. note::
+            Unchanged monitors only keep their readings and published values
+            when this is called from reload().  When called from INI, the SHT
+            before it has already stopped every monitor and cleared the MIB 
+            store so the unchanged monitors are restarted by _startDevices()
+            and publish again on their first poll.
+        """
+        
+        # Figure out which devices have changed since they were built
+        deviceConfigs = self._getDeviceConfigs(self.config)
+        pollingConfig = self.config.get('polling', {})
+        restartPolled = (pollingConfig != self.pollingConfig)
+        
+        changed = [name for name in self.devices if self.deviceConfigs.get(name) != deviceConfigs.get(name)]
+        if len(changed) > 0:
+            shlFunctionsLogger.info("Rebuilding %i monitor(s) with new configurations: %s", len(changed), ', '.join(['%s/%s' % name for name in changed]))
+            
+        # Stop the devices that have changed and forget their values
+        self._runConcurrently([self.devices[name].stop for name in changed])
+        for name in changed:
+            self._forgetDevice(self.devices.pop(name))
+            
+        # Select the polling engine
+        setPollEngine(pollingConfig.get('engine', 'threads'), nWorkers=pollingConfig.get('workers', 4))
+        self.pollingConfig = pollingConfig
+        
+        # Create the devices that are new or have changed and pass the new 
+        # configuration to the rest
+        for name,(index,settings,period) in deviceConfigs.items():
+            if name not in self.devices:
+                self.devices[name] = self._buildDevice(name[0], index, settings, period)
+            elif name[1] is None:
+                self.devices[name].updateConfig(self.config)
+            elif name[0] == 'pdus':
+                self.devices[name].setPollPolicy(**self._getPollPolicy())
+        self.deviceConfigs = deviceConfigs
+        
+        ## Enviromenal monitor
+        self.currentState['enviroThread'] = None
+        for k in sorted(self.config['enviromux']['devices'].keys()):
+            self.currentState['enviroThread'] = self.devices[('enviromux', k)]
+            break
+        ## Temperature
+        self.currentState['tempThreads'] = [self.devices[('thermometers', k)] for k in sorted(self.config['thermometers']['devices'].keys())]
+        ## PDUs
+        self.currentState['pduThreads'] = [self.devices[('pdus', k)] for k in sorted(self.config['pdus']['devices'].keys())]
+        ## Weather station
+        self.currentState['wxThread'] = self.devices[('weather', None)]
+        ## Lightning monitor
+        self.currentState['strikeThread'] = self.devices[('lightning', None)]
+        ## Line voltage monitor
+        self.currentState['outageThread'] = self.devices[('outage', None)]
+        
+        return restartPolled, changed
+        
+    def _startDevices(self, restartPolled=False):
+        """
+        Start the monitoring threads that are not running and stop the PDUs 
+        for racks that are not present.  If 'restartPolled' is True then all
+        of the polled devices are restarted.
+        """
+        
+        ## Extend self.currentState['rackPresent'] for racks in shlCommon but not in the INI
+        while len(self.currentState['pduThreads']) > len(self.currentState['rackPresent']):
+            self.currentState['rackPresent'].append(0)
+            
+        # Build the shelter temperature sensor index
+        tempDevices = []
+        if self.currentState['enviroThread'] is not None:
+            tempDevices.append(self.currentState['enviroThread'])
+        tempDevices.extend(self.currentState['tempThreads'])
+        self.temperatures.setDevices(tempDevices)
+        
+        # Start the monitoring threads that are not already running.  Devices
+        # that kept running keep their current readings.
+        def startRack(pdu):
+            if pdu.discoverOutlets() is not None:
+                self._pruneOutlets(pdu)
+            pdu.start()
+            
+        def needsStart(device):
+            return (not device.alive.isSet()) or (restartPolled and not isinstance(device, (Lightning, Outage)))
+            
+        toStart = []
+        if self.currentState['enviroThread'] is not None:
+            if needsStart(self.currentState['enviroThread']):
+                toStart.append(self.currentState['enviroThread'].start)
+        for t in self.currentState['tempThreads']:
+            if needsStart(t):
+                toStart.append(t.start)
+        for t,p in zip(self.currentState['pduThreads'], self.currentState['rackPresent']):
+            if p:
+                if needsStart(t):
+                    toStart.append(lambda t=t: startRack(t))
+            elif t.alive.isSet():
+                toStart.append(t.stop)
+                self._forgetDevice(t)
+        if self.config['weather']['monitor_period'] > 0:
+            if needsStart(self.currentState['wxThread']):
+                toStart.append(self.currentState['wxThread'].start)
+        for t in (self.currentState['strikeThread'], self.currentState['outageThread']):
+            if needsStart(t):
+                toStart.append(t.start)
+        self._runConcurrently(toStart)
+        
+    @staticmethod
+    def _getDeviceConfigs(config):
+        """
+        Return a dictionary of the configuration for each monitoring thread 
+        keyed by a two-element tuple of the configuration section and the 
+        device name.  Sections with only one device, like 'weather', use None
+        for the name.  The values are three-element tuples of the device's 
+        position in its section, the device settings, and the monitoring 
+        period.
+        """
+        
+        deviceConfigs = {}
+        for section in ('enviromux', 'thermometers', 'pdus'):
+            for c,k in enumerate(sorted(config[section]['devices'].keys())):
+                deviceConfigs[(section, k)] = (c, config[section]['devices'][k], config[section]['monitor_period'])
+                ## Only one EnviroMux is supported
+                if section == 'enviromux':
+                    break
+        for section in ('weather', 'lightning', 'outage'):
+            deviceConfigs[(section, None)] = (0, config[section], config[section].get('monitor_period', None))
+        return deviceConfigs
+        
+    def _buildDevice(self, section, index, settings, period):
+        """
+        Create the monitoring thread for a device from its configuration 
+        section, its position in that section, its settings, and its 
+        monitoring period.
+        """
+        
+        v = settings
+        if section == 'enviromux':
+            return EnviroMux(v['ip'], v['port'], cmdgen.CommunityData(*v['security_model']),
+                             index+1, sensorList=v['sensor_list'], description=v['description'], 
+                             MonitorPeriod=period, SHLCallbackInstance=self)
+                             
+        elif section == 'thermometers':
+            ## Figure out the thermometer type
+            if v['type'] == 'Comet':
+                ThermoBaseType = Comet
+            else:
+                ThermoBaseType = HWg
+                
+            return ThermoBaseType(v['ip'], v['port'], cmdgen.CommunityData(*v['security_model']),
+                                  index+1, nSensors=v['nsensor'], description=v['description'], 
+                                  MonitorPeriod=period, SHLCallbackInstance=self)
+                                  
+        elif section == 'pdus':
+            ## Figure out the PDU type
+            if v['type'] == 'TrippLite':
+                PDUBaseType = TrippLite
+            elif v['type'] == 'TrippLiteUPS':
+                PDUBaseType = TrippLiteUPS
+            elif v['type'] == 'Raritan':
+                PDUBaseType = Raritan
+            elif v['type'] == 'Dominion':
+                PDUBaseType = Dominion
+            elif v['type'] == 'APC':
+                PDUBaseType = APC
+            else:
+                PDUBaseType = APCUPS
+                
+            nP = PDUBaseType(v['ip'], v['port'], cmdgen.CommunityData(*v['security_model']),
+                             index+1, nOutlets=v.get('noutlet', 8), description=v['description'], 
+                             MonitorPeriod=period, SHLCallbackInstance=self)
+            nP.setPollPolicy(**self._getPollPolicy())
+            return nP
+                               
+        elif section == 'weather':
+            return Weather(self.config, MonitorPeriod=period, SHLCallbackInstance=self)
+            
+        elif section == 'lightning':
+            return Lightning(self.config, SHLCallbackInstance=self)
+            
+        elif section == 'outage':
+            return Outage(self.config, SHLCallbackInstance=self)
+            
+        else:
+            raise ValueError("Unknown device section '%s'" % section)
+            
+    def _getPollPolicy(self):
+        """
+        Return a dictionary of the adaptive polling settings for the PDUs that
+        can be passed to PDU.setPollPolicy().
+        """
+        
+        return {'slowPeriod': self.config['pdus']['monitor_period'], 
+                'fastPeriod': self.config['pdus'].get('fast_period', None), 
+                'hold': self.config['pdus'].get('fast_hold', 60.0), 
+                'currentStep': self.config['pdus'].get('current_step', 1.0)}
+                
+    def _forgetDevice(self, device):
+        """
+        Remove the values published by a monitoring thread from the MIB store.
+        """
+        
+        if isinstance(device, PDU):
+            rack = device.id
+            for name,getter,missing,format in RACK_MIBS + UPS_MIBS:
+                self.mibStore.remove('%s%i' % (name, rack))
+            self.mibStore.removePrefix('PWR-R%i-' % rack)
+            
+        elif isinstance(device, Weather):
+            for name,getter,missing,format in WEATHER_MIBS:
+                self.mibStore.remove(name)
+                
+        elif isinstance(device, (Thermometer, EnviroMux)):
+            self.mibStore.removePrefix('TEMPERATURE')
+            if isinstance(device, EnviroMux):
+                for name in ('SMOKE', 'WATER', 'DOOR'):
+                    self.mibStore.remove(name)
+                    
+    def _pruneOutlets(self, pdu):
+        """
+        Remove the published PWR-R<rack>-<port> values for outlets that a PDU
+        no longer has, i.e., after outlet discovery found fewer outlets.
+        """
+        
+        prefix = 'PWR-R%i-' % pdu.id
+        for name in self.mibStore.getNames(prefix):
+            try:
+                port = int(name[len(prefix):])
+            except ValueError:
+                continue
+            if port not in pdu.status:
+                self.mibStore.remove(name)
+                
+    def _getMonitors(self):
+        """
+        Return a list of all of the monitoring threads that currently exist.
+        """
+        
+        monitors = []
+        for key in ('enviroThread', 'wxThread', 'strikeThread', 'outageThread'):
+            if self.currentState[key] is not None:
+                monitors.append(self.currentState[key])
+        for key in ('tempThreads', 'pduThreads'):
+            if self.currentState[key] is not None:
+                monitors.extend(self.currentState[key])
+        return monitors
+        
+    @staticmethod
+    def _runConcurrently(functions):
+        """
+        Run a list of functions, each in its own thread, and wait for all of
+        them to finish.  This is used to start and stop all of the monitoring
+        threads at once so that one slow device does not hold up the rest.
+        """
+        
+        def runner(function):
+            try:
+                function()
+            except Exception as e:
+                shlFunctionsLogger.error("Failed to run %s: %s", getattr(function, '__name__', str(function)), str(e))
+                
+        threads = []
+        for function in functions:
+            thread = threading.Thread(target=runner, args=(function,))
+            thread.setDaemon(1)
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            thread.join()
+            
     def __shtProcess(self, mode=""):
         """
         Thread base to shutdown ASP.  Update the current system state as needed.
@@ -355,42 +1301,37 @@ class ShippingContainer(object):
         tStart = time.time()
         
         # Update system state
-        self.currentState['status'] = 'SHUTDWN'
-        self.currentState['info'] = 'System is shutting down'
+        with self._updateState() as state:
+            state['status'] = 'SHUTDWN'
+            state['info'] = 'System is shutting down'
+            self.conditions.clearAll()
         self.currentState['activeProcess'].append('SHT')
         self.currentState['ready'] = False
         
+        # Stop any power sequence before it changes more outlets
+        with self.sequenceLock:
+            sequenceThread = self._abortSequence()
+        if sequenceThread is not None:
+            sequenceThread.join()
+        
         # Stop all threads.
-        ## Enviromenal monitor
-        if self.currentState['enviroThread'] is not None:
-            self.currentState['enviroThread'].stop()
-        ## Temperature
-        if self.currentState['tempThreads'] is not None:
-            for t in self.currentState['tempThreads']:
-                t.stop()
-        ## PDUs
-        if self.currentState['pduThreads'] is not None:
-            for t in self.currentState['pduThreads']:
-                t.stop()
-        ## Weather station
-        if self.currentState['wxThread'] is not None:
-            self.currentState['wxThread'].stop()
-        ## Lightning monitor
-        if self.currentState['strikeThread'] is not None:
-            self.currentState['strikeThread'].stop()
-        ## Line voltage monitor
-        if self.currentState['outageThread'] is not None:
-            self.currentState['outageThread'].stop()
-            
+        self._runConcurrently([t.stop for t in self._getMonitors()])
+        
         # Update the state
-        self.currentState['status'] = 'SHUTDWN'
-        self.currentState['info'] = 'System has been shut down'
+        with self._updateState() as state:
+            state['status'] = 'SHUTDWN'
+            state['info'] = 'System has been shut down'
         self.currentState['lastLog'] = 'System has been shut down'
+        ## Save the device state for the next start
+        self.saveSnapshot()
+        ## Forget the published MIB values now that nothing is monitored
+        self.mibStore.clear()
         ## Reset the unreachable device list
         self.currentState['unreachableDevices'] = {}
         
         shlFunctionsLogger.info("Finished the SHT process in %.3f s", time.time() - tStart)
         self.currentState['activeProcess'].remove('SHT')
+        self.shutdownComplete.set()
         
         return True, 0
         
@@ -529,6 +1470,164 @@ class ShippingContainer(object):
         
         return True, 0
         
+    def pwrSequence(self, data):
+        """
+        Issue a power sequence to SHL.  The sequence is given as:
+          SEQ <control> <delay> <step>[;<step>...]
+        where each step is a comma-separated list of <rack>-<port> outlets.  The
+        outlets in a step are changed together, with one SET per PDU and all of
+        the PDUs at once, and there is a <delay> second wait between steps to
+        limit the inrush current.  Each outlet may only appear once.  A new 
+        sequence or SHT aborts a sequence that is still running.
+        """
+        
+        # Check if we are ready
+        if not self.currentState['ready']:
+            self.currentState['lastLog'] = 'PWR: %s' % commandExitCodes[0x09]
+            return False, 0x09
+            
+        # Parse the sequence
+        try:
+            _, control, delay, steps = data.split(None, 3)
+            control = control.upper()
+            delay = float(delay)
+            steps = [[tuple(int(v) for v in outlet.split('-', 1)) for outlet in step.split(',')] for step in steps.split(';')]
+            for step in steps:
+                for outlet in step:
+                    if len(outlet) != 2:
+                        raise ValueError("Invalid outlet")
+            if delay < 0:
+                raise ValueError("Invalid delay")
+            outlets = [outlet for step in steps for outlet in step]
+            if len(set(outlets)) != len(outlets):
+                raise ValueError("Repeated outlet")
+        except ValueError:
+            shlFunctionsLogger.warning("PWR sequence rejected due to invalid arguments")
+            self.currentState['lastLog'] = 'PWR: %s' % commandExitCodes[0x06]
+            return False, 0x06
+            
+        # Validate the rack,port,control combos
+        for step in steps:
+            for rack,port in step:
+                ## Rack
+                if rack == 0 or rack > len(self.currentState['rackPresent']):
+                    shlFunctionsLogger.warning("PWR sequence rejected due to invalid rack number")
+                    self.currentState['lastLog'] = 'PWR: %s - rack' % commandExitCodes[0x03]
+                    return False, 0x03
+                if not self.currentState['rackPresent'][rack-1]:
+                    shlFunctionsLogger.warning("PWR sequence rejected due to rack #%i not present", rack)
+                    self.currentState['lastLog'] = 'PWR: %s - rack' % commandExitCodes[0x03]
+                    return False, 0x03
+                ## Port
+                if port not in self.currentState['pduThreads'][rack-1].status.keys():
+                    shlFunctionsLogger.warning("PWR sequence rejected due to invalid port number")
+                    self.currentState['lastLog'] = 'PWR: %s - port' % commandExitCodes[0x04]
+                    return False, 0x04
+        ## Control word
+        if control not in ('ON', 'OFF', 'CYC'):
+            shlFunctionsLogger.warning("PWR sequence rejected due to invalid control word")
+            self.currentState['lastLog'] = 'PWR: %s' % commandExitCodes[0x05]
+            return False, 0x05
+            
+        # Setup the sequence state, aborting any sequence that is still running
+        results = OrderedDict()
+        for step in steps:
+            for outlet in step:
+                results[outlet] = 'PENDING'
+        with self.sequenceLock:
+            previous = self._abortSequence()
+            self.sequence = {'state': 'RUNNING', 'control': control, 'step': 0, 
+                             'nStep': len(steps), 'results': results, 
+                             'abort': threading.Event(), 'thread': None}
+            sequence = self.sequence
+            
+            thread = threading.Thread(target=self.__seqProcess, args=(sequence, control, delay, steps, previous))
+            thread.setDaemon(1)
+            sequence['thread'] = thread
+            thread.start()
+        return True, 0
+        
+    def _abortSequence(self):
+        """
+        Ask the power sequence that is running, if any, to stop before its 
+        next step and return its thread.  Must be called with sequenceLock
+        held.
+        """
+        
+        if self.sequence is None or self.sequence['state'] != 'RUNNING':
+            return None
+        self.sequence['abort'].set()
+        return self.sequence['thread']
+        
+    def __seqProcess(self, sequence, control, delay, steps, previous=None):
+        """
+        Thread base for running a power sequence.
+        """
+        
+        tStart = time.time()
+        
+        # Let the sequence that this one replaced finish its current step
+        if previous is not None:
+            previous.join()
+            
+        for s,step in enumerate(steps):
+            if s > 0:
+                sequence['abort'].wait(delay)
+            if sequence['abort'].is_set():
+                break
+                
+            with self.sequenceLock:
+                sequence['step'] = s + 1
+                
+            ## Group the outlets by rack so that each PDU gets a single request
+            changes = OrderedDict()
+            for rack,port in step:
+                changes.setdefault(rack, {})[port] = control
+                
+            def runRack(rack, ports):
+                out = self.currentState['pduThreads'][rack-1].setStatusMany(ports)
+                with self.sequenceLock:
+                    for port,success in out.items():
+                        sequence['results'][(rack,port)] = 'OK' if success else 'FAILED'
+                        
+            self._runConcurrently([lambda rack=rack, ports=ports: runRack(rack, ports) for rack,ports in changes.items()])
+            
+        with self.sequenceLock:
+            aborted = sequence['abort'].is_set()
+            sequence['state'] = 'ABORTED' if aborted else 'DONE'
+            nFailed = len([r for r in sequence['results'].values() if r == 'FAILED'])
+            nPending = len([r for r in sequence['results'].values() if r == 'PENDING'])
+            
+        if aborted:
+            shlFunctionsLogger.warning("Aborted the PWR %s sequence after %.3f s with %i outlet(s) not changed", control, time.time() - tStart, nPending)
+        elif nFailed:
+            shlFunctionsLogger.warning("Finished the PWR %s sequence in %.3f s with %i failed outlet(s)", control, time.time() - tStart, nFailed)
+        else:
+            shlFunctionsLogger.info("Finished the PWR %s sequence in %.3f s", control, time.time() - tStart)
+            
+        return True, 0
+        
+    def getPowerSequence(self):
+        """
+        Return the state of the last power sequence as a two-element tuple 
+        (success, value) where success is a boolean related to if there has
+        been a sequence.  The value is a string of the form:
+          <state> <control> <step>/<steps> <rack>-<port>=<result>,...
+        where the state is one of RUNNING, DONE, or ABORTED and the result for
+        each outlet is one of PENDING, OK, or FAILED.  
+        See the currentState['lastLog'] entry for the reason for failure if 
+        the returned success value is False.
+        """
+        
+        with self.sequenceLock:
+            if self.sequence is None:
+                self.currentState['lastLog'] = 'No power sequence has been run'
+                return False, 0
+                
+            outlets = ','.join(['%i-%i=%s' % (rack, port, result) for (rack,port),result in self.sequence['results'].items()])
+            return True, '%s %s %i/%i %s' % (self.sequence['state'], self.sequence['control'], 
+                                             self.sequence['step'], self.sequence['nStep'], outlets)
+                                             
     def getMeanTemperature(self, DegreesF=True):
         """
         Return the current mean-max shelter temperature as a two-element tuple 
@@ -542,31 +1641,33 @@ class ShippingContainer(object):
         returned success value is False.
         """
         
-        temps = []
-        if self.currentState['enviroThread'] is not None:
-            if self.currentState['enviroThread'].alive.isSet():
-                for temp in self.currentState['enviroThread'].getAllTemperatures(DegreesF=DegreesF):
-                    if temp is not None:
-                        temps.append(temp)
-                        
-        for t in self.currentState['tempThreads']:
-            # Make sure the monitoring thread is running
-            if t.alive.isSet():
-                for temp in t.getAllTemperatures(DegreesF=DegreesF):
-                    if temp is not None:
-                        temps.append(temp)
-                        
-        # Make sure we have actual values to average
-        if len(temps) == 0:
+        meanMax = self.temperatures.getMeanMax(DegreesF=DegreesF)
+        
+        # Make sure we have an actual value
+        if meanMax is None:
+            self.currentState['lastLog'] = 'No temperature monitoring threads are running'
+            return False, 0
+            
+        return True, meanMax
+        
+    def getTemperatureWindow(self, statistic, DegreesF=True):
+        """
+        Return the minimum ('min'), maximum ('max'), or mean ('mean') of the 
+        mean-max shelter temperature over the last TEMPERATURE_WINDOW seconds
+        as a two-element tuple (success, value) where success is a boolean 
+        related to if the temperature values were found.  See the 
+        currentState['lastLog'] entry for the reason for failure if the 
+        returned success value is False.
+        """
+        
+        window = self.temperatures.getWindow(DegreesF=DegreesF)
+        
+        # Make sure we have actual values to look at
+        if window is None:
             self.currentState['lastLog'] = 'No temperature monitoring threads are running'
             return False, 0
             
-        if max(temps) - min(temps) > 10*(5/9. + DegreesF*4/9.):
-            meanTemp = max(temps)
-        else:
-            meanTemp = sum(temps) / len(temps)
-            
-        return True, meanTemp
+        return True, window[('min', 'max', 'mean').index(statistic)]
         
     def getTemperature(self, sensor, DegreesF=True):
         """
@@ -576,31 +1677,17 @@ class ShippingContainer(object):
         for the reason for failure if the returned success value is False.
         """
         
-        temps = []
-        if self.currentState['enviroThread'] is not None:
-            if self.currentState['enviroThread'].alive.isSet():
-                for temp in self.currentState['enviroThread'].getAllTemperatures(DegreesF=DegreesF):
-                    if temp is not None:
-                        temps.append(temp)
-                        
-        for t in self.currentState['tempThreads']:
-            # Make sure the monitoring thread is running
-            if t.alive.isSet():
-                for temp in t.getAllTemperatures(DegreesF=DegreesF):
-                    if temp is not None:
-                        temps.append(temp)
-                        
-        # Make sure we have actual values to look at
-        if len(temps) == 0:
-            self.currentState['lastLog'] = 'No temperature monitoring threads are running'
-            return False, 0
-            
         try:
-            sensorTemp = temps[sensor-1]
+            sensorTemp = self.temperatures.getSensor(sensor, DegreesF=DegreesF)
         except IndexError:
             self.currentState['lastLog'] = 'Invalid sensor number %i' % sensor
             return False, 0
             
+        # Make sure we have an actual value
+        if sensorTemp is None:
+            self.currentState['lastLog'] = 'No current temperature for sensor %i' % sensor
+            return False, 0
+            
         return True, sensorTemp
         
     def getSmokeDetected(self):
@@ -783,6 +1870,49 @@ class ShippingContainer(object):
             
         return True, self.currentState['pduThreads'][rack-1].getCurrent()
         
+    def getCommandLatency(self, rack):
+        """
+        Given a rack return the time in seconds between the last outlet command
+        and its confirmation as a two-element tuple (success, value) where 
+        success is a boolean related to if the rack was found.  The value is
+        None if no command has been confirmed.  See the 
+        currentState['lastLog'] entry for the reason for failure if the 
+        returned success value is False.
+        """
+        
+        # Check the rack number
+        if rack == 0 or rack > len(self.currentState['rackPresent']):
+            self.currentState['lastLog'] = 'Invalid rack number %i' % rack
+            return False, 0
+        if not self.currentState['rackPresent'][rack-1]:
+            self.currentState['lastLog'] = 'Rack #%i not present during INI call' % rack
+            return False, 0
+            
+        return True, self.currentState['pduThreads'][rack-1].getCommandLatency()
+        
+    def getPollPeriod(self, rack):
+        """
+        Given a rack return the current polling period in seconds of its PDU
+        as a two-element tuple (success, value) where success is a boolean 
+        related to if the period was found.  See the currentState['lastLog'] 
+        entry for the reason for failure if the returned success value is False.
+        """
+        
+        # Check the rack number
+        if rack == 0 or rack > len(self.currentState['rackPresent']):
+            self.currentState['lastLog'] = 'Invalid rack number %i' % rack
+            return False, 0
+        if not self.currentState['rackPresent'][rack-1]:
+            self.currentState['lastLog'] = 'Rack #%i not present during INI call' % rack
+            return False, 0
+            
+        # Make sure the monitoring thread is running
+        if not self.currentState['pduThreads'][rack-1].alive.isSet():
+            self.currentState['lastLog'] = 'Monitoring thread for Rack #%i is not running' % rack
+            return False, 0
+            
+        return True, self.currentState['pduThreads'][rack-1].getPollPeriod()
+        
     def getBatteryCharge(self, rack):
         """
         Given a rack return the battery charge percentage as a two-element tuple 
@@ -1079,52 +2209,446 @@ class ShippingContainer(object):
         else:
             return True, out
             
-    def processShelterTemperature(self, currTemp):
+    def _readRack(self, pdu):
+        """
+        Return a dictionary of the latest values from a PDU monitoring thread 
+        keyed by the name of the get* method in RACK_MIBS and UPS_MIBS that 
+        reports them.
+        """
+        
+        values = {'getOutletCount':    pdu.nOutlets,
+                  'getCurrentDraw':    pdu.getCurrent(),
+                  'getInputVoltage':   pdu.getVoltage(),
+                  'getInputFrequency': pdu.getFrequency(),
+                  'getPollPeriod':     pdu.getPollPeriod(),
+                  'getCommandLatency': pdu.getCommandLatency()}
+        if pdu.isUPS:
+            values['getBatteryCharge'] = pdu.getBatteryCharge()
+            values['getBatteryStatus'] = pdu.getBatteryStatus()
+            values['getOutputSource'] = pdu.getOutputSource()
+        return values
+        
+    def _readWeather(self, wx):
+        """
+        Return a dictionary of the latest values from the weather station 
+        monitoring thread keyed by the name of the get* method in WEATHER_MIBS
+        that reports them.  The values are formatted the same way as they are
+        by those methods.
+        """
+        
+        def formatted(format, value):
+            if value is None:
+                return None
+            return format % value
+            
+        updated = wx.getLastUpdateTime()
+        wind, gust, rain = wx.getWind(), wx.getGust(), wx.getPercipitation()
+        
+        # NOTE: The humidity and pressure are swapped to match 
+        #       getOutsideHumidity() and getBarometricPressure()
+        return {'getWeatherUpdateTime':  None if updated is None else updated.strftime('%Y-%m-%d %H:%M:%S'),
+                'getOutsideTemperature': formatted("%.1f", wx.getTemperature()),
+                'getOutsideHumidity':    formatted("%.2f", wx.getPressure()),
+                'getBarometricPressure': formatted("%.0f", wx.getHumidity()),
+                'getWind':               None if wind[0] is None else "%.1f mph at %i degrees" % wind,
+                'getGust':               None if gust[0] is None else "%.1f mph at %i degrees" % gust,
+                'getRainfallRate':       formatted("%.2f", rain[0]),
+                'getTotalRainfall':      formatted("%.2f", rain[1])}
+                
+    def _publishValue(self, name, value, missing, format, maxAge):
         """
-        Figure out what to do about the shelter temperature.  If things look really bad, take action.
+        Publish a formatted value to the MIB store.  A value of None is 
+        published as 'missing'.
         """
         
-        if currTemp < self.config['thermometers']['warning_temp']:
-            # Everything is OK
-            if self.currentState['status'] == 'WARNING':
-                ## From WARNING
-                in_warning, message = self._merge_states(self.currentState['info'],
-                                                         remove='TEMPERATURE')
-                if not in_warning:
-                    self.currentState['status'] = 'NORMAL'
-                self.currentState['info'] = message
+        if value is not None:
+            value = format % (value,)
+        else:
+            value = missing
+        self.mibStore.update(name, value, maxAge)
+        
+    def processSample(self, device):
+        """
+        Publish the latest values from a monitoring thread to the MIB store.
+        The values are read from the thread itself rather than through the 
+        get* methods so that publishing never changes currentState['lastLog'],
+        which is reserved for the outcome of the commands.
+        """
+        
+        try:
+            ## Samples from stopped monitoring threads, i.e., ones that were 
+            ## still queued during SHT or a reload, are not published
+            if not device.alive.isSet():
+                return False
+                
+            maxAge = MIB_STALE_PERIODS*device.MonitorPeriod
+            
+            if isinstance(device, PDU):
+                ## PDUs and UPSs - only for racks that were present during INI
+                rack = device.id
+                if rack > len(self.currentState['rackPresent']) or not self.currentState['rackPresent'][rack-1]:
+                    return False
+                    
+                mibs = RACK_MIBS
+                if device.isUPS:
+                    mibs = mibs + UPS_MIBS
+                values = self._readRack(device)
+                for name,getter,missing,format in mibs:
+                    self._publishValue('%s%i' % (name, rack), values[getter], missing, format, maxAge)
+                for port,state in sorted(device.status.items()):
+                    self._publishValue('PWR-R%i-%i' % (rack, port), state, 'UNK', '%s', maxAge)
+                    
+            elif isinstance(device, Weather):
+                ## Weather station
+                values = self._readWeather(device)
+                for name,getter,missing,format in WEATHER_MIBS:
+                    self._publishValue(name, values[getter], missing, format, maxAge)
+                    
+            elif isinstance(device, (Thermometer, EnviroMux)):
+                ## Shelter temperatures - these are numbered across all of the
+                ## sensors using the index built during INI
+                if self.temperatures.update(device, maxAge):
+                    meanMax = self.temperatures.getMeanMax()
+                    window = self.temperatures.getWindow()
+                    if window is None:
+                        window = (None, None, None)
+                    for name,value in (('TEMPERATURE', meanMax), ('TEMPERATURE-MIN', window[0]), 
+                                       ('TEMPERATURE-MAX', window[1]), ('TEMPERATURE-MEAN', window[2])):
+                        if value is not None:
+                            self.mibStore.update(name, '%.2f' % value, maxAge)
+                        else:
+                            self.mibStore.remove(name)
+                    for sensor in self.temperatures.getDeviceSensors(device):
+                        value = self.temperatures.getSensor(sensor)
+                        if value is not None:
+                            self.mibStore.update('TEMPERATURE-S%i' % sensor, '%.2f' % value, maxAge)
+                        else:
+                            self.mibStore.remove('TEMPERATURE-S%i' % sensor)
+                            
+                ## Enviromental sensors
+                if isinstance(device, EnviroMux):
+                    for name,value in (('SMOKE', device.getSmokeDetected()), ('WATER', device.getWaterDetected())):
+                        if value is not None:
+                            self.mibStore.update(name, str(value), maxAge)
+                    opened = device.getDoorOpen()
+                    if opened is not None:
+                        self.mibStore.update('DOOR', 'OPEN' if opened else 'CLOSED', maxAge)
+                        
+        except Exception as e:
+            shlFunctionsLogger.warning("Failed to publish values from %s: %s", type(device).__name__, str(e))
+            return False
+            
+        return True
+        
+    def processOutletStates(self, pdu, outlets):
+        """
+        Publish the outlet states read back after a PWR command to the MIB 
+        store.  'outlets' is a dictionary mapping outlet number to the new 
+        state and only those outlets are updated.
+        """
+        
+        try:
+            if not pdu.alive.isSet():
+                return False
                 
-                shlFunctionsLogger.info('Shelter temperature warning condition cleared')
+            rack = pdu.id
+            if rack > len(self.currentState['rackPresent']) or not self.currentState['rackPresent'][rack-1]:
+                return False
                 
-            elif self.currentState['status'] == 'ERROR' and self.currentState['info'].startswith('TEMPERATURE!'):
-                ## From ERROR
-                self.currentState['info'] = 'Error condition cleared, system operating normally'
+            maxAge = MIB_STALE_PERIODS*pdu.MonitorPeriod
+            for port,state in sorted(outlets.items()):
+                self._publishValue('PWR-R%i-%i' % (rack, port), state, 'UNK', '%s', maxAge)
                 
-                shlFunctionsLogger.info('Shelter temperature critical condition cleared')
+        except Exception as e:
+            shlFunctionsLogger.warning("Failed to publish outlet states from %s: %s", type(pdu).__name__, str(e))
+            return False
+            
+        return True
+        
+    def saveSnapshot(self):
+        """
+        Save a snapshot of the published MIB values, the unreachable device 
+        list, the recent lightning strikes, and the power flicker state to
+        SNAPSHOT_FILENAME so that they are available right away after a 
+        restart.
+        """
+        
+        snapshot = {'time': time.time()}
+        snapshot['mibs'] = self.mibStore.getEntries()
+        with ListLock:
+            snapshot['unreachable'] = dict(self.currentState['unreachableDevices'])
+            
+        strikeThread = self.currentState['strikeThread']
+        if strikeThread is not None:
+            with strikeThread.lock:
+                snapshot['strikes'] = [(t.isoformat(), dist) for t,dist in strikeThread.strikes.items()]
                 
-        elif currTemp < self.config['thermometers']['critical_temp']:
-            # We are in warning
-            if self.currentState['status'] in ('NORMAL', 'WARNING'):
-                ## Escalation
-                _, message = self._merge_states(self.currentState['info'],
-                                                append=('TEMPERATURE',
-                                                        "Shelter temperature at %.1f F" % currTemp))
-                self.currentState['status'] = 'WARNING'
-                self.currentState['info'] = message
+        outageThread = self.currentState['outageThread']
+        if outageThread is not None:
+            snapshot['flicker'] = [t.isoformat() if t is not None else None for t in (outageThread.flicker_120, outageThread.flicker_240)]
+            
+        try:
+            with open(SNAPSHOT_FILENAME+'.tmp', 'w') as fh:
+                json.dump(snapshot, fh)
+            os.replace(SNAPSHOT_FILENAME+'.tmp', SNAPSHOT_FILENAME)
+        except (OSError, IOError, TypeError, ValueError) as e:
+            shlFunctionsLogger.warning("Failed to save the state snapshot: %s", str(e))
+            return False
+            
+        return True
+        
+    def loadSnapshot(self):
+        """
+        Load the snapshot saved by saveSnapshot(), if there is one that is
+        not too old.  The MIB values are preloaded into the MIB store with 
+        their original ages.  The rest of the snapshot is held until the next
+        INI creates the devices it belongs to.
+        """
+        
+        try:
+            with open(SNAPSHOT_FILENAME, 'r') as fh:
+                snapshot = json.load(fh)
+        except (OSError, IOError, ValueError) as e:
+            return False
+            
+        if time.time() - snapshot.get('time', 0) > SNAPSHOT_MAX_AGE:
+            shlFunctionsLogger.info("Ignoring a state snapshot that is %.0f s old", time.time() - snapshot.get('time', 0))
+            return False
+            
+        try:
+            for name,value,tUpdate,maxAge in snapshot.get('mibs', []):
+                self.mibStore.preload(name, value, tUpdate, maxAge)
+                
+            self.restored = {}
+            self.restored['unreachable'] = snapshot.get('unreachable', {})
+            self.restored['strikes'] = [(datetime.fromisoformat(t), dist) for t,dist in snapshot.get('strikes', [])]
+            self.restored['flicker'] = [datetime.fromisoformat(t) if t is not None else None for t in snapshot.get('flicker', [None, None])]
+        except (TypeError, ValueError) as e:
+            shlFunctionsLogger.warning("Failed to load the state snapshot: %s", str(e))
+            self.mibStore.clear()
+            self.restored = {}
+            return False
+            
+        shlFunctionsLogger.info("Loaded a state snapshot with %i MIB values from %.0f s ago", len(snapshot.get('mibs', [])), time.time() - snapshot['time'])
+        return True
+        
+    def _applySnapshot(self):
+        """
+        Apply the parts of a loaded snapshot that belong to the devices that 
+        are created by INI.  This only happens once after a restart.
+        """
+        
+        restored, self.restored = self.restored, {}
+        if len(restored) == 0:
+            return False
+            
+        ## Lightning strikes
+        strikeThread = self.currentState['strikeThread']
+        with strikeThread.lock:
+            for t,dist in restored['strikes']:
+                strikeThread.strikes.setdefault(t, dist)
                 
-                shlFunctionsLogger.warning('Shelter temperature warning at %.1f', currTemp)
+        ## Power flickers
+        outageThread = self.currentState['outageThread']
+        if outageThread.flicker_120 is None:
+            outageThread.flicker_120 = restored['flicker'][0]
+        if outageThread.flicker_240 is None:
+            outageThread.flicker_240 = restored['flicker'][1]
+            
+        ## Unreachable devices - any device that is not reported again within
+        ## a few monitoring periods is assumed to be reachable again
+        unreachable = restored['unreachable']
+        if len(unreachable) > 0:
+            with ListLock:
+                for name,tUnreachable in unreachable.items():
+                    self.currentState['unreachableDevices'].setdefault(name, tUnreachable)
+            self.processUnreachable(None)
+            
+            grace = max([MIB_STALE_PERIODS*t.MonitorPeriod for t in self._getMonitors() if hasattr(t, 'MonitorPeriod')] + [180.0])
+            timer = threading.Timer(grace, self._expireSnapshot, args=(unreachable,))
+            timer.setDaemon(1)
+            timer.start()
+            
+        return True
+        
+    def _expireSnapshot(self, unreachable):
+        """
+        Clear the restored unreachable devices that have not been reported
+        as unreachable again since the restart.
+        """
+        
+        with ListLock:
+            expired = [name for name,tUnreachable in unreachable.items() if self.currentState['unreachableDevices'].get(name, None) == tUnreachable]
+        for name in expired:
+            self.processUnreachable('cleared-%s' % name)
+            
+    def _checkpointSnapshot(self):
+        """
+        Thread base for saving the snapshot every SNAPSHOT_PERIOD seconds while
+        SHL is running.
+        """
+        
+        while True:
+            time.sleep(SNAPSHOT_PERIOD)
+            if self.currentState['ready']:
+                self.saveSnapshot()
                 
-            elif self.currentState['status'] == 'ERROR' and self.currentState['info'].startswith('TEMPERATURE!'):
-                ## Descalation
-                _, message = self._merge_states('',
-                                                append=('TEMPERATURE',
-                                                        "Shelter temperature at %.1f F" % currTemp))
-                self.currentState['status'] = 'WARNING'
-                self.currentState['info'] = message
+    def _processEvents(self):
+        """
+        Thread base for processing the events posted by the monitoring threads.
+        """
+        
+        while True:
+            event = self.events.get(timeout=5)
+            if event is None:
+                continue
                 
-                shlFunctionsLogger.info('Shelter temperature critical condition cleared')
-                shlFunctionsLogger.warning('Shelter temperature warning at %.1f', currTemp)
+            handler, args, tPost = event
+            try:
+                handler(*args)
+            except Exception as e:
+                shlFunctionsLogger.error("Event %s%s failed with: %s", handler.__name__, str(args), str(e))
+            self.events.done(tPost)
+            
+    def getEventStats(self):
+        """
+        Return a dictionary of statistics about the event queue between the
+        monitoring threads and the system state.
+        """
+        
+        return self.events.getStats()
+        
+    def processShelterTemperature(self, currTemp, source=None):
+        """
+        Post a new shelter temperature for processing.  Temperatures from 
+        different sources are kept as separate events so that a critical 
+        reading from one device is not replaced by a normal reading from 
+        another before it is processed.
+        """
+        
+        self.events.post(('TEMPERATURE', source), self._handleShelterTemperature, currTemp)
+        
+    def processSmokeDetector(self, smokeDetected):
+        """
+        Post a new smoke detector state for processing.
+        """
+        
+        self.events.post('SMOKE', self._handleSmokeDetector, smokeDetected)
+        
+    def processWaterDetector(self, waterDetected):
+        """
+        Post a new water sensor state for processing.
+        """
+        
+        self.events.post('WATER', self._handleWaterDetector, waterDetected)
+        
+    def processDoorState(self, state):
+        """
+        Post a new door state for processing.
+        """
+        
+        self.events.post('DOOR', self._handleDoorState, state)
+        
+    def processUnreachable(self, unreachableDevice):
+        """
+        Post a change in device reachability for processing.  Both the 
+        unreachable and the cleared states of a device share the same key so
+        that repeated reports of the same state are coalesced while a change
+        of state is always processed.
+        """
+        
+        device = unreachableDevice
+        if device is not None and device.startswith('cleared-'):
+            device = device[len('cleared-'):]
+        self.events.post(('SUMMARY', device), self._handleUnreachable, unreachableDevice)
+        
+    def processPowerFlicker(self, flicker):
+        """
+        Post a new power flicker state for processing.
+        """
+        
+        self.events.post('POWER-FLICKER', self._handlePowerFlicker, flicker)
+        
+    def processPowerOutage(self, outage):
+        """
+        Post a new power outage state for processing.
+        """
+        
+        self.events.post('POWER-OUTAGE', self._handlePowerOutage, outage)
+        
+    def _raiseCondition(self, state, tag, severity, description):
+        """
+        Add or update a condition in the registry and, if anything changed,
+        re-render the status and info in 'state'.  Raising an ERROR condition
+        replaces all other active conditions.  This needs to be called from
+        within an _updateState() context.
+        """
+        
+        if severity == 'ERROR' and self.conditions.getError() != tag:
+            self.conditions.clearAll()
+        if self.conditions.set(tag, severity, description):
+            state['status'], state['info'] = self.conditions.render()
+            
+    def _clearCondition(self, state, tag, message):
+        """
+        Remove a condition from the registry and, if it was active, re-render
+        the status and info in 'state'.  If no conditions remain the status is
+        set to NORMAL and the info to 'message'.  This needs to be called from
+        within an _updateState() context.
+        """
+        
+        if self.conditions.clear(tag):
+            rendered = self.conditions.render()
+            if rendered is None:
+                state['status'] = 'NORMAL'
+                state['info'] = message
+            else:
+                state['status'], state['info'] = rendered
                 
+    def _canWarn(self, state):
+        """
+        Return whether or not a new WARNING condition can be raised given the
+        current system status.  This needs to be called from within an 
+        _updateState() context.
+        """
+        
+        return (state['status'] in ('NORMAL', 'WARNING') and self.conditions.getError() is None)
+        
+    def _handleShelterTemperature(self, currTemp):
+        """
+        Figure out what to do about the shelter temperature.  If things look really bad, take action.
+        """
+        
+        if currTemp < self.config['thermometers']['warning_temp']:
+            # Everything is OK
+            with self._updateState() as state:
+                if self.conditions.getError() == 'TEMPERATURE':
+                    ## From ERROR
+                    self._clearCondition(state, 'TEMPERATURE', 'Error condition cleared, system operating normally')
+                    shlFunctionsLogger.info('Shelter temperature critical condition cleared')
+                    
+                elif 'TEMPERATURE' in self.conditions:
+                    ## From WARNING
+                    self._clearCondition(state, 'TEMPERATURE', 'Warning condition(s) cleared, system operating normally')
+                    shlFunctionsLogger.info('Shelter temperature warning condition cleared')
+                    
+        elif currTemp < self.config['thermometers']['critical_temp']:
+            # We are in warning
+            with self._updateState() as state:
+                if self.conditions.getError() == 'TEMPERATURE':
+                    ## Descalation
+                    self.conditions.clear('TEMPERATURE')
+                    self._raiseCondition(state, 'TEMPERATURE', 'WARNING', "Shelter temperature at %.1f F" % currTemp)
+                    
+                    shlFunctionsLogger.info('Shelter temperature critical condition cleared')
+                    shlFunctionsLogger.warning('Shelter temperature warning at %.1f', currTemp)
+                    
+                elif self._canWarn(state):
+                    ## Escalation
+                    self._raiseCondition(state, 'TEMPERATURE', 'WARNING', "Shelter temperature at %.1f F" % currTemp)
+                    
+                    shlFunctionsLogger.warning('Shelter temperature warning at %.1f', currTemp)
+                    
         else:
             # We are critical, take action
             ## Find out what ports we need to shut down
@@ -1133,9 +2657,9 @@ class ShippingContainer(object):
                 criticalPortList = 'None listed'
                 
             ## Change the system state
-            self.currentState['status'] = 'ERROR'
-            self.currentState['info'] = 'TEMPERATURE! Shelter temperature at %.1f F, shutting down critical ports: %s' % (currTemp, criticalPortList)
-            
+            with self._updateState() as state:
+                self._raiseCondition(state, 'TEMPERATURE', 'ERROR', 'Shelter temperature at %.1f F, shutting down critical ports: %s' % (currTemp, criticalPortList))
+                
             ## Try to shut off the ports
             for rack,port in self.config['thermometers']['critical_list']:
                 try:
@@ -1149,82 +2673,74 @@ class ShippingContainer(object):
             
         return True
         
-    def processSmokeDetector(self, smokeDetected):
+    def _handleSmokeDetector(self, smokeDetected):
         """
         Figure out what to do about the smoke alarm going off.
         """
         
-        if not smokeDetected:
-            # Everything is OK
-            if self.currentState['status'] == 'ERROR' and self.currentState['info'].startswith('SMOKE!'):
-                self.currentState['status'] = 'NORMAL'
-                self.currentState['info'] = 'Error condition cleared, system operating normally'
+        with self._updateState() as state:
+            if not smokeDetected:
+                # Everything is OK
+                if self.conditions.getError() == 'SMOKE':
+                    self._clearCondition(state, 'SMOKE', 'Error condition cleared, system operating normally')
+                    
+                    shlFunctionsLogger.info('Shelter smoke detector condition cleared')
+                    
+            else:
+                ## Change the system state
+                self._raiseCondition(state, 'SMOKE', 'ERROR', 'Shelter smoke detector activated')
                 
-                shlFunctionsLogger.info('Shelter smoke detector condition cleared')
+                shlFunctionsLogger.critical('Shelter smoke detector activated')
                 
-        else:
-            ## Change the system state
-            self.currentState['status'] = 'ERROR'
-            self.currentState['info'] = 'SMOKE! Shelter smoke detector activated'
-            
-            shlFunctionsLogger.critical('Shelter smoke detector activated')
+            return True
             
-        return True
-        
-    def processWaterDetector(self, waterDetected):
+    def _handleWaterDetector(self, waterDetected):
         """
         Figure out what to do about the water sensor finding water.
         """
         
-        if not waterDetected:
-            # Everything is OK
-            if self.currentState['status'] == 'ERROR' and self.currentState['info'].startswith('WATER!'):
-                self.currentState['status'] = 'NORMAL'
-                self.currentState['info'] = 'Error condition cleared, system operating normally'
+        with self._updateState() as state:
+            if not waterDetected:
+                # Everything is OK
+                if self.conditions.getError() == 'WATER':
+                    self._clearCondition(state, 'WATER', 'Error condition cleared, system operating normally')
+                    
+                    shlFunctionsLogger.info('Shelter water sensor condition cleared')
+                    
+            else:
+                ## Change the system state
+                self._raiseCondition(state, 'WATER', 'ERROR', 'Shelter water sensor activated')
                 
-                shlFunctionsLogger.info('Shelter water sensor condition cleared')
+                shlFunctionsLogger.critical('Shelter water sensor activated')
                 
-        else:
-            ## Change the system state
-            self.currentState['status'] = 'ERROR'
-            self.currentState['info'] = 'WATER! Shelter water sensor activated'
-            
-            shlFunctionsLogger.critical('Shelter water sensor activated')
+            return True
             
-        return True
-        
-    def processDoorState(self, state):
+    def _handleDoorState(self, state):
         """
         Figure out what to do about the shelter temperature.  If things look really bad, take action.
         """
         
-        if state == 'closed':
-            # Everything is OK
-            if self.currentState['status'] == 'WARNING':
-                ## From WARNING
-                in_warning, message = self._merge_states(self.currentState['info'],
-                                                         remove='DOOR')
-                if not in_warning:
-                    self.currentState['status'] = 'NORMAL'
-                self.currentState['info'] = message
-                
-                shlFunctionsLogger.info('Shelter door open condition cleared')
-                
-        else:
-            # We are in warning
-            if self.currentState['status'] in ('NORMAL', 'WARNING'):
-                ## Escalation
-                _, message = self._merge_states(self.currentState['info'],
-                                                append=('DOOR',
-                                                        "Shelter door is open"))
-                self.currentState['status'] = 'WARNING'
-                self.currentState['info'] = message
-                
-                shlFunctionsLogger.warning('Shelter door open condition')
-                
-        return True
-        
-    def processUnreachable(self, unreachableDevice):
+        doorState = state
+        with self._updateState() as state:
+            if doorState == 'closed':
+                # Everything is OK
+                if 'DOOR' in self.conditions:
+                    ## From WARNING
+                    self._clearCondition(state, 'DOOR', 'Warning condition(s) cleared, system operating normally')
+                    
+                    shlFunctionsLogger.info('Shelter door open condition cleared')
+                    
+            else:
+                # We are in warning
+                if self._canWarn(state) and 'DOOR' not in self.conditions:
+                    ## Escalation
+                    self._raiseCondition(state, 'DOOR', 'WARNING', "Shelter door is open")
+                    
+                    shlFunctionsLogger.warning('Shelter door open condition')
+                    
+            return True
+            
+    def _handleUnreachable(self, unreachableDevice):
         """
         Deal with an unreachable device.
         """
@@ -1247,119 +2763,52 @@ class ShippingContainer(object):
                     self.currentState['unreachableDevices'][unreachableDevice] = tNow
                     shlFunctionsLogger.warning('Updated unreachable list - add %s', unreachableDevice)
                     
-                unreachable = ', '.join(list(self.currentState['unreachableDevices'].keys()))
-                
-        # Count the number of unreachable devices
-        nUnreachable = len(self.currentState['unreachableDevices'])
+        with ListLock:
+            unreachable = ', '.join(list(self.currentState['unreachableDevices'].keys()))
+            
+            # Count the number of unreachable devices
+            nUnreachable = len(self.currentState['unreachableDevices'])
         shlFunctionsLogger.debug('Unreachable list now contains %i entries', nUnreachable)
         
-        # If there isn't anything in the unreachable list, quietly ignore it and clear the WARNING condition
-        if nUnreachable == 0:
-            if self.currentState['status'] == 'WARNING':
-                in_warning, message = self._merge_states(self.currentState['info'],
-                                                         remove='SUMMARY')
-                if not in_warning:
-                    self.currentState['status'] = 'NORMAL'
-                self.currentState['info'] = message
-            return False
-            
-        # Otherwise set a warning
-        else:
-            if self.currentState['status'] in ('NORMAL', 'WARNING'):
-                _, message = self._merge_states(self.currentState['info'],
-                                                append=('SUMMARY',
-                                                        "%i Devices unreachable: %s" % (nUnreachable,
-                                                                                        unreachable)))
-                self.currentState['status'] = 'WARNING'
-                self.currentState['info'] = message
+        with self._updateState() as state:
+            # If there isn't anything in the unreachable list, quietly ignore it and clear the WARNING condition
+            if nUnreachable == 0:
+                self._clearCondition(state, 'SUMMARY', 'Warning condition(s) cleared, system operating normally')
+                return False
                 
-            return True
-            
-    def processPowerFlicker(self, flicker):
+            # Otherwise set a warning
+            else:
+                if self._canWarn(state):
+                    self._raiseCondition(state, 'SUMMARY', 'WARNING', "%i Devices unreachable: %s" % (nUnreachable, unreachable))
+                    
+                return True
+                
+    def _handlePowerFlicker(self, flicker):
         """
         Deal with power flickers.
         """
         
-        if flicker:
-            if self.currentState['status'] in ('NORMAL', 'WARNING'):
-                _, message = self._merge_states(self.currentState['info'],
-                                                append=('POWER-FLICKER',
-                                                        'Flicker in the shelter power'))
-                self.currentState['status'] = 'WARNING'
-                self.currentState['info'] = message
-            return True
-            
-        else:
-            if self.currentState['status'] == 'WARNING':
-                in_warning, message = self._merge_states(self.currentState['info'],
-                                                         remove='POWER-FLICKER')
-                if not in_warning:
-                    self.currentState['status'] = 'NORMAL'
-                self.currentState['info'] = message
-            return False
-            
-    def processPowerOutage(self, outage):
+        with self._updateState() as state:
+            if flicker:
+                if self._canWarn(state):
+                    self._raiseCondition(state, 'POWER-FLICKER', 'WARNING', 'Flicker in the shelter power')
+                return True
+                
+            else:
+                self._clearCondition(state, 'POWER-FLICKER', 'Warning condition(s) cleared, system operating normally')
+                return False
+                
+    def _handlePowerOutage(self, outage):
         """
         Deal with power outages.
         """
         
-        if outage:
-            self.currentState['status'] = 'ERROR'
-            self.currentState['info'] = 'POWER-OUTAGE! Shelter power outage'
-            return True
-            
-        else:
-            if self.currentState['status'] == 'ERROR' and self.currentState['info'].startswith('POWER-OUTAGE!'):
-                self.currentState['status'] = 'NORMAL'
-                self.currentState['info'] = 'Power restored, system operating normally'
-            return False
-            
-    @staticmethod
-    def _merge_states(message, append=None, remove=None):
-        """
-        Merge multiple warning conditions together and return a unified message.
-        Returns a two-element tuple of a Boolean of whether or not the message
-        is a warning message and the message itself.
-        """
-        
-        # Split it into the two parts:  MIBs and descriptions
-        mibs = message.split('!')
-        mibs, info = mibs[:-1], mibs[-1]
-        descriptions = info.split(';')
-        if len(mibs) == 0:
-            descriptions = []
-            
-        # Clean
-        mibs = [mib.strip().rstrip() for mib in mibs]
-        descriptions = [description.strip().strip() for description in descriptions]
-        
-        # Append, if needed
-        if append is not None:
-            new_mib, new_description = append
-            if new_mib not in mibs:
-                ## Add
-                mibs.append(new_mib)
-                descriptions.append(new_description)
-            else:
-                ## Replace the description
-                i = mibs.index(new_mib)
-                descriptions[i] = new_description
+        with self._updateState() as state:
+            if outage:
+                self._raiseCondition(state, 'POWER-OUTAGE', 'ERROR', 'Shelter power outage')
+                return True
                 
-        # Remove, if needed
-        if remove is not None:
-            old_mib = remove
-            try:
-                i = mibs.index(old_mib)
-                del mibs[i]
-                del descriptions[i]
-            except (ValueError, IndexError):
-                pass
-                
-        # Unify the message
-        in_warning = True
-        message = "%s! %s" % ('! '.join(mibs), '; '.join(descriptions))
-        if len(mibs) == 0:
-            in_warning = False
-            message = 'Warning condition(s) cleared, system operating normally'
-            
-        return in_warning, message
+            else:
+                if self.conditions.getError() == 'POWER-OUTAGE':
+                    self._clearCondition(state, 'POWER-OUTAGE', 'Power restored, system operating normally')
+                return False
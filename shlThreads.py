@@ -8,26 +8,81 @@ import re
 import sys
 import time
 import socket
+import select
 import logging
 import sqlite3
+import heapq
+import asyncio
 import threading
+import itertools
 import traceback
+from contextlib import contextmanager
+try:
+    import queue
+except ImportError:
+    import Queue as queue
 from datetime import datetime, timedelta, timezone
 try:
     from cStringIO import StringIO
 except ImportError:
     from io import StringIO
 
+from pysnmp import hlapi
+from pysnmp.hlapi.varbinds import CommandGeneratorVarBinds
 from pysnmp.entity.rfc3413.oneliner import cmdgen
-from pysnmp.proto import rfc1902
+from pysnmp.proto import rfc1902, rfc1905
 
 __version__ = "1.0"
-__all__ = ['Thermometer', 'Comet', 'HWg', 'EnviroMux', 'PDU', 'TrippLite', 'APC', 'Raritan', 'Dominion', 'TrippLiteUPS', 'APCUPS', 'Weather', 'Lightning', 'Outage']
+__all__ = ['Thermometer', 'Comet', 'HWg', 'EnviroMux', 'PDU', 'TrippLite', 'APC', 'Raritan', 'Dominion', 'TrippLiteUPS', 'APCUPS', 'Weather', 'Lightning', 'Outage', 'AdaptivePollPolicy', 'isAsyncPollingAvailable', 'setPollEngine']
 
 
 shlThreadsLogger = logging.getLogger('__main__')
 
 
+# Maximum number of variable bindings to pack into a single SNMP GET.  This
+# keeps the request and response for the OIDs used here well under the
+# typical 1500 byte Ethernet MTU.
+SNMP_MAX_VARBINDS = 24
+
+
+# SNMP error-status for a response that does not fit in a single message.
+# The agent does not point at a variable binding for this error so the GET
+# is split in half and both halves are sent again.
+SNMP_ERROR_TOO_BIG = 1
+
+
+# Number of worker threads used to run the device polls
+POLL_WORKERS = 4
+
+
+# Number of extra SNMP engines, beyond one per poll worker, that are shared
+# by all of the SNMPControl instances.  These are used for PWR commands and
+# the read-backs that follow them so that they do not wait on the polls.
+SNMP_SPARE_ENGINES = 2
+
+
+# Circuit breaker settings for SNMPControl.  After a transport-level failure
+# requests to a device fail immediately until the backoff expires, at which
+# point a single probe of sysUpTime.0 is sent to see if the device is back.
+# The backoff doubles after each failed probe up to the maximum.
+SNMP_BACKOFF_MIN = 15.0    # seconds
+SNMP_BACKOFF_MAX = 600.0   # seconds
+SNMP_PROBE_OID = (1,3,6,1,2,1,1,3,0)
+
+
+# Read-back of an outlet after a PWR command.  ON and OFF are confirmed
+# quickly, CYC can take several seconds for the outlet to come back on.  The
+# windows are the defaults for the PDU.readBackWindow and 
+# PDU.readBackCycWindow attributes.  The ON and OFF window also grows to 
+# READBACK_LATENCY_FACTOR times the slowest ON or OFF confirmation seen for
+# the PDU so that slow relays do not generate spurious warnings.
+READBACK_DELAY = 0.25      # seconds between reads for ON and OFF
+READBACK_WINDOW = 2.0      # seconds
+READBACK_CYC_DELAY = 1.0   # seconds between reads for CYC
+READBACK_CYC_WINDOW = 20.0 # seconds
+READBACK_LATENCY_FACTOR = 2.0
+
+
 # State directory
 STATE_DIR = os.path.join(os.path.dirname(__file__), '.shl-state')
 if not os.path.exists(STATE_DIR):
@@ -54,6 +109,13 @@ def _LogThreadException(cls, exception, logger=None):
         pass
     fnc_name = traceback.extract_tb(exc_traceback, 1)[0][2]
     lineno = exc_traceback.tb_lineno
+    
+    # Unreachable devices are already reported by SNMPControl when the breaker
+    # opens so there is no need for another ERROR line and traceback
+    if isinstance(exception, SNMPUnreachableError):
+        logger.debug("%s: %s failed with: %s at line %i", cls_name, fnc_name, str(exception), lineno)
+        return
+        
     logger.error("%s: %s failed with: %s at line %i", cls_name, fnc_name, str(exception), lineno)
     
     # Grab the full traceback and save it to a string via StringIO so that we
@@ -67,57 +129,896 @@ def _LogThreadException(cls, exception, logger=None):
         logger.debug("%s", line)
 
 
+class SNMPUnreachableError(RuntimeError):
+    """
+    Exception raised by SNMPControl when a device does not respond at all,
+    either because a request timed out or because the circuit breaker is
+    open.
+    """
+    
+    pass
+
+
+class _GeneratorPool(object):
+    """
+    Class for sharing a small number of pysnmp command generators, each with
+    its own SNMP engine, MIB builder, and transport dispatcher, between all
+    of the SNMPControl instances.  A command generator can only run one
+    request at a time so each request borrows one from the pool and returns
+    it when done.  Generators are created as needed up to "size" so that
+    memory and startup time depend on the number of requests in flight
+    rather than on the number of devices.
+    """
+    
+    def __init__(self, size=POLL_WORKERS+SNMP_SPARE_ENGINES):
+        self.size = size
+        self.lock = threading.Condition()
+        self.idle = []
+        self.nCreated = 0
+        
+    def resize(self, size):
+        """
+        Change the maximum number of command generators in the pool.
+        """
+        
+        with self.lock:
+            self.size = max([1, int(size)])
+            self.lock.notify_all()
+            
+    def getStats(self):
+        """
+        Return a dictionary with the size and usage of the pool.
+        """
+        
+        with self.lock:
+            return {'size': self.size, 'created': self.nCreated, 'idle': len(self.idle)}
+            
+    @contextmanager
+    def borrow(self):
+        """
+        Context manager that provides a command generator from the pool.
+        """
+        
+        with self.lock:
+            while len(self.idle) == 0 and self.nCreated >= self.size:
+                self.lock.wait()
+            if len(self.idle) > 0:
+                generator = self.idle.pop()
+            else:
+                generator = cmdgen.CommandGenerator()
+                self.nCreated += 1
+                
+        try:
+            yield generator
+        finally:
+            with self.lock:
+                self.idle.append(generator)
+                self.lock.notify()
+
+
+_GENERATORS = _GeneratorPool()
+
+
+# Shared helpers for building the variable bindings and context of a request
+_VAR_BINDS = CommandGeneratorVarBinds()
+_CONTEXT = hlapi.ContextData()
+
+
 class SNMPControl(object):
     """
     Class for wrapping SNMP commands such that only one command is executated at
     a time.
+    
+    The OIDs that are read are compiled into resolved variable bindings the
+    first time they are used and these are reused for every later request
+    so that the polls do not need to rebuild and resolve them each cycle.
+    
+    The class also acts as a circuit breaker for the device.  The "nfailure"
+    attribute counts the consecutive transport-level failures and, while it
+    is non-zero, requests fail immediately with SNMPUnreachableError until
+    it is time to probe the device again.
     """
     
-    def __init__(self, ip, port, community, timeout=1.0, retries=3):
+    def __init__(self, ip, port, community, timeout=1.0, retries=3, description=None):
+        self.ip = ip
+        self.port = port
+        self.timeout = timeout
+        self.retries = retries
         self.community = community
         self.network = cmdgen.UdpTransportTarget((ip, port), timeout=timeout, retries=retries)
-        self.generator = cmdgen.CommandGenerator()
         self.lock = threading.Lock()
         
+        # Transport for use with the asyncio engine - created on first use
+        self.asyncNetwork = None
+        
+        # Compiled variable bindings for GET requests, keyed by OID
+        self.varBinds = {}
+        
+        # Circuit breaker state
+        self.description = description if description is not None else "%s:%i" % (ip, port)
+        self.breakerLock = threading.Lock()
         self.nfailure = 0
+        self.backoff = 0.0
+        self.openUntil = 0.0
+        self.lastFailure = None
+        
+    def getBreakerState(self):
+        """
+        Return a dictionary describing the current state of the circuit 
+        breaker for diagnostics.
+        """
+        
+        with self.breakerLock:
+            if self.nfailure == 0:
+                state = 'closed'
+            elif time.time() < self.openUntil:
+                state = 'open'
+            else:
+                state = 'probing'
+            return {'state': state, 'nfailure': self.nfailure, 'backoff': self.backoff, 
+                    'openUntil': self.openUntil, 'lastFailure': self.lastFailure}
+            
+    def _checkBreaker(self):
+        """
+        Check the circuit breaker before sending a request.  Returns True if
+        the device needs to be probed before the request is sent and raises
+        SNMPUnreachableError if the breaker is open.
+        """
+        
+        with self.breakerLock:
+            if self.nfailure == 0:
+                return False
+            elif time.time() < self.openUntil:
+                raise SNMPUnreachableError("SNMP device %s unreachable, retrying in %.0f s" % (self.description, self.openUntil - time.time()))
+                
+            # Only one caller gets to probe - everyone else sees an open 
+            # breaker until the probe finishes
+            self.openUntil = time.time() + self.timeout*(self.retries+1)
+            return True
+            
+    def _recordSuccess(self):
+        """
+        Close the circuit breaker after a successful request.
+        """
+        
+        with self.breakerLock:
+            if self.nfailure > 0:
+                shlThreadsLogger.info("SNMP device %s is reachable again after %i failure(s)", self.description, self.nfailure)
+            self.nfailure = 0
+            self.backoff = 0.0
+            self.openUntil = 0.0
+            
+    def _recordFailure(self, errorIndication):
+        """
+        Open the circuit breaker after a transport-level failure and return
+        an SNMPUnreachableError to raise.
+        """
+        
+        with self.breakerLock:
+            if self.nfailure == 0:
+                self.backoff = SNMP_BACKOFF_MIN
+                shlThreadsLogger.warning("SNMP device %s is unreachable (%s), backing off for %.0f s", self.description, errorIndication, self.backoff)
+            else:
+                self.backoff = min([2*self.backoff, SNMP_BACKOFF_MAX])
+                shlThreadsLogger.debug("SNMP device %s is still unreachable (%s), backing off for %.0f s", self.description, errorIndication, self.backoff)
+            self.nfailure += 1
+            self.openUntil = time.time() + self.backoff
+            self.lastFailure = str(errorIndication)
+            
+        return SNMPUnreachableError("SNMP error indication: %s" % errorIndication)
+        
+    def compile(self, oids, snmpEngine=None):
+        """
+        Build and resolve the variable bindings needed to GET the given OIDs
+        and save them so that later requests can use them as-is.  If 
+        'snmpEngine' is None then an engine is borrowed from the shared pool
+        to resolve them.
+        """
+        
+        oids = [oid for oid in oids if oid not in self.varBinds]
+        if len(oids) == 0:
+            return
+            
+        varBinds = [hlapi.ObjectType(hlapi.ObjectIdentity(oid)) for oid in oids]
+        if snmpEngine is None:
+            with _GENERATORS.borrow() as generator:
+                varBinds = _VAR_BINDS.makeVarBinds(generator.snmpEngine, varBinds)
+        else:
+            varBinds = _VAR_BINDS.makeVarBinds(snmpEngine, varBinds)
+        for oid,varBind in zip(oids, varBinds):
+            self.varBinds[oid] = varBind
+            
+    def _getVarBinds(self, oids, snmpEngine):
+        """
+        Return the compiled variable bindings for a list of OIDs, compiling
+        any that have not been seen before with the provided SNMP engine.
+        """
+        
+        try:
+            return [self.varBinds[oid] for oid in oids]
+        except KeyError:
+            self.compile(oids, snmpEngine=snmpEngine)
+            return [self.varBinds[oid] for oid in oids]
+            
+    def _getCmd(self, generator, oids):
+        """
+        Send a single GET for the given OIDs using the SNMP engine of the
+        provided command generator and return the results.  The responses
+        are not run through the MIBs since only the values are used.
+        """
+        
+        return next(hlapi.getCmd(generator.snmpEngine, self.community, self.network, _CONTEXT,
+                                 *self._getVarBinds(oids, generator.snmpEngine), lookupMib=False))
+        
+    def _probe(self):
+        """
+        Send a single GET for SNMP_PROBE_OID to see if the device is back.
+        Raises SNMPUnreachableError if it is not.
+        """
+        
+        with self.lock, _GENERATORS.borrow() as generator:
+            errorIndication, errorStatus, errorIndex, varBinds = \
+              self._getCmd(generator, (SNMP_PROBE_OID,))
+              
+        if errorIndication:
+            raise self._recordFailure(errorIndication)
+        self._recordSuccess()
         
     def get(self, oid):
         """
         Query the given OID and return the results.
         """
         
-        with self.lock:
+        if self._checkBreaker():
+            self._probe()
+            
+        with self.lock, _GENERATORS.borrow() as generator:
             errorIndication, errorStatus, errorIndex, varBinds = \
-              self.generator.getCmd(self.community, self.network, oid)
+              self._getCmd(generator, (oid,))
             
         # Check for SNMP errors
         if errorIndication:
-            self.nfailure += 1
-            raise RuntimeError("SNMP error indication: %s" % errorIndication)
-        elif errorStatus:
+            raise self._recordFailure(errorIndication)
+        self._recordSuccess()
+        if errorStatus:
             raise RuntimeError("SNMP error status: %s" % errorStatus.prettyPrint())
             
         return varBinds[0]
         
+    def _sortVarBinds(self, pending, results, errorIndication, errorStatus, errorIndex, varBinds):
+        """
+        Sort the response to a GET request for the OIDs in 'pending' into the
+        'results' dictionary and return a list of the batches of OIDs that 
+        still need to be requested.
+        """
+        
+        # Check for SNMP errors
+        if errorIndication:
+            raise self._recordFailure(errorIndication)
+        self._recordSuccess()
+        if errorStatus:
+            # SNMPv1 agents reject the entire PDU and point at the offending
+            # variable binding.  Record the error for that OID and try again
+            # with what is left.
+            error = RuntimeError("SNMP error status: %s" % errorStatus.prettyPrint())
+            badIndex = int(errorIndex) - 1
+            if badIndex < 0 or badIndex >= len(pending):
+                ## The response was too big for the agent, not a problem 
+                ## with any one OID - try again with half as many
+                if int(errorStatus) == SNMP_ERROR_TOO_BIG and len(pending) > 1:
+                    half = len(pending) // 2
+                    return [pending[:half], pending[half:]]
+                    
+                ## We don't know which one failed so they all fail
+                for oid in pending:
+                    results[oid] = error
+                return []
+            results[pending[badIndex]] = error
+            pending = pending[:badIndex] + pending[badIndex+1:]
+            return [pending] if len(pending) > 0 else []
+            
+        # SNMPv2c agents report missing OIDs on a per-binding basis
+        for oid,(_, value) in zip(pending, varBinds):
+            if isinstance(value, (rfc1905.NoSuchObject, rfc1905.NoSuchInstance, rfc1905.EndOfMibView)):
+                results[oid] = RuntimeError("SNMP error status: %s" % value.__class__.__name__)
+            else:
+                results[oid] = value
+        return []
+        
+    def get_many(self, oids, max_varbinds=SNMP_MAX_VARBINDS):
+        """
+        Query a collection of OIDs using as few GET requests as possible and
+        return the results as a dictionary keyed by OID.  OIDs that could not
+        be read by the device are mapped to a RuntimeError instance rather
+        than a value so that one bad OID does not discard the whole batch.
+        A request that the device reports as too big is split in half and 
+        sent again.  Transport-level failures raise a RuntimeError.
+        """
+        
+        if self._checkBreaker():
+            self._probe()
+            
+        results = {}
+        oids = list(oids)
+        batches = [oids[i:i+max_varbinds] for i in range(0, len(oids), max_varbinds)]
+        while len(batches) > 0:
+            pending = batches.pop(0)
+            with self.lock, _GENERATORS.borrow() as generator:
+                errorIndication, errorStatus, errorIndex, varBinds = \
+                  self._getCmd(generator, pending)
+                
+            batches = self._sortVarBinds(pending, results, errorIndication, errorStatus, errorIndex, varBinds) + batches
+            
+        return results
+        
+    async def get_many_async(self, oids, snmpEngine, max_varbinds=SNMP_MAX_VARBINDS):
+        """
+        asyncio version of get_many() that runs the queries through the 
+        provided pysnmp SnmpEngine.
+        """
+        
+        from pysnmp.hlapi.asyncio import getCmd, UdpTransportTarget
+        
+        if self.asyncNetwork is None:
+            self.asyncNetwork = UdpTransportTarget((self.ip, self.port), timeout=self.timeout, retries=self.retries)
+            
+        if self._checkBreaker():
+            errorIndication, errorStatus, errorIndex, varBinds = \
+              await getCmd(snmpEngine, self.community, self.asyncNetwork, _CONTEXT,
+                           *self._getVarBinds((SNMP_PROBE_OID,), snmpEngine), lookupMib=False)
+            if errorIndication:
+                raise self._recordFailure(errorIndication)
+            self._recordSuccess()
+            
+        results = {}
+        oids = list(oids)
+        batches = [oids[i:i+max_varbinds] for i in range(0, len(oids), max_varbinds)]
+        while len(batches) > 0:
+            pending = batches.pop(0)
+            errorIndication, errorStatus, errorIndex, varBinds = \
+              await getCmd(snmpEngine, self.community, self.asyncNetwork, _CONTEXT,
+                           *self._getVarBinds(pending, snmpEngine), lookupMib=False)
+              
+            batches = self._sortVarBinds(pending, results, errorIndication, errorStatus, errorIndex, varBinds) + batches
+            
+        return results
+        
+    def walk(self, oid, max_repetitions=SNMP_MAX_VARBINDS):
+        """
+        Walk the table column rooted at the given OID and return the results
+        as a dictionary keyed by the index, i.e., the part of the OID that
+        follows the column OID.  GETBULK is used for SNMPv2c devices and
+        GETNEXT for SNMPv1 devices.
+        """
+        
+        if self._checkBreaker():
+            self._probe()
+            
+        oid = tuple(oid)
+        with self.lock, _GENERATORS.borrow() as generator:
+            if self.community.mpModel > 0:
+                errorIndication, errorStatus, errorIndex, varBindTable = \
+                  generator.bulkCmd(self.community, self.network, 0, max_repetitions, oid)
+            else:
+                errorIndication, errorStatus, errorIndex, varBindTable = \
+                  generator.nextCmd(self.community, self.network, oid)
+                  
+        # Check for SNMP errors
+        if errorIndication:
+            raise self._recordFailure(errorIndication)
+        self._recordSuccess()
+        if errorStatus:
+            raise RuntimeError("SNMP error status: %s" % errorStatus.prettyPrint())
+            
+        results = {}
+        for varBinds in varBindTable:
+            for name, value in varBinds:
+                name = tuple(name)
+                if name[:len(oid)] != oid:
+                    continue
+                if isinstance(value, rfc1905.EndOfMibView):
+                    continue
+                results[name[len(oid):]] = value
+        return results
+        
     def set(self, oid, value):
         """
         Set the given OID to the specified value and return the results.
         """
         
-        with self.lock:
+        if self._checkBreaker():
+            self._probe()
+            
+        with self.lock, _GENERATORS.borrow() as generator:
             errorIndication, errorStatus, errorIndex, varBinds = \
-              self.generator.setCmd(self.community, self.network, (oid, value))
+              generator.setCmd(self.community, self.network, (oid, value))
               
         if errorIndication:
-            self.nfailure += 1
-            raise RuntimeError("SNMP error indication: %s" % errorIndication)
-        elif errorStatus:
+            raise self._recordFailure(errorIndication)
+        self._recordSuccess()
+        if errorStatus:
             raise RuntimeError("SNMP error status: %s" % errorStatus.prettyPrint())
             
         return varBinds[0]
+        
+    def set_many(self, pairs, max_varbinds=SNMP_MAX_VARBINDS):
+        """
+        Set a collection of (OID, value) pairs using as few SET requests as 
+        possible and return the results as a dictionary keyed by OID.  Since 
+        a device applies all of the variables in a SET or none of them, a pair
+        that the device rejects is mapped to a RuntimeError instance and the 
+        rest of the request is sent again.  Transport-level failures raise a
+        RuntimeError.  Each OID may only appear once and a ValueError is 
+        raised if it is repeated.
+        """
+        
+        pairs = [(tuple(oid), value) for oid,value in pairs]
+        if len(set([oid for oid,value in pairs])) != len(pairs):
+            raise ValueError("Repeated OID in SET request")
+            
+        if self._checkBreaker():
+            self._probe()
+            
+        results = {}
+        for i in range(0, len(pairs), max_varbinds):
+            pending = pairs[i:i+max_varbinds]
+            while len(pending) > 0:
+                with self.lock, _GENERATORS.borrow() as generator:
+                    errorIndication, errorStatus, errorIndex, varBinds = \
+                      generator.setCmd(self.community, self.network, *pending)
+                      
+                if errorIndication:
+                    raise self._recordFailure(errorIndication)
+                self._recordSuccess()
+                
+                if errorStatus:
+                    error = RuntimeError("SNMP error status: %s" % errorStatus.prettyPrint())
+                    
+                    index = int(errorIndex) - 1
+                    if index < 0 or index >= len(pending):
+                        ## We don't know which one failed so they all fail
+                        for oid,value in pending:
+                            results[oid] = error
+                        pending = []
+                    else:
+                        ## Drop the bad one and try again
+                        oid, value = pending.pop(index)
+                        results[oid] = error
+                    continue
+                    
+                for (oid,_),(name,value) in zip(pending, varBinds):
+                    results[oid] = value
+                pending = []
+                
+        return results
+
+
+class PollScheduler(object):
+    """
+    Class for running the periodic polls of the monitoring classes from a
+    single scheduling thread and a bounded pool of worker threads.  Devices
+    are kept in a heap ordered by the time their next poll is due so that the
+    number of threads does not grow with the number of devices.
+    """
+    
+    def __init__(self, nWorkers=POLL_WORKERS):
+        self.nWorkers = nWorkers
+        
+        # Heap of (due time, sequence number, generation, device) entries
+        self.heap = []
+        self.counter = itertools.count()
+        self.lock = threading.Condition()
+        
+        # Queue of devices that are due to be polled
+        self.queue = queue.Queue()
+        
+        # Setup threading
+        self.thread = None
+        self.workers = []
+        
+    def register(self, device, generation, delay=0.0):
+        """
+        Schedule a poll of the device after the specified delay in seconds.
+        The generation is used to drop polls that were scheduled before the
+        device was last restarted.
+        """
+        
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.schedulerThread)
+                self.thread.setDaemon(1)
+                self.thread.start()
+                
+                for i in range(self.nWorkers):
+                    worker = threading.Thread(target=self.workerThread)
+                    worker.setDaemon(1)
+                    worker.start()
+                    self.workers.append(worker)
+                    
+            heapq.heappush(self.heap, (time.time()+delay, next(self.counter), generation, device))
+            self.lock.notify()
+            
+    def schedulerThread(self):
+        """
+        Wait for the next poll to come due and hand it off to the workers.
+        """
+        
+        while True:
+            with self.lock:
+                while True:
+                    if len(self.heap) == 0:
+                        self.lock.wait()
+                        continue
+                        
+                    wait = self.heap[0][0] - time.time()
+                    if wait <= 0:
+                        _, _, generation, device = heapq.heappop(self.heap)
+                        break
+                    self.lock.wait(wait)
+                    
+            if device.alive.isSet() and generation == device.pollGeneration:
+                self.queue.put((generation, device))
+                
+    def workerThread(self):
+        """
+        Run device polls as they come due and re-schedule the next poll.
+        """
+        
+        while True:
+            generation, device = self.queue.get()
+            
+            with device.pollLock:
+                if not device.alive.isSet() or generation != device.pollGeneration:
+                    continue
+                    
+                tStart = time.time()
+                delay = None
+                try:
+                    delay = device.poll()
+                except Exception as e:
+                    _LogThreadException(device, e, logger=shlThreadsLogger)
+                    
+                if delay is None:
+                    delay = device.MonitorPeriod - (time.time() - tStart)
+                self.register(device, generation, delay=max([0.0, delay]))
+
+
+class AsyncPollEngine(object):
+    """
+    Class for running the polls of all of the monitoring classes from a 
+    single asyncio event loop.  The SNMP queries for every device are run
+    concurrently in the loop so that a slow or unreachable device does not
+    hold up any other device.  Processing the results, and polling devices
+    that do not use SNMP, is done in the loop's default executor.
+    """
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        
+        # Setup the event loop
+        self.loop = None
+        self.snmpEngine = None
+        
+        # Setup threading
+        self.thread = None
+        
+    def register(self, device, generation, delay=0.0):
+        """
+        Start polling the device after the specified delay in seconds.  The
+        polling continues until the device is stopped or restarted.
+        """
+        
+        with self.lock:
+            if self.thread is None:
+                from pysnmp.hlapi.asyncio import SnmpEngine
+                
+                self.loop = asyncio.new_event_loop()
+                self.snmpEngine = SnmpEngine()
+                
+                self.thread = threading.Thread(target=self.loop.run_forever)
+                self.thread.setDaemon(1)
+                self.thread.start()
+                
+        asyncio.run_coroutine_threadsafe(self.pollDevice(device, generation, delay), self.loop)
+        
+    def runPoll(self, device, generation, results):
+        """
+        Run the device's monitoring cycle with the SNMP results, if any, and
+        return a two-element tuple of whether or not the device is still 
+        being polled and the delay requested by the cycle, if any.
+        """
+        
+        with device.pollLock:
+            if not device.alive.isSet() or generation != device.pollGeneration:
+                return False, None
+                
+            delay = None
+            try:
+                if results is None:
+                    delay = device.poll()
+                else:
+                    delay = device.poll(results)
+            except Exception as e:
+                _LogThreadException(device, e, logger=shlThreadsLogger)
+                
+            return True, delay
+            
+    async def pollDevice(self, device, generation, delay):
+        """
+        Coroutine that polls a device until it is stopped or restarted.
+        """
+        
+        await asyncio.sleep(delay)
+        while device.alive.isSet() and generation == device.pollGeneration:
+            tStart = time.time()
+            
+            results = None
+            if hasattr(device, 'getPollOIDs'):
+                oids = device.getPollOIDs()
+                try:
+                    results = await device.snmp.get_many_async(oids, self.snmpEngine)
+                except Exception as e:
+                    results = {}
+                    for oid in oids:
+                        results[oid] = e
+                        
+            active, delay = await self.loop.run_in_executor(None, self.runPoll, device, generation, results)
+            if not active:
+                break
+            if delay is None:
+                delay = device.MonitorPeriod - (time.time() - tStart)
+            await asyncio.sleep(max([0.0, delay]))
+
+
+_POLL_ENGINE = PollScheduler()
+
+
+def isAsyncPollingAvailable():
+    """
+    Return whether or not the installed pysnmp provides the asyncio API 
+    needed by the AsyncPollEngine.  pysnmp 4.4.x cannot import it under 
+    Python 3.11 and later since it relies on asyncio.coroutine.
+    """
+    
+    try:
+        from pysnmp.hlapi.asyncio import SnmpEngine, getCmd, UdpTransportTarget
+    except (ImportError, AttributeError) as e:
+        return False
+    return True
+
+
+def setPollEngine(engine='threads', nWorkers=POLL_WORKERS):
+    """
+    Select the engine used to poll the monitoring classes.  Valid engines
+    are 'threads' for the PollScheduler and 'asyncio' for the 
+    AsyncPollEngine.  If the asyncio API of pysnmp is not available then
+    an error is logged and 'threads' is used instead.  The new engine is 
+    used for all devices started after this call.  The pool of SNMP engines
+    shared by the SNMPControl instances is sized to match the number of 
+    workers.
+    """
+    
+    global _POLL_ENGINE
+    
+    if engine == 'asyncio' and not isAsyncPollingAvailable():
+        shlThreadsLogger.error("The asyncio polling engine is not supported by the installed pysnmp, using threads instead")
+        engine = 'threads'
+        
+    if engine == 'asyncio':
+        if not isinstance(_POLL_ENGINE, AsyncPollEngine):
+            _POLL_ENGINE = AsyncPollEngine()
+    elif engine == 'threads':
+        if not isinstance(_POLL_ENGINE, PollScheduler) or _POLL_ENGINE.nWorkers != nWorkers:
+            _POLL_ENGINE = PollScheduler(nWorkers=nWorkers)
+        _GENERATORS.resize(nWorkers + SNMP_SPARE_ENGINES)
+    else:
+        raise ValueError("Unknown polling engine '%s'" % engine)
 
 
-class Thermometer(object):
+class AdaptivePollPolicy(object):
+    """
+    Class for deciding how often a device is polled.  When things are quiet
+    the device is polled every "slowPeriod" seconds.  When something happens
+    that calls for fresher data, trigger() switches to polling every 
+    "fastPeriod" seconds.  After "hold" seconds without another trigger the
+    period doubles with each poll until it is back to "slowPeriod".  If 
+    "fastPeriod" is None then the period is always "slowPeriod".
+    """
+    
+    def __init__(self, slowPeriod, fastPeriod=None, hold=60.0, currentStep=1.0):
+        self.lock = threading.Lock()
+        
+        self.period = slowPeriod
+        self.tTrigger = 0.0
+        self.lastReason = None
+        self.nTrigger = 0
+        
+        self.configure(slowPeriod, fastPeriod=fastPeriod, hold=hold, currentStep=currentStep)
+        
+    def configure(self, slowPeriod, fastPeriod=None, hold=60.0, currentStep=1.0):
+        """
+        Update the policy settings without losing the current state.  
+        "currentStep" is the change in current, in amps, between polls that 
+        counts as a trigger.
+        """
+        
+        with self.lock:
+            self.slowPeriod = slowPeriod
+            self.fastPeriod = fastPeriod
+            self.hold = hold
+            self.currentStep = currentStep
+            
+            if self.fastPeriod is None:
+                self.period = self.slowPeriod
+            else:
+                self.period = max([self.fastPeriod, min([self.period, self.slowPeriod])])
+                
+    def trigger(self, reason):
+        """
+        Switch to the fast polling period.  Returns True if the period changed
+        or the hold was extended, False if the policy does not adapt.
+        """
+        
+        with self.lock:
+            if self.fastPeriod is None:
+                return False
+                
+            self.period = self.fastPeriod
+            self.tTrigger = time.time()
+            self.lastReason = reason
+            self.nTrigger += 1
+            return True
+            
+    def nextPeriod(self):
+        """
+        Return the period to use for the next poll, decaying toward the slow
+        period once the hold has expired.
+        """
+        
+        with self.lock:
+            if self.period < self.slowPeriod and time.time() - self.tTrigger > self.hold:
+                self.period = min([self.slowPeriod, 2*self.period])
+            return self.period
+            
+    def getPeriod(self):
+        """
+        Return the current polling period in seconds.
+        """
+        
+        with self.lock:
+            return self.period
+        
+    def getState(self):
+        """
+        Return a dictionary describing the current state of the policy.
+        """
+        
+        with self.lock:
+            return {'period': self.period, 'slowPeriod': self.slowPeriod, 
+                    'fastPeriod': self.fastPeriod, 'lastReason': self.lastReason, 
+                    'lastTrigger': self.tTrigger if self.nTrigger > 0 else None, 
+                    'nTrigger': self.nTrigger}
+
+
+class _PolledDevice(object):
+    """
+    Base class for the monitoring classes that are polled periodically by
+    the shared polling engine, either PollScheduler or AsyncPollEngine.  
+    Sub-classes need to provide a "MonitorPeriod" attribute and a "poll" 
+    method that runs one monitoring cycle.  The poll method can return a 
+    delay in seconds to override when the next poll should happen.
+    """
+    
+    def _setupPolling(self):
+        """
+        Setup the state used for polling.
+        """
+        
+        self.alive = threading.Event()
+        self.lastError = None
+        self.wasUnreachable = 0
+        
+        self.pollLock = threading.Lock()
+        self.generationLock = threading.Lock()
+        self.pollGeneration = 0
+        
+    def _nextGeneration(self):
+        """
+        Move on to the next polling generation, which drops any poll that is
+        scheduled or in progress, and return it.
+        """
+        
+        with self.generationLock:
+            self.pollGeneration += 1
+            return self.pollGeneration
+            
+    def start(self):
+        """
+        Start polling the device.
+        """
+        
+        if self.alive.isSet():
+            self.stop()
+            
+        # NOTE:  The generation is changed under "generationLock" rather than
+        # "pollLock" so that a poll still in progress from before the last 
+        # stop() does not hold up the start.  That poll is dropped by the 
+        # polling engine once it finishes since its generation no longer 
+        # matches.
+        generation = self._nextGeneration()
+        self.wasUnreachable = 0
+        self.alive.set()
+        _POLL_ENGINE.register(self, generation)
+        
+    def stop(self, wait=False):
+        """
+        Stop polling the device.  If 'wait' is True then this waits until any
+        poll in progress has finished, otherwise it returns right away and
+        the poll in progress, which may be stuck in SNMP retries, is left to
+        finish on its own.
+        """
+        
+        if self.alive.isSet():
+            self.alive.clear()          #clear alive event for polling
+            self._nextGeneration()      #drop any poll in progress
+            self.lastError = None
+            if wait:
+                with self.pollLock:     #wait until any poll has finished
+                    pass
+                    
+    def wake(self):
+        """
+        Poll the device as soon as possible rather than waiting for the next
+        scheduled poll.
+        """
+        
+        if self.alive.isSet():
+            # NOTE:  Changing the generation drops the currently scheduled 
+            # poll so that the device is only polled by the new schedule.
+            _POLL_ENGINE.register(self, self._nextGeneration())
+            
+    def poll(self):
+        """
+        Run one monitoring cycle.
+        
+        .. note::
+            This function should be replaced by the particulars for the 
+            device being monitored.
+        """
+        
+        raise NotImplementedError
+
+
+def _getResult(results, oid):
+    """
+    Function to pull the value for an OID out of the dictionary returned by
+    SNMPControl.get_many().  This raises the stored exception if the OID could
+    not be read.
+    """
+    
+    value = results[oid]
+    if isinstance(value, Exception):
+        raise value
+    return value
+
+
+def _getResults(snmp, oids):
+    """
+    Function to run SNMPControl.get_many() for a list of OIDs.  If the request
+    fails outright then every OID is mapped to the exception so that the per-
+    OID processing in the monitoring threads sees the failure.
+    """
+    
+    try:
+        results = snmp.get_many(oids)
+    except Exception as e:
+        results = {}
+        for oid in oids:
+            results[oid] = e
+    return results
+
+
+class Thermometer(_PolledDevice):
     """
     Class for communicating with a network thermometer via SNMP and regularly polling
     the temperature.  The temperature value is stored in the "temp" attribute and this
@@ -142,12 +1043,10 @@ class Thermometer(object):
         self.temp = [None for i in range(self.nSensors)]
         
         # Set the SNMP controller
-        self.snmp = SNMPControl(self.ip, self.port, community)
+        self.snmp = SNMPControl(self.ip, self.port, community, description='%s-%s' % (type(self).__name__, str(self.id)))
         
-        # Setup threading
-        self.thread = None
-        self.alive = threading.Event()
-        self.lastError = None
+        # Setup polling
+        self._setupPolling()
         
     def __str__(self):
         t = self.getTemperature(DegreesF=True)
@@ -165,96 +1064,78 @@ class Thermometer(object):
             
         return output
         
-    def start(self):
+    def getPollOIDs(self):
         """
-        Start the monitoring thread.
+        Return the list of OIDs that are read each monitoring cycle.
         """
         
-        if self.thread is not None:
-            self.stop()
-            
-        self.thread = threading.Thread(target=self.monitorThread)
-        self.thread.setDaemon(1)
-        self.alive.set()
-        self.thread.start()
+        oidEntries = (self.oidTemperatureEntry0,self.oidTemperatureEntry1,self.oidTemperatureEntry2,self.oidTemperatureEntry3)[:self.nSensors]
+        return [oidEntry for oidEntry in oidEntries if oidEntry is not None]
         
-    def stop(self):
+    def poll(self, results=None):
         """
-        Stop the monitor thread, waiting until it's finished.
+        Run one monitoring cycle for the temperature.  If 'results' is 
+        provided it is used as the output of SNMPControl.get_many() for the
+        OIDs from getPollOIDs() rather than reading them here.
         """
         
-        if self.thread is not None:
-            self.alive.clear()          #clear alive event for thread
-            self.thread.join()          #wait until thread has finished
-            self.thread = None
-            self.lastError = None
-            
-    def monitorThread(self):
-        """
-        Create a monitoring thread for the temperature.
-        """
+        tStart = time.time()
         
-        was_unreachable = 0
+        # Read the networked thermometers in a single request, if needed,
+        # and store values to temp.
+        # NOTE: self.temp is in Celsius
+        if results is None:
+            results = _getResults(self.snmp, self.getPollOIDs())
+        oidEntries = (self.oidTemperatureEntry0,self.oidTemperatureEntry1,self.oidTemperatureEntry2,self.oidTemperatureEntry3)[:self.nSensors]
         
-        while self.alive.isSet():
-            tStart = time.time()
+        nFailures = 0
+        for s,oidEntry in enumerate(oidEntries):
+            if oidEntry is not None:
+                try:
+                    value = _getResult(results, oidEntry)
+                    try:
+                        self.temp[s] = float(unicode(value))
+                    except NameError:
+                        self.temp[s] = float(str(value))
+                    self.lastError = None
+                    
+                except Exception as e:
+                    _LogThreadException(self, e, logger=shlThreadsLogger)
+                    self.lastError = str(e)
+                    nFailures += 1
+                    self.temp[s] = None
+                    
+        # Log the data
+        toDataLog = '%.2f,%s' % (time.time(), ','.join(["%.2f" % (self.temp[s] if self.temp[s] is not None else -99) for s in range(self.nSensors)]))
+        with open('/data/thermometer%02i.txt' % self.id, 'a+') as fh:
+            fh.write('%s\n' % toDataLog)
             
-            # Read the networked thermometers and store values to temp.
-            # NOTE: self.temp is in Celsius
-            nFailures = 0
-            for s,oidEntry in enumerate((self.oidTemperatureEntry0,self.oidTemperatureEntry1,self.oidTemperatureEntry2,self.oidTemperatureEntry3)):
-                if s >= self.nSensors:
-                    break
+        # Make sure we aren't critical
+        temps = [value for value in self.temp if value is not None]
+        if self.SHLCallbackInstance is not None and len(temps) != 0:
+            maxTemp = 1.8*max(temps) + 32
+            self.SHLCallbackInstance.processShelterTemperature(maxTemp, source='%s-%s' % (type(self).__name__, str(self.id)))
+            
+        # Make sure the device is reachable
+        if self.SHLCallbackInstance is not None:
+            if nFailures > 0:
+                self.wasUnreachable = 5
+                self.SHLCallbackInstance.processUnreachable('%s-%s' % (type(self).__name__, str(self.id)))
+            else:
+                if self.wasUnreachable > 1:
+                    self.wasUnreachable -= 1
+                elif self.wasUnreachable == 1:
+                    self.wasUnreachable = 0
+                    self.SHLCallbackInstance.processUnreachable('cleared-%s-%s' % (type(self).__name__, str(self.id)))
                     
-                if oidEntry is not None:
-                    try:
-                        _, value = self.snmp.get(oidEntry)
-                        try:
-                            self.temp[s] = float(unicode(value))
-                        except NameError:
-                            self.temp[s] = float(str(value))
-                        self.lastError = None
-                        
-                    except Exception as e:
-                        _LogThreadException(self, e, logger=shlThreadsLogger)
-                        self.lastError = str(e)
-                        nFailures += 1
-                        self.temp[s] = None
-                        
-            # Log the data
-            toDataLog = '%.2f,%s' % (time.time(), ','.join(["%.2f" % (self.temp[s] if self.temp[s] is not None else -99) for s in range(self.nSensors)]))
-            with open('/data/thermometer%02i.txt' % self.id, 'a+') as fh:
-                fh.write('%s\n' % toDataLog)
-                
-            # Make sure we aren't critical
-            temps = [value for value in self.temp if value is not None]
-            if self.SHLCallbackInstance is not None and len(temps) != 0:
-                maxTemp = 1.8*max(temps) + 32
-                self.SHLCallbackInstance.processShelterTemperature(maxTemp)
-                
-            # Make sure the device is reachable
-            if self.SHLCallbackInstance is not None:
-                if nFailures > 0:
-                    was_unreachable = 5
-                    self.SHLCallbackInstance.processUnreachable('%s-%s' % (type(self).__name__, str(self.id)))
-                else:
-                    if was_unreachable > 1:
-                        was_unreachable -= 1
-                    elif was_unreachable == 1:
-                        was_unreachable = 0
-                        self.SHLCallbackInstance.processUnreachable('cleared-%s-%s' % (type(self).__name__, str(self.id)))
-                        
-            # Stop time
-            tStop = time.time()
-            shlThreadsLogger.debug('Finished updating temperature in %.3f seconds', tStop - tStart)
+        # Publish the new values
+        if self.SHLCallbackInstance is not None:
+            self.SHLCallbackInstance.processSample(self)
             
-            # Sleep for a bit
-            sleepCount = 0
-            sleepTime = self.MonitorPeriod - (tStop - tStart)
-            while (self.alive.isSet() and sleepCount < sleepTime):
-                time.sleep(0.2)
-                sleepCount += 0.2
-                
+        # Stop time
+        tStop = time.time()
+        shlThreadsLogger.debug('Finished updating temperature in %.3f seconds', tStop - tStart)
+        
     def getTemperature(self, sensor=0, DegreesF=True):
         """
         Convenience function to get the temperature.  The 'sensor' keyword 
@@ -316,7 +1197,7 @@ class HWg(Thermometer):
         self.oidTemperatureEntry1 = (1,3,6,1,4,1,21796,4,1,3,1,4,2)
 
 
-class EnviroMux(object):
+class EnviroMux(_PolledDevice):
     """
     Class for communicating with a network environmental monitor via SNMP and
     regularly polling the temperature, smoke detector, water detector, door, and
@@ -375,200 +1256,181 @@ class EnviroMux(object):
         # Door opening tracking variable
         self.door_first_opened = None
         
-        # Set the SNMP controller
-        self.snmp = SNMPControl(self.ip, self.port, community)
-        
-        # Setup threading
-        self.thread = None
-        self.alive = threading.Event()
-        self.lastError = None
+        # Set the SNMP controller
+        self.snmp = SNMPControl(self.ip, self.port, community, description='%s-%s' % (type(self).__name__, str(self.id)))
         
-    def start(self):
+        # Setup polling
+        self._setupPolling()
+        
+    def getPollOIDs(self):
         """
-        Start the monitoring thread.
+        Return the list of OIDs that are read each monitoring cycle.
         """
         
-        if self.thread is not None:
-            self.stop()
-            
-        self.thread = threading.Thread(target=self.monitorThread)
-        self.thread.setDaemon(1)
-        self.alive.set()
-        self.thread.start()
+        oidTemperatureEntries = (self.oidTemperatureEntry0,self.oidTemperatureEntry1)[:self.nTemperature]
+        oidAirflowEntries = (self.oidAirflowEntry0,self.oidAirflowEntry1)[:self.nAirflow]
+        oids = list(oidTemperatureEntries) + [self.oidSmokeEntry, self.oidWaterEntry, self.oidDoorEntry] + list(oidAirflowEntries)
+        return [oid for oid in oids if oid is not None]
         
-    def stop(self):
+    def poll(self, results=None):
         """
-        Stop the monitor thread, waiting until it's finished.
+        Run one monitoring cycle for the enviromental conditions.  If 
+        'results' is provided it is used as the output of 
+        SNMPControl.get_many() for the OIDs from getPollOIDs() rather than
+        reading them here.
         """
         
-        if self.thread is not None:
-            self.alive.clear()          #clear alive event for thread
-            self.thread.join()          #wait until thread has finished
-            self.thread = None
-            self.lastError = None
-            
-    def monitorThread(self):
-        """
-        Create a monitoring thread for the temperature.
-        """
+        tStart = time.time()
         
-        was_unreachable = 0
+        # Read all of the sensors in a single request, if needed
+        if results is None:
+            results = _getResults(self.snmp, self.getPollOIDs())
+        oidTemperatureEntries = (self.oidTemperatureEntry0,self.oidTemperatureEntry1)[:self.nTemperature]
+        oidAirflowEntries = (self.oidAirflowEntry0,self.oidAirflowEntry1)[:self.nAirflow]
         
-        while self.alive.isSet():
-            tStart = time.time()
-            
-            # Read the networked thermometers and store values to temp.
-            # NOTE: self.temp is in Celsius
-            nFailures = 0
-            for s,oidEntry in enumerate((self.oidTemperatureEntry0,self.oidTemperatureEntry1)):
-                if s >= self.nTemperature:
-                    break
-                    
-                if oidEntry is not None:
-                    try:
-                        _, value = self.snmp.get(oidEntry)
-                        try:
-                            self.temp[s] = float(unicode(value)) / 10.0
-                        except NameError:
-                            self.temp[s] = float(str(value)) / 10.0
-                        self.lastError = None
-                        
-                    except Exception as e:
-                        _LogThreadException(self, e, logger=shlThreadsLogger)
-                        self.lastError = str(e)
-                        nFailures += 1
-                        self.temp[s] = None
-                        
-            if self.oidSmokeEntry is not None:
+        # Store the temperature values to temp.
+        # NOTE: self.temp is in Celsius
+        nFailures = 0
+        for s,oidEntry in enumerate(oidTemperatureEntries):
+            if oidEntry is not None:
                 try:
-                    _, value = self.snmp.get(self.oidSmokeEntry)
+                    value = _getResult(results, oidEntry)
                     try:
-                        self.smoke_detected = bool(1-int(unicode(value), 10))
+                        self.temp[s] = float(unicode(value)) / 10.0
                     except NameError:
-                        self.smoke_detected = bool(1-int(str(value), 10))
+                        self.temp[s] = float(str(value)) / 10.0
                     self.lastError = None
                     
                 except Exception as e:
                     _LogThreadException(self, e, logger=shlThreadsLogger)
                     self.lastError = str(e)
                     nFailures += 1
-                    self.smoke_detected = None
+                    self.temp[s] = None
                     
-            if self.oidWaterEntry is not None:
+        if self.oidSmokeEntry is not None:
+            try:
+                value = _getResult(results, self.oidSmokeEntry)
                 try:
-                    _, value = self.snmp.get(self.oidWaterEntry)
-                    try:
-                        self.water_detected = bool(1-int(unicode(value), 10))
-                    except NameError:
-                        self.water_detected = bool(1-int(str(value), 10))
-                    self.lastError = None
-                    
-                except Exception as e:
-                    _LogThreadException(self, e, logger=shlThreadsLogger)
-                    self.lastError = str(e)
-                    nFailures += 1
-                    self.water_detected = None
-                    
-            if self.oidDoorEntry is not None:
+                    self.smoke_detected = bool(1-int(unicode(value), 10))
+                except NameError:
+                    self.smoke_detected = bool(1-int(str(value), 10))
+                self.lastError = None
+                
+            except Exception as e:
+                _LogThreadException(self, e, logger=shlThreadsLogger)
+                self.lastError = str(e)
+                nFailures += 1
+                self.smoke_detected = None
+                
+        if self.oidWaterEntry is not None:
+            try:
+                value = _getResult(results, self.oidWaterEntry)
+                try:
+                    self.water_detected = bool(1-int(unicode(value), 10))
+                except NameError:
+                    self.water_detected = bool(1-int(str(value), 10))
+                self.lastError = None
+                
+            except Exception as e:
+                _LogThreadException(self, e, logger=shlThreadsLogger)
+                self.lastError = str(e)
+                nFailures += 1
+                self.water_detected = None
+                
+        if self.oidDoorEntry is not None:
+            try:
+                value = _getResult(results, self.oidDoorEntry)
+                try:
+                    self.door_open = bool(int(unicode(value), 10))
+                except NameError:
+                    self.door_open = bool(int(str(value), 10))
+                self.lastError = None
+                
+                # Track when the door was first opened
+                if self.door_open:
+                    if self.door_first_opened is None:
+                        self.door_first_opened = time.time()
+                        
+            except Exception as e:
+                _LogThreadException(self, e, logger=shlThreadsLogger)
+                self.lastError = str(e)
+                nFailures += 1
+                self.door_open = None
+                
+        for s,oidEntry in enumerate(oidAirflowEntries):
+            if oidEntry is not None:
                 try:
-                    _, value = self.snmp.get(self.oidDoorEntry)
+                    value = _getResult(results, oidEntry)
                     try:
-                        self.door_open = bool(int(unicode(value), 10))
+                        self.airflow[s] = bool(1-int(unicode(value), 10))
                     except NameError:
-                        self.door_open = bool(int(str(value), 10))
+                        self.airflow[s] = bool(1-int(str(value), 10))
                     self.lastError = None
                     
-                    # Track when the door was first opened
-                    if self.door_open:
-                        if self.door_first_opened is None:
-                            self.door_first_opened = time.time()
-                            
                 except Exception as e:
                     _LogThreadException(self, e, logger=shlThreadsLogger)
                     self.lastError = str(e)
                     nFailures += 1
-                    self.door_open = None
-                    
-            for s,oidEntry in enumerate((self.oidAirflowEntry0,self.oidAirflowEntry1)):
-                if s >= self.nAirflow:
-                    break
+                    self.airflow[s] = None
                     
-                if oidEntry is not None:
-                    try:
-                        _, value = self.snmp.get(oidEntry)
-                        try:
-                            self.airflow[s] = bool(1-int(unicode(value), 10))
-                        except NameError:
-                            self.airflow[s] = bool(1-int(str(value), 10))
-                        self.lastError = None
-                        
-                    except Exception as e:
-                        _LogThreadException(self, e, logger=shlThreadsLogger)
-                        self.lastError = str(e)
-                        nFailures += 1
-                        self.airflow[s] = None
-                        
-            # Log the data
-            toDataLog = '%.2f,%s' % (time.time(), ','.join(["%.2f" % (self.temp[s] if self.temp[s] is not None else -99) for s in range(self.nTemperature)]))
-            if self.oidSmokeEntry is not None:
-                toDataLog += ',smoke=%s' % str(self.smoke_detected)
-            if self.oidWaterEntry is not None:
-                toDataLog += ',water=%s' % str(self.water_detected)
-            if self.oidDoorEntry is not None:
-                toDataLog += ',door=%s' % str(self.door_open)
-            if self.nAirflow > 0:
-                toDataLog += ',airflow=%s' % ';'.join([str(self.airflow[s]) for s in range(self.nAirflow)])
-            with open('/data/enviromux.txt', 'a+') as fh:
-                fh.write('%s\n' % toDataLog)
-                
-            # Make sure we aren't critical
-            temps = [value for value in self.temp if value is not None]
-            if self.SHLCallbackInstance is not None and len(temps) != 0:
-                maxTemp = 1.8*max(temps) + 32
-                self.SHLCallbackInstance.processShelterTemperature(maxTemp)
-                
-            # Check for smoke
-            if self.SHLCallbackInstance is not None and self.smoke_detected is not None:
-                self.SHLCallbackInstance.processSmokeDetector(self.smoke_detected)
-                
-            # Check for water
-            if self.SHLCallbackInstance is not None and self.water_detected is not None:
-                self.SHLCallbackInstance.processWaterDetector(self.water_detected)
-                
-            # Check for an open door
-            if self.SHLCallbackInstance is not None:
-                if self.door_first_opened is not None:
-                    if self.door_open:
-                        door_opened_age = time.time() - self.door_first_opened
-                        if door_opened_age > 4*3600:
-                            self.SHLCallbackInstance.processDoorState('open')
-                    else:
-                        self.SHLCallbackInstance.processDoorState('closed')
-                        self.door_first_opened = None
-                        
-            # Make sure the device is reachable
-            if self.SHLCallbackInstance is not None:
-                if nFailures > 0:
-                    was_unreachable = 5
-                    self.SHLCallbackInstance.processUnreachable('%s-%s' % (type(self).__name__, str(self.id)))
+        # Log the data
+        toDataLog = '%.2f,%s' % (time.time(), ','.join(["%.2f" % (self.temp[s] if self.temp[s] is not None else -99) for s in range(self.nTemperature)]))
+        if self.oidSmokeEntry is not None:
+            toDataLog += ',smoke=%s' % str(self.smoke_detected)
+        if self.oidWaterEntry is not None:
+            toDataLog += ',water=%s' % str(self.water_detected)
+        if self.oidDoorEntry is not None:
+            toDataLog += ',door=%s' % str(self.door_open)
+        if self.nAirflow > 0:
+            toDataLog += ',airflow=%s' % ';'.join([str(self.airflow[s]) for s in range(self.nAirflow)])
+        with open('/data/enviromux.txt', 'a+') as fh:
+            fh.write('%s\n' % toDataLog)
+            
+        # Make sure we aren't critical
+        temps = [value for value in self.temp if value is not None]
+        if self.SHLCallbackInstance is not None and len(temps) != 0:
+            maxTemp = 1.8*max(temps) + 32
+            self.SHLCallbackInstance.processShelterTemperature(maxTemp, source='%s-%s' % (type(self).__name__, str(self.id)))
+            
+        # Check for smoke
+        if self.SHLCallbackInstance is not None and self.smoke_detected is not None:
+            self.SHLCallbackInstance.processSmokeDetector(self.smoke_detected)
+            
+        # Check for water
+        if self.SHLCallbackInstance is not None and self.water_detected is not None:
+            self.SHLCallbackInstance.processWaterDetector(self.water_detected)
+            
+        # Check for an open door
+        if self.SHLCallbackInstance is not None:
+            if self.door_first_opened is not None:
+                if self.door_open:
+                    door_opened_age = time.time() - self.door_first_opened
+                    if door_opened_age > 4*3600:
+                        self.SHLCallbackInstance.processDoorState('open')
                 else:
-                    if was_unreachable > 1:
-                        was_unreachable -= 1
-                    elif was_unreachable == 1:
-                        was_unreachable = 0
-                        self.SHLCallbackInstance.processUnreachable('cleared-%s-%s' % (type(self).__name__, str(self.id)))
-                        
-            # Stop time
-            tStop = time.time()
-            shlThreadsLogger.debug('Finished updating enviromental conditions in %.3f seconds', tStop - tStart)
+                    self.SHLCallbackInstance.processDoorState('closed')
+                    self.door_first_opened = None
+                    
+        # Make sure the device is reachable
+        if self.SHLCallbackInstance is not None:
+            if nFailures > 0:
+                self.wasUnreachable = 5
+                self.SHLCallbackInstance.processUnreachable('%s-%s' % (type(self).__name__, str(self.id)))
+            else:
+                if self.wasUnreachable > 1:
+                    self.wasUnreachable -= 1
+                elif self.wasUnreachable == 1:
+                    self.wasUnreachable = 0
+                    self.SHLCallbackInstance.processUnreachable('cleared-%s-%s' % (type(self).__name__, str(self.id)))
+                    
+        # Publish the new values
+        if self.SHLCallbackInstance is not None:
+            self.SHLCallbackInstance.processSample(self)
             
-            # Sleep for a bit
-            sleepCount = 0
-            sleepTime = self.MonitorPeriod - (tStop - tStart)
-            while (self.alive.isSet() and sleepCount < sleepTime):
-                time.sleep(0.2)
-                sleepCount += 0.2
-                
+        # Stop time
+        tStop = time.time()
+        shlThreadsLogger.debug('Finished updating enviromental conditions in %.3f seconds', tStop - tStart)
+        
     def getTemperature(self, sensor=0, DegreesF=True):
         """
         Convenience function to get the temperature.  The 'sensor' keyword 
@@ -659,7 +1521,7 @@ class EnviroMux(object):
         return output
         
 
-class PDU(object):
+class PDU(_PolledDevice):
     """
     Class for communicating with a network PDU via SNMP and regularly polling
     the current and port states.
@@ -681,6 +1543,10 @@ class PDU(object):
     
     outletStatusCodes = {1: "OFF", 2: "ON", 3: "CYC"}
     
+    # How long to wait for an outlet command to be confirmed
+    readBackWindow = READBACK_WINDOW
+    readBackCycWindow = READBACK_CYC_WINDOW
+    
     def __init__(self, ip, port, community, id, nOutlets=8, description=None, SHLCallbackInstance=None, MonitorPeriod=1.0):
         self.ip = ip
         self.port = port
@@ -700,12 +1566,20 @@ class PDU(object):
             self.status[i] = "UNK"
             
         # Set the SNMP controller
-        self.snmp = SNMPControl(self.ip, self.port, community)
+        self.snmp = SNMPControl(self.ip, self.port, community, description='%s-%s' % (type(self).__name__, str(self.id)))
         
-        # Setup threading
-        self.thread = None
-        self.alive = threading.Event()
-        self.lastError = None
+        # Setup polling
+        self._setupPolling()
+        self.pollPolicy = AdaptivePollPolicy(self.MonitorPeriod)
+        
+        # Setup the command latency statistics
+        self.latencyLock = threading.Lock()
+        self.nConfirmed = 0
+        self.nUnconfirmed = 0
+        self.lastLatency = None
+        self.totalLatency = 0.0
+        self.maxLatency = 0.0
+        self.maxSwitchLatency = 0.0
         
     def __str__(self):
         sString = ','.join(["%i=%s" % (o, self.status[o]) for o in self.status])
@@ -716,103 +1590,125 @@ class PDU(object):
         else:
             return "PDU '%s' at IP %s:  outlet status: %s, current: %s" % (self.description, self.ip, sString, cString)
             
-    def start(self):
+    def getPollOIDs(self):
         """
-        Start the monitoring thread.
+        Return the list of OIDs that are read each monitoring cycle.
         """
         
-        if self.thread is not None:
-            self.stop()
-            
-        self.thread = threading.Thread(target=self.monitorThread)
-        self.thread.setDaemon(1)
-        self.alive.set()
-        self.thread.start()
-        
-    def stop(self):
-        """
-        Stop the monitor thread, waiting until it's finished.
-        """
+        oids = [self.oidFirmwareEntry, self.oidFrequencyEntry, self.oidVoltageEntry, self.oidCurrentEntry]
+        if self.oidOutletStatusBaseEntry is not None:
+            # NOTE:  Since the self.oidOutletStatusBaseEntry is just a base entry, 
+            # we need to append on the outlet number (1-indexed) before we can use
+            # it
+            oids.extend([self.oidOutletStatusBaseEntry+(i,) for i in range(1, self.nOutlets+1)])
+        return [oid for oid in oids if oid is not None]
         
-        if self.thread is not None:
-            self.alive.clear()          #clear alive event for thread
-            self.thread.join()          #wait until thread has finished
-            self.thread = None
-            self.lastError = None
-            
-    def monitorThread(self):
+    def poll(self, results=None):
         """
-        Create a monitoring thread for the current and outlet states.  Current 
+        Run one monitoring cycle for the current and outlet states.  Current 
         is stored in the "current" attribute and the outlets in the "status"
-        attribute.
+        attribute.  If 'results' is provided it is used as the output of
+        SNMPControl.get_many() for the OIDs from getPollOIDs() rather than
+        reading them here.
         """
         
-        was_unreachable = 0
+        tStart = time.time()
+        previous = self._getActivityState()
         
-        while self.alive.isSet():
-            tStart = time.time()
-            
-            nFailures = 0
-            if self.oidFirmwareEntry is not None:
+        # Read everything in as few requests as possible, if needed
+        if results is None:
+            results = _getResults(self.snmp, self.getPollOIDs())
+        oidOutletStatusEntries = []
+        if self.oidOutletStatusBaseEntry is not None:
+            oidOutletStatusEntries = [self.oidOutletStatusBaseEntry+(i,) for i in range(1, self.nOutlets+1)]
+        
+        nFailures = 0
+        if self.oidFirmwareEntry is not None:
+            try:
+                # Get the system firmware
+                self.firmwareVersion = _getResult(results, self.oidFirmwareEntry)
+                
+            except Exception as e:
+                _LogThreadException(self, e, logger=shlThreadsLogger)
+                self.lastError = str(e)
+                nFailures += 1
+                self.firmwareVersion = None
+                
+        if self.oidFrequencyEntry is not None:
+            try:
+                # Get the current input frequency
+                PWRfreq = _getResult(results, self.oidFrequencyEntry)
                 try:
-                    # Get the system firmware
-                    _, self.firmwareVersion = self.snmp.get(self.oidFirmwareEntry)
-                    
-                except Exception as e:
-                    _LogThreadException(self, e, logger=shlThreadsLogger)
+                    self.frequency = float(unicode(PWRfreq)) / 10.0
+                except NameError:
+                    self.frequency = float(str(PWRfreq)) / 10.0
+                self.lastError = None
+                
+            except Exception as e:
+                _LogThreadException(self, e, logger=shlThreadsLogger)
+                self.lastError = str(e)
+                nFailures += 1
+                self.frequency = None
+                
+        if self.oidVoltageEntry is not None:
+            try:
+                # Get the current input voltage
+                PWRvoltage = _getResult(results, self.oidVoltageEntry)
+                try:
+                    self.voltage = float(unicode(PWRvoltage))
+                except NameError:
+                    self.voltage = float(str(PWRvoltage))
+                self.lastError = None
+                
+            except Exception as e:
+                _LogThreadException(self, e, logger=shlThreadsLogger)
+                if self.lastError is not None:
+                    self.lastError = "%s; %s" % (self.lastError, str(e))
+                else:
                     self.lastError = str(e)
-                    nFailures += 1
-                    self.firmwareVersion = None
-                    
-            if self.oidFrequencyEntry is not None:
+                nFailures += 1
+                self.voltage = None
+                
+        if self.oidCurrentEntry is not None:
+            try:
+                # Get the current draw of outlet #(i+1)
+                PWRcurrent = _getResult(results, self.oidCurrentEntry)
                 try:
-                    # Get the current input frequency
-                    _, PWRfreq = self.snmp.get(self.oidFrequencyEntry)
-                    try:
-                        self.frequency = float(unicode(PWRfreq)) / 10.0
-                    except NameError:
-                        self.frequency = float(str(PWRfreq)) / 10.0
-                    self.lastError = None
-                    
-                except Exception as e:
-                    _LogThreadException(self, e, logger=shlThreadsLogger)
+                    self.current = float(unicode(PWRcurrent))
+                except NameError:
+                    self.current = float(str(PWRcurrent))
+                if self.firmwareVersion == '12.04.0053':
+                    pass
+                else:
+                    self.current = self.current / 10.0
+                self.lastError = None
+                
+            except Exception as e:
+                _LogThreadException(self, e, logger=shlThreadsLogger)
+                if self.lastError is not None:
+                    self.lastError = "%s; %s" % (self.lastError, str(e))
+                else:
                     self.lastError = str(e)
-                    nFailures += 1
-                    self.frequency = None
-                    
-            if self.oidVoltageEntry is not None:
+                nFailures += 1
+                self.current = None
+                
+        if self.oidOutletStatusBaseEntry is not None:
+            for i,oidOutletStatusEntry in enumerate(oidOutletStatusEntries, 1):
+                # Get the status of outlet #(i+1).
                 try:
-                    # Get the current input voltage
-                    _, PWRvoltage = self.snmp.get(self.oidVoltageEntry)
+                    PortStatus = _getResult(results, oidOutletStatusEntry)
                     try:
-                        self.voltage = float(unicode(PWRvoltage))
+                        PortStatus = int(unicode(PortStatus))
                     except NameError:
-                        self.voltage = float(str(PWRvoltage))
-                    self.lastError = None
-                    
-                except Exception as e:
-                    _LogThreadException(self, e, logger=shlThreadsLogger)
-                    if self.lastError is not None:
-                        self.lastError = "%s; %s" % (self.lastError, str(e))
-                    else:
-                        self.lastError = str(e)
-                    nFailures += 1
-                    self.voltage = None
-                    
-            if self.oidCurrentEntry is not None:
-                try:
-                    # Get the current draw of outlet #(i+1)
-                    _, PWRcurrent = self.snmp.get(self.oidCurrentEntry)
+                        PortStatus = int(str(PortStatus))
+                        
                     try:
-                        self.current = float(unicode(PWRcurrent))
-                    except NameError:
-                        self.current = float(str(PWRcurrent))
-                    if self.firmwareVersion == '12.04.0053':
-                        pass
-                    else:
-                        self.current = self.current / 10.0
-                    self.lastError = None
-                    
+                        self.status[i] = self.outletStatusCodes[PortStatus]
+                    except KeyError:
+                        self.status[i] = "UNK"
+                    if self.lastError is not None:
+                        self.lastError = None
+                        
                 except Exception as e:
                     _LogThreadException(self, e, logger=shlThreadsLogger)
                     if self.lastError is not None:
@@ -820,66 +1716,122 @@ class PDU(object):
                     else:
                         self.lastError = str(e)
                     nFailures += 1
-                    self.current = None
+                    self.status[i] = "UNK"
                     
-            if self.oidOutletStatusBaseEntry is not None:
-                for i in range(1, self.nOutlets+1):
-                    # Get the status of outlet #(i+1).
-                    # NOTE:  Since the self.oidOutletStatusBaseEntry is just a base entry, 
-                    # we need to append on the outlet number (1-indexed) before we can use
-                    # it
-                    oidOutletStatusEntry = self.oidOutletStatusBaseEntry+(i,)
+        toDataLog = "%.2f,%.2f,%.2f,%.2f" % (time.time(), self.frequency if self.frequency is not None else -1, self.voltage if self.voltage is not None else -1, self.current if self.current is not None else -1)
+        with open('/data/rack%02i.txt' % self.id, 'a+') as fh:
+            fh.write('%s\n' % toDataLog)
+            
+        # Make sure the device is reachable
+        if self.SHLCallbackInstance is not None:
+            if nFailures > 0:
+                self.wasUnreachable = 5
+                self.SHLCallbackInstance.processUnreachable('%s-%s' % (type(self).__name__, str(self.id)))
+            else:
+                if self.wasUnreachable > 1:
+                    self.wasUnreachable -= 1
+                elif self.wasUnreachable == 1:
+                    self.wasUnreachable = 0
+                    self.SHLCallbackInstance.processUnreachable('cleared-%s-%s' % (type(self).__name__, str(self.id)))
                     
-                    try:
-                        _, PortStatus = self.snmp.get(oidOutletStatusEntry)
-                        try:
-                            PortStatus = int(unicode(PortStatus))
-                        except NameError:
-                            PortStatus = int(str(PortStatus))
-                            
-                        try:
-                            self.status[i] = self.outletStatusCodes[PortStatus]
-                        except KeyError:
-                            self.status[i] = "UNK"
-                        if self.lastError is not None:
-                            self.lastError = None
-                            
-                    except Exception as e:
-                        _LogThreadException(self, e, logger=shlThreadsLogger)
-                        if self.lastError is not None:
-                            self.lastError = "%s; %s" % (self.lastError, str(e))
-                        else:
-                            self.lastError = str(e)
-                        nFailures += 1
-                        self.status[i] = "UNK"
-                        
-            toDataLog = "%.2f,%.2f,%.2f,%.2f" % (time.time(), self.frequency if self.frequency is not None else -1, self.voltage if self.voltage is not None else -1, self.current if self.current is not None else -1)
-            with open('/data/rack%02i.txt' % self.id, 'a+') as fh:
-                fh.write('%s\n' % toDataLog)
-                
-            # Make sure the device is reachable
-            if self.SHLCallbackInstance is not None:
-                if nFailures > 0:
-                    was_unreachable = 5
-                    self.SHLCallbackInstance.processUnreachable('%s-%s' % (type(self).__name__, str(self.id)))
-                else:
-                    if was_unreachable > 1:
-                        was_unreachable -= 1
-                    elif was_unreachable == 1:
-                        was_unreachable = 0
-                        self.SHLCallbackInstance.processUnreachable('cleared-%s-%s' % (type(self).__name__, str(self.id)))
-                        
-            # Stop time
-            tStop = time.time()
-            shlThreadsLogger.debug('Finished updating current and port status in %.3f seconds', tStop - tStart)
+        # Publish the new values
+        if self.SHLCallbackInstance is not None:
+            self.SHLCallbackInstance.processSample(self)
             
-            # Sleep for a bit
-            sleepCount = 0
-            sleepTime = self.MonitorPeriod - (tStop - tStart)
-            while (self.alive.isSet() and sleepCount < sleepTime):
-                time.sleep(0.2)
-                sleepCount += 0.2
+        # Stop time
+        tStop = time.time()
+        shlThreadsLogger.debug('Finished updating current and port status in %.3f seconds', tStop - tStart)
+        
+        # Figure out when to poll next
+        reason = self._checkActivity(previous)
+        if reason is not None:
+            if self.pollPolicy.trigger(reason):
+                shlThreadsLogger.debug('%s - %s: polling faster after %s', str(self.id), type(self).__name__, reason)
+        return self.pollPolicy.nextPeriod() - (tStop - tStart)
+        
+    def setPollPolicy(self, slowPeriod, fastPeriod=None, hold=60.0, currentStep=1.0):
+        """
+        Update the settings of the adaptive polling policy.  See 
+        AdaptivePollPolicy for details.
+        """
+        
+        self.pollPolicy.configure(slowPeriod, fastPeriod=fastPeriod, hold=hold, currentStep=currentStep)
+        
+    def getPollPeriod(self):
+        """
+        Return the current polling period in seconds.
+        """
+        
+        return self.pollPolicy.getPeriod()
+        
+    def _getActivityState(self):
+        """
+        Return a dictionary of the values that are compared between polls to 
+        decide if the polling should speed up.
+        """
+        
+        return {'status': dict(self.status), 'current': self.current}
+        
+    def _checkActivity(self, previous):
+        """
+        Compare the latest values with the ones from _getActivityState() before
+        the poll and return the reason to poll faster, or None if nothing has
+        happened.
+        """
+        
+        for outlet,state in self.status.items():
+            prevState = previous['status'].get(outlet, 'UNK')
+            if state != prevState and 'UNK' not in (state, prevState):
+                return 'outlet %i change' % outlet
+                
+        if self.current is not None and previous['current'] is not None:
+            if abs(self.current - previous['current']) >= self.pollPolicy.currentStep:
+                return 'current step'
                 
+        return None
+        
+    def discoverOutlets(self):
+        """
+        Walk the outlet status column of the PDU to find out how many outlets
+        it actually has and update the "nOutlets" and "status" attributes to
+        match.  Returns the number of outlets found or None if the outlets
+        could not be discovered.
+        """
+        
+        if self.oidOutletStatusBaseEntry is None:
+            return None
+            
+        try:
+            column = self.snmp.walk(self.oidOutletStatusBaseEntry)
+        except Exception as e:
+            _LogThreadException(self, e, logger=shlThreadsLogger)
+            return None
+            
+        outlets = {}
+        for index,PortStatus in column.items():
+            if len(index) != 1:
+                continue
+            try:
+                outlets[index[0]] = self.outletStatusCodes[int(str(PortStatus))]
+            except (KeyError, ValueError):
+                outlets[index[0]] = "UNK"
+        if len(outlets) == 0:
+            shlThreadsLogger.warning('%s - %s: outlet discovery found no outlets, keeping the configured count of %i', str(self.id), type(self).__name__, self.nOutlets)
+            return None
+            
+        nOutlets = max(outlets.keys())
+        if nOutlets != self.nOutlets:
+            shlThreadsLogger.warning('%s - %s: configured for %i outlets but found %i', str(self.id), type(self).__name__, self.nOutlets, nOutlets)
+            
+        status = {}
+        for i in range(1, nOutlets+1):
+            status[i] = outlets.get(i, "UNK")
+        with self.pollLock:
+            self.nOutlets = nOutlets
+            self.status = status
+        
+        return self.nOutlets
+        
     def getFrequency(self):
         """
         Return the input frequency of the DPU in Hz or None if it is unknown.
@@ -930,13 +1882,10 @@ class PDU(object):
             return False
             
         if outlet is None:
-            # If outlet is None, loop over all outlets and return a list of
-            # the individual operation result codes
-            ret = [False]*self.nOutlets
-            for i in range(1, self.nOutlets+1):
-                ret[i] = self.setStatus(outlet=i, status=status)
-                
-            return ret
+            # If outlet is None, change all outlets at once and return a list
+            # of the individual operation result codes
+            results = self.setStatusMany(dict([(i, status) for i in range(1, self.nOutlets+1)]))
+            return [results[i] for i in range(1, self.nOutlets+1)]
         else:
             # First, convert the string status code to a number via the 
             # self.outletStatusCodes dictionary.  We default to -1 so we
@@ -955,15 +1904,223 @@ class PDU(object):
                 # it
                 oidOutletChangeEntry = self.oidOutletChangeBaseEntry + (outlet,)
                 
-                success = False
+                success = False
+                try:
+                    _, value = self.snmp.set(oidOutletChangeEntry, rfc1902.Integer(numericCode))
+                    success = True
+                    
+                except Exception as e:
+                    _LogThreadException(self, e, logger=shlThreadsLogger)
+                    
+                # Read back the outlet to confirm the change and poll faster to 
+                # follow it
+                if success:
+                    thread = threading.Thread(target=self._readBack, args=({outlet: status.upper().strip()}, time.time()))
+                    thread.setDaemon(1)
+                    thread.start()
+                    
+                    if self.pollPolicy.trigger('outlet %i command' % outlet):
+                        self.wake()
+                        
+                return success
+                
+    def setStatusMany(self, changes):
+        """
+        Change the status of several outlets using as few SNMP SET requests as
+        possible.  'changes' is a dictionary mapping outlet number to the new
+        status.  Returns a dictionary mapping each outlet to True if the change
+        was accepted and False otherwise.
+        """
+        
+        results = {}
+        pairs = []
+        outlets = {}
+        for outlet,status in changes.items():
+            results[outlet] = False
+            
+            # Convert the string status code to a number via the 
+            # self.outletStatusCodes dictionary
+            numericCode = -1
+            if status is not None:
+                for k in self.outletStatusCodes.keys():
+                    if self.outletStatusCodes[k] == status.upper().strip():
+                        numericCode = k
+                        break
+            if numericCode < 0:
+                continue
+                
+            # NOTE:  Since the self.oidOutletChangeBaseEntry is just a base entry, 
+            # we need to append on the outlet number (1-indexed) before we can use
+            # it
+            oidOutletChangeEntry = self.oidOutletChangeBaseEntry + (outlet,)
+            pairs.append((oidOutletChangeEntry, rfc1902.Integer(numericCode)))
+            outlets[oidOutletChangeEntry] = outlet
+            
+        if len(pairs) == 0:
+            return results
+            
+        try:
+            values = self.snmp.set_many(pairs)
+        except Exception as e:
+            _LogThreadException(self, e, logger=shlThreadsLogger)
+            return results
+            
+        tCommand = time.time()
+        accepted = {}
+        for oid,value in values.items():
+            outlet = outlets[oid]
+            if isinstance(value, Exception):
+                _LogThreadException(self, value, logger=shlThreadsLogger)
+                continue
+            results[outlet] = True
+            accepted[outlet] = changes[outlet].upper().strip()
+            
+        # Read back the outlets to confirm the changes
+        if len(accepted) > 0:
+            thread = threading.Thread(target=self._readBack, args=(accepted, tCommand))
+            thread.setDaemon(1)
+            thread.start()
+            
+        # Poll faster to follow the changes
+        if any(results.values()) and self.pollPolicy.trigger('multi-outlet command'):
+            self.wake()
+            
+        return results
+        
+    def _readBack(self, outlets, tCommand):
+        """
+        Read the state of the outlets changed by a single command until they
+        reach the requested states, updating the "status" attribute in place.
+        'outlets' is a dictionary mapping outlet number to the requested 
+        status.  All of the outlets still waiting for confirmation are read 
+        with one SNMP request per pass and only the outlets whose state 
+        changed are published.  A CYC is confirmed when the outlet is back ON
+        after having been seen in some other state.  The time from the command
+        to each confirmation is recorded in the command latency statistics.
+        
+        An ON or OFF that is not confirmed within the read-back window is 
+        followed at the slower CYC rate up to the CYC window so that a late
+        confirmation is still recorded and widens the window for the next
+        command.
+        
+        Returns a dictionary mapping each outlet to whether or not it was 
+        confirmed.
+        """
+        
+        entries, pending = {}, {}
+        for outlet,status in outlets.items():
+            target = 'ON' if status == 'CYC' else status
+            entries[outlet] = {'outlet': outlet, 'status': status, 'target': target, 
+                               'window': self.getReadBackWindow(status), 
+                               'seenOther': (status != 'CYC')}
+            pending[self.oidOutletStatusBaseEntry + (outlet,)] = entries[outlet]
+        tLimit = tCommand + max([entry['window'] for entry in entries.values()] + [self.readBackCycWindow])
+        
+        confirmed = dict([(outlet, False) for outlet in outlets.keys()])
+        latencies = {}
+        while len(pending) > 0 and time.time() < tLimit:
+            # Read back at the faster ON/OFF rate while any ON or OFF is still
+            # inside its window
+            delay = READBACK_CYC_DELAY
+            for entry in pending.values():
+                if entry['status'] != 'CYC' and time.time() - tCommand <= entry['window']:
+                    delay = READBACK_DELAY
+            time.sleep(delay)
+            if not self.alive.isSet():
+                break
+                
+            try:
+                results = self.snmp.get_many(list(pending.keys()))
+            except Exception as e:
+                _LogThreadException(self, e, logger=shlThreadsLogger)
+                continue
+                
+            changed = {}
+            for oid,PortStatus in results.items():
+                entry = pending[oid]
+                if isinstance(PortStatus, Exception):
+                    _LogThreadException(self, PortStatus, logger=shlThreadsLogger)
+                    continue
                 try:
-                    _, value = self.snmp.set(oidOutletChangeEntry, rfc1902.Integer(numericCode))
-                    success = True
+                    state = self.outletStatusCodes[int(str(PortStatus))]
+                except (KeyError, ValueError):
+                    state = "UNK"
+                changed[entry['outlet']] = state
+                
+                if state != entry['target']:
+                    entry['seenOther'] = True
+                elif entry['seenOther']:
+                    confirmed[entry['outlet']] = True
+                    latencies[entry['outlet']] = time.time() - tCommand
+                    del pending[oid]
                     
-                except Exception as e:
-                    _LogThreadException(self, e, logger=shlThreadsLogger)
+            with self.pollLock:
+                for outlet in list(changed.keys()):
+                    if self.status.get(outlet, None) == changed[outlet]:
+                        del changed[outlet]
+                    else:
+                        self.status[outlet] = changed[outlet]
+            if len(changed) > 0 and self.SHLCallbackInstance is not None:
+                self.SHLCallbackInstance.processOutletStates(self, changed)
+                
+        latency = time.time() - tCommand
+        with self.latencyLock:
+            for outlet,status in outlets.items():
+                if confirmed[outlet]:
+                    self.nConfirmed += 1
+                    self.lastLatency = latencies[outlet]
+                    self.totalLatency += latencies[outlet]
+                    self.maxLatency = max([self.maxLatency, latencies[outlet]])
+                    if status != 'CYC':
+                        self.maxSwitchLatency = max([self.maxSwitchLatency, latencies[outlet]])
+                else:
+                    self.nUnconfirmed += 1
                     
-                return success
+        for outlet,status in sorted(outlets.items()):
+            window = entries[outlet]['window']
+            if confirmed[outlet] and latencies[outlet] <= window:
+                shlThreadsLogger.debug('%s - %s: outlet %i confirmed %s after %.3f seconds', str(self.id), type(self).__name__, outlet, status, latencies[outlet])
+            elif confirmed[outlet]:
+                shlThreadsLogger.info('%s - %s: outlet %i confirmed %s after %.3f seconds, later than the %.1f second read-back window', str(self.id), type(self).__name__, outlet, status, latencies[outlet], window)
+            else:
+                shlThreadsLogger.warning('%s - %s: outlet %i not confirmed %s after %.3f seconds', str(self.id), type(self).__name__, outlet, status, latency)
+                
+        return confirmed
+        
+    def getReadBackWindow(self, status):
+        """
+        Return how long in seconds to wait for an outlet command with the 
+        given status to be confirmed.  For ON and OFF this is the larger of
+        "readBackWindow" and READBACK_LATENCY_FACTOR times the slowest ON or
+        OFF confirmation so far.
+        """
+        
+        if status == 'CYC':
+            return self.readBackCycWindow
+        with self.latencyLock:
+            return max([self.readBackWindow, READBACK_LATENCY_FACTOR*self.maxSwitchLatency])
+            
+    def getCommandLatency(self):
+        """
+        Return the time in seconds between the last outlet command and the 
+        read-back confirming it, or None if no command has been confirmed.
+        """
+        
+        return self.lastLatency
+        
+    def getCommandStats(self):
+        """
+        Return a dictionary of statistics about the time it takes for outlet
+        commands to be confirmed.
+        """
+        
+        with self.latencyLock:
+            meanLatency = None
+            if self.nConfirmed > 0:
+                meanLatency = self.totalLatency / self.nConfirmed
+            return {'confirmed': self.nConfirmed, 'unconfirmed': self.nUnconfirmed, 
+                    'lastLatency': self.lastLatency, 'meanLatency': meanLatency, 
+                    'maxLatency': self.maxLatency}
 
 
 class TrippLite(PDU):
@@ -1096,142 +2253,186 @@ class TrippLiteUPS(PDU):
         self.batteryStatus = 'UNK'
         self.batteryCharge = 0.0
         
-    def monitorThread(self):
+    def getPollOIDs(self):
+        """
+        Return the list of OIDs that are read each monitoring cycle.
+        """
+        
+        oids = super(TrippLiteUPS, self).getPollOIDs()
+        for oid in (self.oidUPSOutputEntry, self.oidBatteryChargeEntry, self.oidBatteryStatusEntry):
+            if oid is not None:
+                oids.append(oid)
+        return oids
+        
+    def poll(self, results=None):
         """
-        Create a monitoring thread for the current and outlet states.  Current 
+        Run one monitoring cycle for the current and outlet states.  Current 
         is stored in the "current" attribute and the outlets in the "status"
-        attribute.
+        attribute.  If 'results' is provided it is used as the output of
+        SNMPControl.get_many() for the OIDs from getPollOIDs() rather than
+        reading them here.
         """
         
-        was_unreachable = 0
+        tStart = time.time()
+        previous = self._getActivityState()
         
-        while self.alive.isSet():
-            tStart = time.time()
-            
-            nFailures = 0
-            if self.oidFirmwareEntry is not None:
+        # Read everything in as few requests as possible, if needed
+        if results is None:
+            results = _getResults(self.snmp, self.getPollOIDs())
+        oidOutletStatusEntries = []
+        if self.oidOutletStatusBaseEntry is not None:
+            oidOutletStatusEntries = [self.oidOutletStatusBaseEntry+(i,) for i in range(1, self.nOutlets+1)]
+        
+        nFailures = 0
+        if self.oidFirmwareEntry is not None:
+            try:
+                # Get the system firmware
+                self.firmwareVersion = _getResult(results, self.oidFirmwareEntry)
+                
+            except Exception as e:
+                _LogThreadException(self, e, logger=shlThreadsLogger)
+                self.lastError = str(e)
+                nFailures += 1
+                self.firmwareVersion = None
+                
+        if self.oidFrequencyEntry is not None:
+            try:
+                # Get the current input frequency
+                PWRfreq = _getResult(results, self.oidFrequencyEntry)
                 try:
-                    # Get the system firmware
-                    _, self.firmwareVersion = self.snmp.get(self.oidFirmwareEntry)
-                    
-                except Exception as e:
-                    _LogThreadException(self, e, logger=shlThreadsLogger)
+                    self.frequency = float(unicode(PWRfreq)) / 10.0
+                except NameError:
+                    self.frequency = float(str(PWRfreq)) / 10.0
+                self.lastError = None
+                
+            except Exception as e:
+                _LogThreadException(self, e, logger=shlThreadsLogger)
+                self.lastError = str(e)
+                nFailures += 1
+                self.frequency = None
+                
+        if self.oidVoltageEntry is not None:
+            try:
+                # Get the current input voltage
+                PWRvoltage = _getResult(results, self.oidVoltageEntry)
+                try:
+                    self.voltage = float(unicode(PWRvoltage))
+                except NameError:
+                    self.voltage = float(str(PWRvoltage))
+                self.lastError = None
+                
+            except Exception as e:
+                _LogThreadException(self, e, logger=shlThreadsLogger)
+                if self.lastError is not None:
+                    self.lastError = "%s; %s" % (self.lastError, str(e))
+                else:
                     self.lastError = str(e)
-                    nFailures += 1
-                    self.firmwareVersion = None
-                    
-            if self.oidFrequencyEntry is not None:
+                nFailures += 1
+                self.voltage = None
+                
+        if self.oidCurrentEntry is not None:
+            try:
+                # Get the current draw of outlet #(i+1)
+                PWRcurrent = _getResult(results, self.oidCurrentEntry)
                 try:
-                    # Get the current input frequency
-                    _, PWRfreq = self.snmp.get(self.oidFrequencyEntry)
-                    try:
-                        self.frequency = float(unicode(PWRfreq)) / 10.0
-                    except NameError:
-                        self.frequency = float(str(PWRfreq)) / 10.0
-                    self.lastError = None
-                    
-                except Exception as e:
-                    _LogThreadException(self, e, logger=shlThreadsLogger)
+                    self.current = float(unicode(PWRcurrent))
+                except NameError:
+                    self.current = float(str(PWRcurrent))
+                if self.firmwareVersion == '12.04.0053':
+                   pass
+                else:
+                    self.current = self.current / 10.0
+                self.lastError = None
+                
+            except Exception as e:
+                _LogThreadException(self, e, logger=shlThreadsLogger)
+                if self.lastError is not None:
+                    self.lastError = "%s; %s" % (self.lastError, str(e))
+                else:
                     self.lastError = str(e)
-                    nFailures += 1
-                    self.frequency = None
-                    
-            if self.oidVoltageEntry is not None:
+                nFailures += 1
+                self.current = None
+                
+        if self.oidUPSOutputEntry is not None:
+            try:
+                # Get the current draw of outlet #(i+1)
+                UPSoutput = _getResult(results, self.oidUPSOutputEntry)
                 try:
-                    # Get the current input voltage
-                    _, PWRvoltage = self.snmp.get(self.oidVoltageEntry)
                     try:
-                        self.voltage = float(unicode(PWRvoltage))
+                        self.upsOutput = self.upsOutputCodes[int(unicode(UPSoutput))]
                     except NameError:
-                        self.voltage = float(str(PWRvoltage))
-                    self.lastError = None
-                    
-                except Exception as e:
-                    _LogThreadException(self, e, logger=shlThreadsLogger)
-                    if self.lastError is not None:
-                        self.lastError = "%s; %s" % (self.lastError, str(e))
-                    else:
-                        self.lastError = str(e)
-                    nFailures += 1
-                    self.voltage = None
-                    
-            if self.oidCurrentEntry is not None:
+                        self.upsOutput = self.upsOutputCodes[int(str(UPSoutput))]
+                except KeyError:
+                    self.upsOutput = "UNK"
+                self.lastError = None
+                
+            except Exception as e:
+                _LogThreadException(self, e, logger=shlThreadsLogger)
+                if self.lastError is not None:
+                    self.lastError = "%s; %s" % (self.lastError, str(e))
+                else:
+                    self.lastError = str(e)
+                nFailures += 1
+                self.upsOutput = None
+                
+        if self.oidBatteryChargeEntry is not None:
+            try:
+                # Get the current draw of outlet #(i+1)
+                BTYcharge = _getResult(results, self.oidBatteryChargeEntry)
                 try:
-                    # Get the current draw of outlet #(i+1)
-                    _, PWRcurrent = self.snmp.get(self.oidCurrentEntry)
-                    try:
-                        self.current = float(unicode(PWRcurrent))
-                    except NameError:
-                        self.current = float(str(PWRcurrent))
-                    if self.firmwareVersion == '12.04.0053':
-                       pass
-                    else:
-                        self.current = self.current / 10.0
-                    self.lastError = None
-                    
-                except Exception as e:
-                    _LogThreadException(self, e, logger=shlThreadsLogger)
-                    if self.lastError is not None:
-                        self.lastError = "%s; %s" % (self.lastError, str(e))
-                    else:
-                        self.lastError = str(e)
-                    nFailures += 1
-                    self.current = None
-                    
-            if self.oidUPSOutputEntry is not None:
+                    self.batteryCharge = float(unicode(BTYcharge))
+                except NameError:
+                    self.batteryCharge = float(str(BTYcharge))
+                self.lastError = None
+                
+            except Exception as e:
+                _LogThreadException(self, e, logger=shlThreadsLogger)
+                if self.lastError is not None:
+                    self.lastError = "%s; %s" % (self.lastError, str(e))
+                else:
+                    self.lastError = str(e)
+                nFailures += 1
+                self.batteryCharge = None
+                
+        if self.oidBatteryStatusEntry is not None:
+            try:
+                # Get the current draw of outlet #(i+1)
+                BTYstatus = _getResult(results, self.oidBatteryStatusEntry)
                 try:
-                    # Get the current draw of outlet #(i+1)
-                    _, UPSoutput = self.snmp.get(self.oidUPSOutputEntry)
                     try:
-                        try:
-                            self.upsOutput = self.upsOutputCodes[int(unicode(UPSoutput))]
-                        except NameError:
-                            self.upsOutput = self.upsOutputCodes[int(str(UPSoutput))]
-                    except KeyError:
-                        self.upsOutput = "UNK"
-                    self.lastError = None
-                    
-                except Exception as e:
-                    _LogThreadException(self, e, logger=shlThreadsLogger)
-                    if self.lastError is not None:
-                        self.lastError = "%s; %s" % (self.lastError, str(e))
-                    else:
-                        self.lastError = str(e)
-                    nFailures += 1
-                    self.upsOutput = None
-                    
-            if self.oidBatteryChargeEntry is not None:
+                        self.batteryStatus = self.batteryStatusCodes[int(unicode(BTYstatus))]
+                    except NameError:
+                       self.batteryStatus = self.batteryStatusCodes[int(str(BTYstatus))]
+                except KeyError:
+                    self.batteryStatus = "UNK"
+                self.lastError = None
+                
+            except Exception as e:
+                _LogThreadException(self, e, logger=shlThreadsLogger)
+                if self.lastError is not None:
+                    self.lastError = "%s; %s" % (self.lastError, str(e))
+                else:
+                    self.lastError = str(e)
+                nFailures += 1
+                self.batteryStatus = None
+                
+        if self.oidOutletStatusBaseEntry is not None:
+            for i,oidOutletStatusEntry in enumerate(oidOutletStatusEntries, 1):
+                # Get the status of outlet #(i+1).
                 try:
-                    # Get the current draw of outlet #(i+1)
-                    _, BTYcharge = self.snmp.get(self.oidBatteryChargeEntry)
+                    PortStatus = _getResult(results, oidOutletStatusEntry)
                     try:
-                        self.batteryCharge = float(unicode(BTYcharge))
+                        PortStatus = int(unicode(PortStatus))
                     except NameError:
-                        self.batteryCharge = float(str(BTYcharge))
-                    self.lastError = None
-                    
-                except Exception as e:
-                    _LogThreadException(self, e, logger=shlThreadsLogger)
-                    if self.lastError is not None:
-                        self.lastError = "%s; %s" % (self.lastError, str(e))
-                    else:
-                        self.lastError = str(e)
-                    nFailures += 1
-                    self.batteryCharge = None
-                    
-            if self.oidBatteryStatusEntry is not None:
-                try:
-                    # Get the current draw of outlet #(i+1)
-                    _, BTYstatus = self.snmp.get(self.oidBatteryStatusEntry)
+                        PortStatus = int(str(PortStatus))
+                        
                     try:
-                        try:
-                            self.batteryStatus = self.batteryStatusCodes[int(unicode(BTYstatus))]
-                        except NameError:
-                           self.batteryStatus = self.batteryStatusCodes[int(str(BTYstatus))]
+                        self.status[i] = self.outletStatusCodes[PortStatus]
                     except KeyError:
-                        self.batteryStatus = "UNK"
-                    self.lastError = None
-                    
+                        self.status[i] = "UNK"
+                    if self.lastError is not None:
+                        self.lastError = None
+                        
                 except Exception as e:
                     _LogThreadException(self, e, logger=shlThreadsLogger)
                     if self.lastError is not None:
@@ -1239,66 +2440,62 @@ class TrippLiteUPS(PDU):
                     else:
                         self.lastError = str(e)
                     nFailures += 1
-                    self.batteryStatus = None
-                    
-            if self.oidOutletStatusBaseEntry is not None:
-                for i in range(1, self.nOutlets+1):
-                    # Get the status of outlet #(i+1).
-                    # NOTE:  Since the self.oidOutletStatusBaseEntry is just a base entry, 
-                    # we need to append on the outlet number (1-indexed) before we can use
-                    # it
-                    oidOutletStatusEntry = self.oidOutletStatusBaseEntry+(i,)
-                    
-                    try:
-                        _, PortStatus = self.snmp.get(oidOutletStatusEntry)
-                        try:
-                            PortStatus = int(unicode(PortStatus))
-                        except NameError:
-                            PortStatus = int(str(PortStatus))
-                            
-                        try:
-                            self.status[i] = self.outletStatusCodes[PortStatus]
-                        except KeyError:
-                            self.status[i] = "UNK"
-                        if self.lastError is not None:
-                            self.lastError = None
-                            
-                    except Exception as e:
-                        _LogThreadException(self, e, logger=shlThreadsLogger)
-                        if self.lastError is not None:
-                            self.lastError = "%s; %s" % (self.lastError, str(e))
-                        else:
-                            self.lastError = str(e)
-                        nFailures += 1
-                        self.status[i] = "UNK"
-                            
-            toDataLog = "%.2f,%.2f,%.2f,%.2f,%s,%s,%.2f" % (time.time(), self.frequency if self.frequency is not None else -1, self.voltage if self.voltage is not None else -1, self.current if self.current is not None else -1, self.upsOutput, self.batteryStatus, self.batteryCharge if self.batteryCharge is not None else -1)
-            with open('/data/rack%02i.txt' % self.id, 'a+') as fh:
-                fh.write('%s\n' % toDataLog)
-                
-            # Make sure the device is reachable
-            if self.SHLCallbackInstance is not None:
-                if nFailures > 0:
-                    was_unreachable = 5
-                    self.SHLCallbackInstance.processUnreachable('%s-%s' % (type(self).__name__, str(self.id)))
-                else:
-                    if was_unreachable > 1:
-                        was_unreachable -= 1
-                    elif was_unreachable == 1:
-                        was_unreachable = 0
-                        self.SHLCallbackInstance.processUnreachable('cleared-%s-%s' % (type(self).__name__, str(self.id)))
+                    self.status[i] = "UNK"
                         
-            # Stop time
-            tStop = time.time()
-            shlThreadsLogger.debug('Finished updating current and port status in %.3f seconds', tStop - tStart)
+        toDataLog = "%.2f,%.2f,%.2f,%.2f,%s,%s,%.2f" % (time.time(), self.frequency if self.frequency is not None else -1, self.voltage if self.voltage is not None else -1, self.current if self.current is not None else -1, self.upsOutput, self.batteryStatus, self.batteryCharge if self.batteryCharge is not None else -1)
+        with open('/data/rack%02i.txt' % self.id, 'a+') as fh:
+            fh.write('%s\n' % toDataLog)
+            
+        # Make sure the device is reachable
+        if self.SHLCallbackInstance is not None:
+            if nFailures > 0:
+                self.wasUnreachable = 5
+                self.SHLCallbackInstance.processUnreachable('%s-%s' % (type(self).__name__, str(self.id)))
+            else:
+                if self.wasUnreachable > 1:
+                    self.wasUnreachable -= 1
+                elif self.wasUnreachable == 1:
+                    self.wasUnreachable = 0
+                    self.SHLCallbackInstance.processUnreachable('cleared-%s-%s' % (type(self).__name__, str(self.id)))
+                    
+        # Publish the new values
+        if self.SHLCallbackInstance is not None:
+            self.SHLCallbackInstance.processSample(self)
             
-            # Sleep for a bit
-            sleepCount = 0
-            sleepTime = self.MonitorPeriod - (tStop - tStart)
-            while (self.alive.isSet() and sleepCount < sleepTime):
-                time.sleep(0.2)
-                sleepCount += 0.2
+        # Stop time
+        tStop = time.time()
+        shlThreadsLogger.debug('Finished updating current and port status in %.3f seconds', tStop - tStart)
+        
+        # Figure out when to poll next
+        reason = self._checkActivity(previous)
+        if reason is not None:
+            if self.pollPolicy.trigger(reason):
+                shlThreadsLogger.debug('%s - %s: polling faster after %s', str(self.id), type(self).__name__, reason)
+        return self.pollPolicy.nextPeriod() - (tStop - tStart)
+        
+    def _getActivityState(self):
+        """
+        Return a dictionary of the values that are compared between polls to 
+        decide if the polling should speed up.
+        """
+        
+        state = super(TrippLiteUPS, self)._getActivityState()
+        state['upsOutput'] = self.upsOutput
+        return state
+        
+    def _checkActivity(self, previous):
+        """
+        Compare the latest values with the ones from _getActivityState() before
+        the poll and return the reason to poll faster, or None if nothing has
+        happened.
+        """
+        
+        if self.upsOutput not in ('UNK', None) and previous['upsOutput'] not in ('UNK', None):
+            if (self.upsOutput == 'Battery') != (previous['upsOutput'] == 'Battery'):
+                return 'battery transition'
                 
+        return super(TrippLiteUPS, self)._checkActivity(previous)
+        
     def getOutputSource(self):
         """
         Return the current power source.
@@ -1349,7 +2546,7 @@ class APCUPS(TrippLiteUPS):
         self.outletStatusCodes = {1: "ON", 2: "OFF", 3: "CYC"}
 
 
-class Weather(object):
+class Weather(_PolledDevice):
     """
     Class for reading in values from the weather station database.
     """
@@ -1362,10 +2559,8 @@ class Weather(object):
         # Update the configuration
         self.updateConfig()
         
-        # Setup threading
-        self.thread = None
-        self.alive = threading.Event()
-        self.lastError = None
+        # Setup polling
+        self._setupPolling()
         
         # Setup variables
         self.updatetime = None
@@ -1390,144 +2585,116 @@ class Weather(object):
             self.config = config
         self.database = self.config['weather']['database']
         
-    def start(self):
+    def poll(self):
         """
-        Start the monitoring thread.
+        Run one monitoring cycle for the weather station.
         """
         
-        if self.thread is not None:
-            self.stop()
-            
-        self.thread = threading.Thread(target=self.monitorThread)
-        self.thread.setDaemon(1)
-        self.alive.set()
-        self.thread.start()
-        
-    def stop(self):
-        """
-        Stop the monitor thread, waiting until it's finished.
-        """
+        tStart = time.time()
         
-        if self.thread is not None:
-            self.alive.clear()          #clear alive event for thread
-            self.thread.join()          #wait until thread has finished
-            self.thread = None
-            self.lastError = None
+        # Make sure we don't try near the edge of a minute.  If we are too
+        # close, ask to be polled again once we are clear of it.
+        tNow = int(tStart)
+        if (tNow % 60) < 10:
+            return 10 - (tNow % 60)
+        elif (tNow % 60) > 50:
+            return 70 - (tNow % 60)
             
-    def monitorThread(self):
-        """
-        Create a monitoring thread for the temperature.
-        """
-        
-        was_unreachable = 0
+        updated_list = []
+        updated_age = 86400
         
-        while self.alive.isSet():
-            tStart = time.time()
+        try:
+            conn = sqlite3.connect(self.database, timeout=15)
+            conn.row_factory = sqlite3.Row
+            
+            c = conn.cursor()
+            c.execute("SELECT * FROM archive ORDER BY dateTime DESC LIMIT 1")
+            row = c.fetchone()
             
-            updated_list = []
-            updated_age = 86400
+            self.updatetime = int(row['dateTime'])
+            updated_list.append('updatetime')
+            updated_age = tStart - self.updatetime
+            
+            self.usUnits = bool(row['usUnits'])
+            updated_list.append('usUnits')
+            self.pressure = float(row['barometer'])
+            updated_list.append('pressure')
+            self.temperature = float(row['outTemp'])
+            updated_list.append('temperature')
+            self.humidity = float(row['outHumidity'])
+            updated_list.append('humidity')
+            self.windSpeed = float(row['windSpeed'])
+            updated_list.append('windSpeed')
+            self.windDir = float(row['windDir'])
+            updated_list.append('windDir')
+            self.windGust = float(row['windGust'])
+            updated_list.append('windGust')
+            self.windGustDir = float(row['windGustDir'])
+            updated_list.append('windGustDir')
+            self.rain = float(row['rain'])
+            updated_list.append('rain')
+            self.rainRate = float(row['rainRate'])
+            updated_list.append('rainRate')
+            
+            conn.close()
+            
+        except Exception as e:
+            _LogThreadException(self, e, logger=shlThreadsLogger)
             
             try:
-                # Make sure we don't try near the edge of a minute
-                tNow = int(time.time())
-                while ((tNow % 60) < 10) or ((tNow % 60) > 50):
-                    time.sleep(5)
-                    tNow = int(time.time())
-                    
-                conn = sqlite3.connect(self.database, timeout=15)
-                conn.row_factory = sqlite3.Row
-                
-                c = conn.cursor()
-                c.execute("SELECT * FROM archive ORDER BY dateTime DESC LIMIT 1")
-                row = c.fetchone()
-                
-                self.updatetime = int(row['dateTime'])
-                updated_list.append('updatetime')
-                updated_age = tStart - self.updatetime
-                
-                self.usUnits = bool(row['usUnits'])
-                updated_list.append('usUnits')
-                self.pressure = float(row['barometer'])
-                updated_list.append('pressure')
-                self.temperature = float(row['outTemp'])
-                updated_list.append('temperature')
-                self.humidity = float(row['outHumidity'])
-                updated_list.append('humidity')
-                self.windSpeed = float(row['windSpeed'])
-                updated_list.append('windSpeed')
-                self.windDir = float(row['windDir'])
-                updated_list.append('windDir')
-                self.windGust = float(row['windGust'])
-                updated_list.append('windGust')
-                self.windGustDir = float(row['windGustDir'])
-                updated_list.append('windGustDir')
-                self.rain = float(row['rain'])
-                updated_list.append('rain')
-                self.rainRate = float(row['rainRate'])
-                updated_list.append('rainRate')
-                
                 conn.close()
+            except:
+                pass
                 
-            except Exception as e:
-                _LogThreadException(self, e, logger=shlThreadsLogger)
-                
-                try:
-                    conn.close()
-                except:
-                    pass
+            if self.lastError is not None:
+                self.lastError = "%s; %s" % (self.lastError, str(e))
+            else:
+                self.lastError = str(e)
+            if 'updatetime' not in updated_list:
+                self.updatetime = None
+                if os.path.exists(self.database):
+                    updated_age = tStart - os.path.getmtime(self.database)
                     
-                if self.lastError is not None:
-                    self.lastError = "%s; %s" % (self.lastError, str(e))
-                else:
-                    self.lastError = str(e)
-                if 'updatetime' not in updated_list:
-                    self.updatetime = None
-                    if os.path.exists(self.database):
-                        updated_age = tStart - os.path.getmtime(self.database)
-                        
-                if 'usUnits' not in updated_list:
-                    self.usUnits = False
-                if 'pressure' not in updated_list:
-                    self.pressure = None
-                if 'temperature' not in updated_list:
-                    self.temperature = None
-                if 'humidity' not in updated_list:
-                    self.humidity = None
-                if 'windSpeed' not in updated_list:
-                    self.windSpeed = None
-                if 'windDir' not in updated_list:
-                    self.windDir = None
-                if 'windGust' not in updated_list:
-                    self.windGust = None
-                if 'windGustDir' not in updated_list:
-                    self.windGustDir = None
-                if 'rain' not in updated_list:
-                    self.rain = None
-                if 'rainRate' not in updated_list:
-                    self.rainRate = None
+            if 'usUnits' not in updated_list:
+                self.usUnits = False
+            if 'pressure' not in updated_list:
+                self.pressure = None
+            if 'temperature' not in updated_list:
+                self.temperature = None
+            if 'humidity' not in updated_list:
+                self.humidity = None
+            if 'windSpeed' not in updated_list:
+                self.windSpeed = None
+            if 'windDir' not in updated_list:
+                self.windDir = None
+            if 'windGust' not in updated_list:
+                self.windGust = None
+            if 'windGustDir' not in updated_list:
+                self.windGustDir = None
+            if 'rain' not in updated_list:
+                self.rain = None
+            if 'rainRate' not in updated_list:
+                self.rainRate = None
+                
+        if self.SHLCallbackInstance is not None:
+            if updated_age > 900:
+                self.wasUnreachable = 2
+                self.SHLCallbackInstance.processUnreachable('weather-station')
+            else:
+                if self.wasUnreachable > 1:
+                    self.wasUnreachable -= 1
+                elif self.wasUnreachable == 1:
+                    self.wasUnreachable = 0
+                    self.SHLCallbackInstance.processUnreachable('cleared-weather-station')
                     
-            if self.SHLCallbackInstance is not None:
-                if updated_age > 900:
-                    was_unreachable = 2
-                    self.SHLCallbackInstance.processUnreachable('weather-station')
-                else:
-                    if was_unreachable > 1:
-                        was_unreachable -= 1
-                    elif was_unreachable == 1:
-                        was_unreachable = 0
-                        self.SHLCallbackInstance.processUnreachable('cleared-weather-station')
-                        
-            # Stop time
-            tStop = time.time()
-            shlThreadsLogger.debug('Finished updating weather station data in %.3f seconds', tStop - tStart)
+        # Publish the new values
+        if self.SHLCallbackInstance is not None:
+            self.SHLCallbackInstance.processSample(self)
             
-            # Sleep for a bit
-            sleepCount = 0
-            sleepTime = self.MonitorPeriod - (tStop - tStart)
-            while (self.alive.isSet() and sleepCount < sleepTime):
-                time.sleep(1.0)
-                sleepCount += 1.0
-                
+        # Stop time
+        tStop = time.time()
+        shlThreadsLogger.debug('Finished updating weather station data in %.3f seconds', tStop - tStart)
+        
     def getLastUpdateTime(self):
         """
         Return the time of last update as a datetime object in UTC.
@@ -1628,6 +2795,23 @@ class Weather(object):
             return (rri*25.4, rfi*25.4)
 
 
+def _waitForData(sock, wake):
+    """
+    Function to wait for data to arrive on a socket using the socket's 
+    timeout.  Returns True if there is data to read and False if the wait was
+    interrupted by data on the 'wake' socket, which is consumed.  Raises 
+    socket.timeout if nothing arrives before the timeout.
+    """
+    
+    readable, _, _ = select.select([sock, wake], [], [], sock.gettimeout())
+    if wake in readable:
+        wake.recv(64)
+        return False
+    if len(readable) == 0:
+        raise socket.timeout('timed out')
+    return True
+
+
 class Lightning(object):
     """
     Class for interfacing with the lightning detector via UDP.
@@ -1647,6 +2831,8 @@ class Lightning(object):
         self.thread = None
         self.alive = threading.Event()
         self.lastError = None
+        ## Socket pair used to wake the thread up when stopping
+        self.wakeIn, self.wakeOut = socket.socketpair()
         
         # Setup variables
         self.lock = threading.RLock()
@@ -1682,6 +2868,7 @@ class Lightning(object):
         
         if self.thread is not None:
             self.alive.clear()          #clear alive event for thread
+            self.wakeOut.send(b'\x00') #wake up the thread
             self.thread.join()          #wait until thread has finished
             self.thread = None
             self.lastError = None
@@ -1731,6 +2918,8 @@ class Lightning(object):
             try:
                 tNow = time.time()
                 try:
+                    if not _waitForData(sock, self.wakeIn):
+                        continue
                     data, addr = sock.recvfrom(1024)
                     
                     if was_unreachable > 1:
@@ -1846,6 +3035,8 @@ class Outage(object):
         self.thread = None
         self.alive = threading.Event()
         self.lastError = None
+        ## Socket pair used to wake the thread up when stopping
+        self.wakeIn, self.wakeOut = socket.socketpair()
         
         # Setup variables
         self.flicker_120 = None
@@ -1907,6 +3098,7 @@ class Outage(object):
         
         if self.thread is not None:
             self.alive.clear()          #clear alive event for thread
+            self.wakeOut.send(b'\x00') #wake up the thread
             self.thread.join()          #wait until thread has finished
             self.thread = None
             self.lastError = None
@@ -1959,6 +3151,8 @@ class Outage(object):
             try:
                 tNow = datetime.now(tz=timezone.utc)
                 try:
+                    if not _waitForData(sock, self.wakeIn):
+                        continue
                     data, addr = sock.recvfrom(1024)
                     
                     if was_unreachable > 1:
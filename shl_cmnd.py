@@ -15,6 +15,7 @@ import string
 import struct
 import logging
 import argparse
+import threading
 import json_minify
 try:
         from logging.handlers import WatchedFileHandler
@@ -29,10 +30,10 @@ except ImportError:
 from MCS import *
 
 from shlThreads import *
-from shlFunctions import ShippingContainer
+from shlFunctions import RACK_MIBS, UPS_MIBS, WEATHER_MIBS, ShippingContainer
 
 __version__ = "0.3"
-__all__ = ['DEFAULTS_FILENAME', 'MCSCommunicate']
+__all__ = ['DEFAULTS_FILENAME', 'SHUTDOWN_TIMEOUT', 'MCSCommunicate']
 
 
 #
@@ -41,6 +42,12 @@ __all__ = ['DEFAULTS_FILENAME', 'MCSCommunicate']
 DEFAULTS_FILENAME = '/lwa/software/defaults.json'
 
 
+#
+# Maximum time in seconds to wait for SHL to shut down before exiting
+#
+SHUTDOWN_TIMEOUT = 120.0
+
+
 class MCSCommunicate(Communicate):
     """
     Class to deal with the communicating with MCS.
@@ -48,6 +55,234 @@ class MCSCommunicate(Communicate):
     
     def __init__(self, SubSystemInstance, config, opts):
             super(MCSCommunicate, self).__init__(SubSystemInstance, config, opts)
+            
+            # Setup the MIB entry handlers
+            self.mibs = MIBDispatcher(store=self.SubSystemInstance.mibStore)
+            self._registerMIBs()
+            
+    def _registerMIBs(self):
+        """
+        Populate the MIB dispatcher with the handlers for the MIB entries in
+        the SHL ICD.  Each handler is called with the full MIB entry name and
+        the parameter that follows the prefix, if any, and returns a two-
+        element tuple of the status and the packed response.
+        """
+        
+        ## General Info.
+        self.mibs.register('SUMMARY', self._rptSummary)
+        self.mibs.register('INFO', self._rptInfo)
+        self.mibs.register('LASTLOG', self._rptLastLog)
+        self.mibs.register('SUBSYSTEM', lambda name, param: (True, self.SubSystemInstance.subSystem))
+        self.mibs.register('SERIALNO', lambda name, param: (True, self.SubSystemInstance.serialNumber))
+        self.mibs.register('VERSION', lambda name, param: (True, self.SubSystemInstance.version))
+        
+        ## PDU and UPS state - these take a rack number
+        for prefix,getter,missing,format in RACK_MIBS + UPS_MIBS:
+            self.mibs.registerPrefix(prefix, self._rptRackValue(getter, missing, format), expander=self._listRacks)
+        self.mibs.registerPrefix('PWR-R', self._rptPowerState, expander=self._listOutlets)
+        self.mibs.register('PWR-SEQUENCE', self._rptValue('getPowerSequence'))
+        
+        ## Weather station, lightning, and line voltage
+        for name,getter,missing,format in WEATHER_MIBS:
+            self.mibs.register(name, self._rptValue(getter, missing=missing, format=format))
+        self.mibs.register('POWER-FLICKER', self._rptValue('getPowerFlicker'))
+        self.mibs.register('POWER-OUTAGE', self._rptValue('getPowerOutage'))
+        self.mibs.register('LIGHTNING-RADIUS', lambda name, param: (True, str(15.0)))
+        self.mibs.register('LIGHTNING-10MIN', self._rptValue('getLightningStrikeCount', radius=15, interval=10))
+        self.mibs.register('LIGHTNING-30MIN', self._rptValue('getLightningStrikeCount', radius=15, interval=30))
+        
+        ## Temperature control
+        self.mibs.register('SET-POINT', lambda name, param: (True, '%.1f' % self.SubSystemInstance.currentState['setPoint']))
+        self.mibs.register('DIFFERENTIAL', lambda name, param: (True, '%.1f' % self.SubSystemInstance.currentState['diffPoint']))
+        
+        ## Shelter temperature and environment
+        self.mibs.register('TEMPERATURE', self._rptValue('getMeanTemperature', format='%.2f'))
+        self.mibs.register('TEMPERATURE-MIN', self._rptValue('getTemperatureWindow', format='%.2f', statistic='min'))
+        self.mibs.register('TEMPERATURE-MAX', self._rptValue('getTemperatureWindow', format='%.2f', statistic='max'))
+        self.mibs.register('TEMPERATURE-MEAN', self._rptValue('getTemperatureWindow', format='%.2f', statistic='mean'))
+        self.mibs.registerPrefix('TEMPERATURE-S', self._rptSensorTemperature, expander=self._listSensors)
+        self.mibs.register('SMOKE', self._rptValue('getSmokeDetected'))
+        self.mibs.register('WATER', self._rptValue('getWaterDetected'))
+        self.mibs.register('DOOR', self._rptDoor)
+        
+        ## Age of the published value for a MIB entry
+        self.mibs.registerPrefix('AGE-', self._rptAge, expander=self._listPublished)
+        
+    def _listRacks(self):
+        """
+        Return a list of the racks that were present during INI for expanding
+        wildcard MIB entries.
+        """
+        
+        return [r+1 for r,p in enumerate(self.SubSystemInstance.currentState['rackPresent']) if p]
+        
+    def _listSensors(self):
+        """
+        Return a list of the shelter temperature sensor numbers for expanding
+        wildcard MIB entries.
+        """
+        
+        return list(range(1, self.SubSystemInstance.temperatures.getSensorCount()+1))
+        
+    def _listPublished(self):
+        """
+        Return a sorted list of the MIB entries that have a published value
+        for expanding wildcard AGE- entries.
+        """
+        
+        return sorted([name for name,value,tUpdate,maxAge in self.SubSystemInstance.mibStore.getEntries()])
+        
+    def _listOutlets(self):
+        """
+        Return a list of '<rack>-<port>' outlets for the racks that were present
+        during INI for expanding wildcard MIB entries.
+        """
+        
+        outlets = []
+        for rack in self._listRacks():
+            pdu = self.SubSystemInstance.currentState['pduThreads'][rack-1]
+            outlets.extend(['%i-%i' % (rack, port) for port in sorted(pdu.status.keys())])
+        return outlets
+        
+    def _packValue(self, status, value, missing='UNK', format='%s'):
+        """
+        Pack the output of one of the ShippingContainer get* methods into a
+        response.
+        """
+        
+        if status:
+            if value is not None:
+                packed_data = format % (value,)
+            else:
+                packed_data = missing
+        else:
+            packed_data = self.SubSystemInstance.currentState['lastLog']
+        return status, packed_data
+        
+    def _rptValue(self, getter, missing='UNK', format='%s', **kwds):
+        """
+        Build a handler for a MIB entry that is reported by calling the named
+        ShippingContainer get* method with the provided keywords.
+        """
+        
+        def handler(name, param):
+            status, value = getattr(self.SubSystemInstance, getter)(**kwds)
+            return self._packValue(status, value, missing=missing, format=format)
+        return handler
+        
+    def _rptRackValue(self, getter, missing='UNK', format='%s'):
+        """
+        Build a handler for a MIB entry that is reported by calling the named
+        ShippingContainer get* method with the rack number.
+        """
+        
+        def handler(name, param):
+            rack = int(param)
+            
+            status, value = getattr(self.SubSystemInstance, getter)(rack)
+            return self._packValue(status, value, missing=missing, format=format)
+        return handler
+        
+    def _trimMessage(self, message):
+        """
+        Trim a message down to 256 characters.
+        """
+        
+        if len(message) > 256:
+            message = "%s..." % message[:253]
+        return message
+        
+    def _rptSummary(self, name, param):
+        """
+        Report the current system status.
+        """
+        
+        summary = self.SubSystemInstance.getSnapshot().status[:7]
+        return True, summary
+        
+    def _rptInfo(self, name, param):
+        """
+        Report the current system information.
+        """
+        
+        infoMessage = self._trimMessage(self.SubSystemInstance.getSnapshot().info)
+        return True, infoMessage
+        
+    def _rptLastLog(self, name, param):
+        """
+        Report the last log entry.
+        """
+        
+        lastLogEntry = self._trimMessage(self.SubSystemInstance.getSnapshot().lastLog)
+        if len(lastLogEntry) == 0:
+            lastLogEntry = 'no log entry'
+        return True, lastLogEntry
+        
+    def _rptPowerState(self, name, param):
+        """
+        Report the state of an outlet from a PWR-R<rack>-<port> entry.
+        """
+        
+        rack, port = param.split('-', 1)
+        rack = int(rack)
+        port = int(port)
+        
+        status, state = self.SubSystemInstance.getPowerState(rack, port)
+        return self._packValue(status, state)
+        
+    def _rptSensorTemperature(self, name, param):
+        """
+        Report the temperature from a TEMPERATURE-S<sensor> entry.
+        """
+        
+        sensor = int(param)
+        
+        status, temp = self.SubSystemInstance.getTemperature(sensor)
+        return self._packValue(status, temp, format='%.2f')
+        
+    def _rptAge(self, name, param):
+        """
+        Report how long ago in seconds the value for an AGE-<MIB> entry was 
+        published by the monitoring threads.
+        """
+        
+        age = self.SubSystemInstance.mibStore.getAge(param)
+        if age is None:
+            return False, 'No published value for %s' % param
+        return True, '%.1f' % age
+        
+    def _rptDoor(self, name, param):
+        """
+        Report whether or not the shelter door is open.
+        """
+        
+        status, opened = self.SubSystemInstance.getDoorOpen()
+        if status:
+            return status, 'OPEN' if opened else 'CLOSED'
+        return status, self.SubSystemInstance.currentState['lastLog']
+        
+    def reloadConfig(self):
+        """
+        Re-read, validate, and apply the configuration file without stopping
+        the processing of MCS commands.  The outcome is recorded in the SHL
+        lastLog.
+        """
+        
+        try:
+            with open(self.opts.config, 'r') as ch:
+                config = json.loads(json_minify.json_minify(ch.read()))
+            self.SubSystemInstance.validateConfig(config)
+        except (IOError, OSError, ValueError, TypeError, AttributeError) as e:
+            self.logger.error("Configuration reload rejected: %s", str(e))
+            self.SubSystemInstance.currentState['lastLog'] = 'RELOAD: rejected - %s' % str(e)
+            return False
+            
+        # Refresh the configuration for ASP and then, only if that worked, 
+        # for the communicator so that the two always agree
+        if not self.SubSystemInstance.reload(config):
+            return False
+        self.updateConfig(config)
+        return True
         
     def processCommand(self, data):
         """
@@ -65,354 +300,15 @@ class MCSCommunicate(Communicate):
             
             # Report various MIB entries
             elif command == 'RPT':
-                status = True
-                packed_data = ''
-                
-                ## General Info.
-                if data == 'SUMMARY':
-                    summary = self.SubSystemInstance.currentState['status'][:7]
-                    self.logger.debug('summary = %s', summary)
-                    packed_data = summary
-                elif data == 'INFO':
-                    ### Trim down as needed
-                    if len(self.SubSystemInstance.currentState['info']) > 256:
-                        infoMessage = "%s..." % self.SubSystemInstance.currentState['info'][:253]
-                    else:
-                        infoMessage = self.SubSystemInstance.currentState['info'][:256]
-                        
-                    self.logger.debug('info = %s', infoMessage)
-                    packed_data = infoMessage
-                elif data == 'LASTLOG':
-                    ### Trim down as needed
-                    if len(self.SubSystemInstance.currentState['lastLog']) > 256:
-                        lastLogEntry = "%s..." % self.SubSystemInstance.currentState['lastLog'][:253]
-                    else:
-                        lastLogEntry =  self.SubSystemInstance.currentState['lastLog'][:256]
-                    if len(lastLogEntry) == 0:
-                        lastLogEntry = 'no log entry'
-                    
-                    self.logger.debug('lastlog = %s', lastLogEntry)
-                    packed_data = lastLogEntry
-                elif data == 'SUBSYSTEM':
-                    self.logger.debug('subsystem = %s', self.SubSystemInstance.subSystem)
-                    packed_data = self.SubSystemInstance.subSystem
-                elif data == 'SERIALNO':
-                    self.logger.debug('serialno = %s', self.SubSystemInstance.serialNumber)
-                    packed_data = self.SubSystemInstance.serialNumber
-                elif data == 'VERSION':
-                    self.logger.debug('version = %s', self.SubSystemInstance.version)
-                    packed_data = self.SubSystemInstance.version
-                    
-                ## PDU State - Number of ports
-                elif data[0:17] == 'PORTS-AVAILABLE-R':
-                    rack = int(data[17:])
-                    
-                    status, count = self.SubSystemInstance.getOutletCount(rack)
-                    if status:
-                        packed_data = str(count)
-                    else:
-                        packed_data = self.SubSystemInstance.currentState['lastLog']
-                        
-                    self.logger.debug('%s = exited with status %s', data, str(status))
-                ## PDU State - Current Draw
-                elif data[0:9] == 'CURRENT-R':
-                    rack = int(data[9:])
-                    
-                    status, current = self.SubSystemInstance.getCurrentDraw(rack)
-                    if status:
-                        if current is not None:
-                            packed_data = str(current)
-                        else:
-                            packed_data = '0'
-                    else:
-                        packed_data = self.SubSystemInstance.currentState['lastLog']
-                        
-                    self.logger.debug('%s = exited with status %s', data, str(status))
-                ## PDU State - Input Voltage
-                elif data[0:9] == 'VOLTAGE-R':
-                    rack = int(data[9:])
-                    
-                    status, voltage = self.SubSystemInstance.getInputVoltage(rack)
-                    if status:
-                        if voltage is not None:
-                            packed_data = str(voltage)
-                        else:
-                            packed_data = '0'
-                    else:
-                        packed_data = self.SubSystemInstance.currentState['lastLog']
-                        
-                    self.logger.debug('%s = exited with status %s', data, str(status))
-                ## PDU State - Input Frequency
-                elif data[0:11] == 'FREQUENCY-R':
-                    rack = int(data[11:])
-                    
-                    status, freq = self.SubSystemInstance.getInputFrequency(rack)
-                    if status:
-                        if freq is not None:
-                            packed_data = str(freq)
-                        else:
-                            packed_data = '0'
-                    else:
-                        packed_data = self.SubSystemInstance.currentState['lastLog']
-                        
-                    self.logger.debug('%s = exited with status %s', data, str(status))
-                ## PDU State - Outlet Status
-                elif data[0:5] == 'PWR-R':
-                    rack, port = data[5:].split('-', 1)
-                    rack = int(rack)
-                    port = int(port)
-                    
-                    status, state = self.SubSystemInstance.getPowerState(rack, port)
-                    if status:
-                        packed_data = str(state)
-                    else:
-                        packed_data = self.SubSystemInstance.currentState['lastLog']
-                        
-                    self.logger.debug('%s = exited with status %s', data, str(status))
-                ## UPS State - Battery Charge
-                elif data[0:11] == 'BATCHARGE-R':
-                    rack = int(data[11:])
-                    
-                    status, charge = self.SubSystemInstance.getBatteryCharge(rack)
-                    if status:
-                        if charge is not None:
-                            packed_data = str(charge)
-                        else:
-                            packed_data = 'UNK'
-                    else:
-                        packed_data = self.SubSystemInstance.currentState['lastLog']
-                ## UPS State - Battery Status
-                elif data[0:11] == 'BATSTATUS-R':
-                    rack = int(data[11:])
-                    
-                    status, stat = self.SubSystemInstance.getBatteryStatus(rack)
-                    if status:
-                        if stat is not None:
-                            packed_data = str(stat)
-                        else:
-                            packed_data = 'UNK'
-                    else:
-                        packed_data = self.SubSystemInstance.currentState['lastLog']
-                ## UPS State - Output Power Source
-                elif data[0:11] == 'OUTSOURCE-R':
-                    rack = int(data[11:])
-                    
-                    status, source = self.SubSystemInstance.getOutputSource(rack)
-                    if status:
-                        if source is not None:
-                            packed_data = str(source)
-                        else:
-                            packed_data = 'UNK'
-                    else:
-                        packed_data = self.SubSystemInstance.currentState['lastLog']
-                
-                ## Weather Station - Last Update
-                elif data[0:14] == 'WX-UPDATED':
-                    status, uptd = self.SubSystemInstance.getWeatherUpdateTime()
-                    if status:
-                        if uptd is not None:
-                            packed_data = str(uptd)
-                        else:
-                            packed_data = 'UNK'
-                    else:
-                        packed_data = self.SubSystemInstance.currentState['lastLog']
-                ## Weather Station - Temperature
-                elif data[0:14] == 'WX-TEMPERATURE':
-                    status, temp = self.SubSystemInstance.getOutsideTemperature()
-                    if status:
-                        if temp is not None:
-                            packed_data = str(temp)
-                        else:
-                            packed_data = 'UNK'
-                    else:
-                        packed_data = self.SubSystemInstance.currentState['lastLog']
-                ## Weather Station - Humidity
-                elif data[0:11] == 'WX-HUMIDITY':
-                    status, humid = self.SubSystemInstance.getOutsideHumidity()
-                    if status:
-                        if humid is not None:
-                            packed_data = str(humid)
-                        else:
-                            packed_data = 'UNK'
-                    else:
-                        packed_data = self.SubSystemInstance.currentState['lastLog']
-                ## Weather Station - Pressure
-                elif data[0:11] == 'WX-PRESSURE':
-                    status, press = self.SubSystemInstance.getBarometricPressure()
-                    if status:
-                        if press is not None:
-                            packed_data = str(press)
-                        else:
-                            packed_data = 'UNK'
-                    else:
-                        packed_data = self.SubSystemInstance.currentState['lastLog']
-                ## Weather Station - Wind
-                elif data[0:7] == 'WX-WIND':
-                    status, wind = self.SubSystemInstance.getWind()
-                    if status:
-                        if wind is not None:
-                            packed_data = str(wind)
-                        else:
-                            packed_data = 'UNK'
-                    else:
-                        packed_data = self.SubSystemInstance.currentState['lastLog']
-                ## Weather Station - Gust
-                elif data[0:7] == 'WX-GUST':
-                    status, gust = self.SubSystemInstance.getGust()
-                    if status:
-                        if gust is not None:
-                            packed_data = str(gust)
-                        else:
-                            packed_data = 'UNK'
-                    else:
-                        packed_data = self.SubSystemInstance.currentState['lastLog']
-                ## Weather Station - Rainfall Rate
-                elif data[0:16] == 'WX-RAINFALL-RATE':
-                    status, rain = self.SubSystemInstance.getRainfallRate()
-                    if status:
-                        if rain is not None:
-                            packed_data = str(rain)
-                        else:
-                            packed_data = 'UNK'
-                    else:
-                        packed_data = self.SubSystemInstance.currentState['lastLog']
-                ## Weather Station - Rainfall Total
-                elif data[0:17] == 'WX-RAINFALL-TOTAL':
-                    status, rain = self.SubSystemInstance.getTotalRainfall()
-                    if status:
-                        if rain is not None:
-                            packed_data = str(rain)
-                        else:
-                            packed_data = 'UNK'
-                    else:
-                        packed_data = self.SubSystemInstance.currentState['lastLog']
-                        
-                ## Lightning - detection radius
-                elif data[0:16] == 'LIGHTNING-RADIUS':
-                    status, radius = True, 15.0
-                    if status:
-                        if radius is not None:
-                            packed_data = str(radius)
-                        else:
-                            packed_data = 'UNK'
-                    else:
-                        packed_data = self.SubSystemInstance.currentState['lastLog']
-                ## Lightning - strikes within the last 10 minutes within the detection radius
-                elif data[:15] == 'LIGHTNING-10MIN':
-                    status, count = self.SubSystemInstance.getLightningStrikeCount(radius=15, interval=10)
-                    if status:
-                        if count is not None:
-                            packed_data = str(count)
-                        else:
-                            packed_data = 'UNK'
-                    else:
-                        packed_data = self.SubSystemInstance.currentState['lastLog']
-                ## Lightning - strikes within the last 30 minutes within the detection radius
-                elif data[:15] == 'LIGHTNING-30MIN':
-                    status, count = self.SubSystemInstance.getLightningStrikeCount(radius=15, interval=30)
-                    if status:
-                        if count is not None:
-                            packed_data = str(count)
-                        else:
-                            packed_data = 'UNK'
-                    else:
-                        packed_data = self.SubSystemInstance.currentState['lastLog']
-                        
-                ## Line voltage - flicker
-                elif data == 'POWER-FLICKER':
-                    status, flicker = self.SubSystemInstance.getPowerFlicker()
-                    if status:
-                        if flicker is not None:
-                            packed_data = str(flicker)
-                        else:
-                            packed_data = 'UNK'
-                    else:
-                        packed_data = self.SubSystemInstance.currentState['lastLog']
-                ## Line voltage - flicker
-                elif data == 'POWER-OUTAGE':
-                    status, outage = self.SubSystemInstance.getPowerOutage()
-                    if status:
-                        if outage is not None:
-                            packed_data = str(outage)
-                        else:
-                            packed_data = 'UNK'
-                    else:
-                        packed_data = self.SubSystemInstance.currentState['lastLog']
-                        
-                ## Temperature set point
-                elif data == 'SET-POINT':
-                    packed_data = '%.1f' % self.SubSystemInstance.currentState['setPoint']
-                    self.logger.debug('%s = %s', data, packed_data)
-                    
-                ## Temperature differential
-                elif data == 'DIFFERENTIAL':
-                    packed_data = '%.1f' % self.SubSystemInstance.currentState['diffPoint']
-                    self.logger.debug('%s = %s', data, packed_data)
-                    
-                ## Current mean shelter temperature
-                elif data == 'TEMPERATURE':
-                    status, temp = self.SubSystemInstance.getMeanTemperature()
-                    
-                    if status:
-                        packed_data = '%.2f' % temp
-                    else:
-                        packed_data = self.SubSystemInstance.currentState['lastLog']
-                    
-                    self.logger.debug('%s = exited with status %s', data, str(status))
-                    
-                ## Individual shelter temperature sensors
-                elif data[:13] == 'TEMPERATURE-S':
-                    sensor = int(data[13:])
-                    
-                    status, temp = self.SubSystemInstance.getTemperature(sensor)
-                    
-                    if status:
-                        packed_data = '%.2f' % temp
-                    else:
-                        packed_data = self.SubSystemInstance.currentState['lastLog']
-                    
-                    self.logger.debug('%s = exited with status %s', data, str(status))
-                    
-                ## Smoke detector status
-                elif data == 'SMOKE':
-                    status, smoke = self.SubSystemInstance.getSmokeDetected()
-                    
-                    if status:
-                        packed_data = str(smoke)
-                    else:
-                        packed_data = self.SubSystemInstance.currentState['lastLog']
-                    
-                    self.logger.debug('%s = exited with status %s', data, str(status))
-                    
-                ## Water sensor status
-                elif data == 'WATER':
-                        status, water = self.SubSystemInstance.getWaterDetected()
-                        
-                        if status:
-                            packed_data = str(water)
-                        else:
-                            packed_data = self.SubSystemInstance.currentState['lastLog']
-                        
-                        self.logger.debug('%s = exited with status %s', data, str(status))
-                        
-                    ## Smoke detector status
-                elif data == 'DOOR':
-                        status, opened = self.SubSystemInstance.getDoorOpen()
-                        
-                        if status:
-                            packed_data = 'OPEN' if opened else 'CLOSED'
-                        else:
-                            packed_data = self.SubSystemInstance.currentState['lastLog']
-                        
-                        self.logger.debug('%s = exited with status %s', data, str(status))
-                        
+                ## Batched requests are '&'-separated and/or contain wildcards
+                if data.find('&') >= 0 or data.endswith('*'):
+                    status, packed_data = self.mibs.dispatchMany(data)
                 else:
-                    status = False
-                    packed_data = 'Unknown MIB entry: %s' % data
-                    
-                    self.logger.debug('%s = exited with status %s', data, str(status))
-                    
+                    status, packed_data = self.mibs.dispatch(data)
                     
+                self.logger.debug('%s = exited with status %s', data, str(status))
+                
+                
             #
             # Control Commands
             #
@@ -464,11 +360,15 @@ class MCSCommunicate(Communicate):
                     
             # PWR
             elif command == 'PWR':
-                rack    = int(data[:1])
-                port    = int(data[1:3])
-                control = data[3:]
-                
-                status, exitCode = self.SubSystemInstance.pwr(rack, port, control)
+                if data.startswith('SEQ'):
+                    ## Power sequence - see ShippingContainer.pwrSequence()
+                    status, exitCode = self.SubSystemInstance.pwrSequence(data)
+                else:
+                    rack    = int(data[:1])
+                    port    = int(data[1:3])
+                    control = data[3:]
+                    
+                    status, exitCode = self.SubSystemInstance.pwr(rack, port, control)
                 if status:
                     packed_data = ''
                 else:
@@ -554,10 +454,10 @@ def main(args):
         # Shutdown ASP and close the communications channels
         tStop = time.time()
         logger.info('Shutting down SHL, please wait...')
-        MCSInstance.SubSystemInstance.sht(mode='SCRAM')
-        while MCSInstance.SubSystemInstance.currentState['info'] != 'System has been shut down':
-            time.sleep(1)
-        logger.info('Shutdown completed in %.3f seconds', time.time() - tStop)
+        if MCSInstance.SubSystemInstance.shutdown(mode='SCRAM', timeout=SHUTDOWN_TIMEOUT):
+            logger.info('Shutdown completed in %.3f seconds', time.time() - tStop)
+        else:
+            logger.error('Shutdown did not complete after %.3f seconds, exiting anyway', time.time() - tStop)
         MCSInstance.stop()
         
         # Exit
@@ -568,6 +468,18 @@ def main(args):
     # Hook in the signal handler - SIGTERM
     signal.signal(signal.SIGTERM, HandleSignalExit)
     
+    # Setup handler for SIGHUP so that the configuration can be reloaded 
+    # without interrupting the processing of MCS commands
+    def HandleSignalReload(signum, frame, logger=logger, MCSInstance=mcsComms):
+        logger.info('Reloading the configuration on signal %i', signum)
+        
+        thread = threading.Thread(target=MCSInstance.reloadConfig)
+        thread.setDaemon(1)
+        thread.start()
+        
+    # Hook in the signal handler - SIGHUP
+    signal.signal(signal.SIGHUP, HandleSignalReload)
+    
     # Loop and process the MCS data packets as they come in - exit if ctrl-c is 
     # received
     logger.info('Ready to communicate')
@@ -597,10 +509,10 @@ def main(args):
     tStop = time.time()
     print('\nShutting down SHL, please wait...')
     logger.info('Shutting down SHL, please wait...')
-    lwaSHL.sht()
-    while lwaSHL.currentState['info'] != 'System has been shut down':
-        time.sleep(1)
-    logger.info('Shutdown completed in %.3f seconds', time.time() - tStop)
+    if lwaSHL.shutdown(timeout=SHUTDOWN_TIMEOUT):
+        logger.info('Shutdown completed in %.3f seconds', time.time() - tStop)
+    else:
+        logger.error('Shutdown did not complete after %.3f seconds, exiting anyway', time.time() - tStop)
     mcsComms.stop()
     
     # Exit
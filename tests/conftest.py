@@ -0,0 +1,299 @@
+"""
+pytest configuration for the shelter tests.
+
+The shelter modules import pysnmp, requests, git, and json_minify at the
+top level.  None of these are needed to exercise the logic tested here so
+minimal stand-ins are installed into sys.modules before any of the shelter
+modules are imported.  The pysnmp stand-in answers GETs from the "agent"
+dictionary in fakesnmp so that SNMPControl can be tested without a device.
+
+The "shelter", "ready", and "communicator" fixtures build the real
+ShippingContainer and MCSCommunicate from a small configuration whose
+devices all live in the fake agent.
+
+Tests marked "benchmark" only run when pytest is given --benchmark.  They
+record their timings with the "report" fixture and the timings are shown
+at the end of the run.
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import builtins
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(TESTS_DIR))
+sys.path.insert(0, TESTS_DIR)
+
+import fakesnmp
+fakesnmp.install()
+
+import pytest
+
+import shlThreads
+import shlFunctions
+from shlThreads import TrippLite, HWg, EnviroMux
+from shlFunctions import ShippingContainer
+from shl_cmnd import MCSCommunicate
+
+
+# Benchmark results recorded through the "report" fixture
+BENCHMARK_RESULTS = []
+
+
+def pytest_addoption(parser):
+    parser.addoption('--benchmark', action='store_true', default=False,
+                     help='run the tests marked "benchmark" and report their timings')
+
+
+def pytest_configure(config):
+    config.addinivalue_line('markers', 'benchmark: timing benchmark that only runs with --benchmark')
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption('--benchmark'):
+        return
+
+    skip = pytest.mark.skip(reason='benchmark, use --benchmark to run')
+    for item in items:
+        if 'benchmark' in item.keywords:
+            item.add_marker(skip)
+
+
+def pytest_terminal_summary(terminalreporter, exitstatus, config):
+    if len(BENCHMARK_RESULTS) == 0:
+        return
+
+    terminalreporter.section('benchmarks')
+    for line in BENCHMARK_RESULTS:
+        terminalreporter.write_line(line)
+
+
+@pytest.fixture
+def report(request):
+    """
+    Fixture that provides a function for recording a benchmark result.  The
+    function takes a format string and its arguments.
+    """
+
+    def record(format, *args):
+        BENCHMARK_RESULTS.append('%s: %s' % (request.node.name, format % args))
+    return record
+
+
+@pytest.fixture
+def agent():
+    """
+    Fixture that provides a clean fake SNMP agent for each test.
+    """
+
+    fakesnmp.reset()
+    yield fakesnmp.AGENT
+    fakesnmp.reset()
+
+
+@pytest.fixture
+def datalog(tmp_path, monkeypatch):
+    """
+    Fixture that sends the data logs the monitoring threads append to under
+    /data to a temporary directory instead.  Returns the directory.
+    """
+
+    directory = tmp_path / 'data'
+    directory.mkdir()
+
+    def redirected(filename, *args, **kwds):
+        if filename.startswith('/data/'):
+            filename = str(directory / filename[len('/data/'):])
+        return builtins.open(filename, *args, **kwds)
+
+    monkeypatch.setattr(shlThreads, 'open', redirected, raising=False)
+    return directory
+
+
+def waitFor(condition, timeout=5.0):
+    """
+    Wait for a function to return True and return whether or not it did
+    before the timeout expired.
+    """
+
+    tStop = time.time() + timeout
+    while not condition():
+        if time.time() > tStop:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def _freePort():
+    """
+    Return a UDP port on the loopback interface that is not in use.
+    """
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+def makeConfig(nPDUs=2, nOutlets=8, monitorPeriod=60.0):
+    """
+    Build a complete SHL configuration with one HWg thermometer, one
+    EnviroMux, and 'nPDUs' TrippLite PDUs.  The weather station is not
+    monitored.
+    """
+
+    config = {'serial_number': 'SHL-TEST',
+              'mcs': {'message_host': '127.0.0.1', 'message_in_port': _freePort(),
+                      'message_out_port': _freePort()},
+              'polling': {'engine': 'threads', 'workers': 4},
+              'hvac': {'type': 'bard', 'temp_min': 60.0, 'temp_max': 80.0,
+                       'diff_min': 0.5, 'diff_max': 4.0},
+              'thermometers': {'monitor_period': monitorPeriod, 'warning_temp': 90.0,
+                               'critical_temp': 100.0, 'critical_list': [],
+                               'devices': {'thermometer1': {'ip': '10.0.0.1', 'port': 161, 'type': 'HWg',
+                                                            'nsensor': 2, 'security_model': ['shelter', 'public'],
+                                                            'description': 'Test thermometer'}}},
+              'enviromux': {'monitor_period': monitorPeriod, 'warning_temp': 90.0,
+                            'critical_temp': 100.0, 'critical_list': [],
+                            'devices': {'enviromux1': {'ip': '10.0.0.2', 'port': 161,
+                                                       'sensor_list': ['smoke', 'water', 'door', None, None],
+                                                       'security_model': ['shelter', 'public'],
+                                                       'description': 'Test EnviroMux'}}},
+              'pdus': {'monitor_period': monitorPeriod, 'devices': {}},
+              'weather': {'monitor_period': 0, 'database': '/dev/null'},
+              'lightning': {'ip': '239.255.77.1', 'port': _freePort()},
+              'outage': {'ip': '239.255.77.2', 'port': _freePort()}}
+    for i in range(nPDUs):
+        config['pdus']['devices']['pdu%03i' % (i+1,)] = {'ip': '10.1.%i.%i' % (i // 250, i % 250 + 1), 'port': 161,
+                                                         'type': 'TrippLite', 'noutlet': nOutlets,
+                                                         'security_model': ['shelter', 'public'],
+                                                         'description': 'Test PDU %i' % (i+1,)}
+    return config
+
+
+def fillAgent(agent, config):
+    """
+    Add the values read by the thermometers, EnviroMux, and PDUs in a
+    configuration to the fake agent.  All of the outlets are on.
+    """
+
+    for k,v in config['thermometers']['devices'].items():
+        thermometer = HWg(v['ip'], v['port'], None, 1, nSensors=v['nsensor'])
+        values = agent.setdefault((v['ip'], v['port']), {})
+        for oid in thermometer.getPollOIDs():
+            values[oid] = fakesnmp.OctetString('22.5')
+
+    for k,v in config['enviromux']['devices'].items():
+        enviromux = EnviroMux(v['ip'], v['port'], None, 1, sensorList=list(v['sensor_list']))
+        values = agent.setdefault((v['ip'], v['port']), {})
+        values[enviromux.oidTemperatureEntry0] = fakesnmp.Integer(225)
+        values[enviromux.oidTemperatureEntry1] = fakesnmp.Integer(230)
+        for oid,value in ((enviromux.oidSmokeEntry, 1), (enviromux.oidWaterEntry, 1), (enviromux.oidDoorEntry, 0)):
+            if oid is not None:
+                values[oid] = fakesnmp.Integer(value)
+
+    for k,v in config['pdus']['devices'].items():
+        pdu = TrippLite(v['ip'], v['port'], None, 1, nOutlets=v.get('noutlet', 8))
+        values = agent.setdefault((v['ip'], v['port']), {})
+        values[pdu.oidFirmwareEntry] = fakesnmp.OctetString('12.04.0055')
+        values[pdu.oidFrequencyEntry] = fakesnmp.Integer(600)
+        values[pdu.oidVoltageEntry] = fakesnmp.Integer(120)
+        values[pdu.oidCurrentEntry] = fakesnmp.Integer(3)
+        for i in range(1, pdu.nOutlets+1):
+            values[pdu.oidOutletStatusBaseEntry+(i,)] = fakesnmp.Integer(2)
+
+
+def shutdownShelter(sc, timeout=10.0):
+    """
+    Shut down a ShippingContainer and wait for every poll in progress to
+    finish.
+    """
+
+    assert sc.shutdown(timeout=timeout)
+    for device in sc.devices.values():
+        if hasattr(device, 'pollLock'):
+            with device.pollLock:
+                pass
+
+
+@pytest.fixture
+def makeShelter(agent, datalog, tmp_path, monkeypatch):
+    """
+    Fixture that provides a factory for ShippingContainer instances built
+    from makeConfig().  The snapshot and the state files are kept in a
+    temporary directory and every instance is shut down at the end of the
+    test.
+    """
+
+    monkeypatch.setattr(shlFunctions, 'SNAPSHOT_FILENAME', str(tmp_path / 'snapshot.json'))
+    monkeypatch.setattr(shlThreads, 'STATE_DIR', str(tmp_path))
+
+    shelters = []
+    def factory(config=None, **kwds):
+        if config is None:
+            config = makeConfig(**kwds)
+        fillAgent(agent, config)
+        sc = ShippingContainer(config)
+        shelters.append(sc)
+        return sc
+
+    yield factory
+
+    for sc in shelters:
+        shutdownShelter(sc)
+
+
+@pytest.fixture
+def shelter(makeShelter):
+    """
+    Fixture that provides a ShippingContainer that has not been initialized.
+    """
+
+    return makeShelter()
+
+
+def initialize(sc, timeout=10.0):
+    """
+    Run INI on a ShippingContainer with every rack present and wait for it
+    to finish and for the first poll of every PDU to be published.
+    """
+
+    nRacks = len(sc.config['pdus']['devices'])
+    status, code = sc.ini('72&1.0&%s' % ('1'*nRacks,))
+    assert status, code
+    assert waitFor(lambda: sc.currentState['ready'] and 'INI' not in sc.currentState['activeProcess'], timeout)
+    assert waitFor(lambda: all(sc.mibStore.get('CURRENT-R%i' % (r+1,)) is not None for r in range(nRacks)), timeout)
+    return sc
+
+
+@pytest.fixture
+def ready(shelter):
+    """
+    Fixture that provides the "shelter" ShippingContainer after INI.
+    """
+
+    return initialize(shelter)
+
+
+@pytest.fixture
+def communicator(shelter, tmp_path):
+    """
+    Fixture that provides a MCSCommunicate for the "shelter"
+    ShippingContainer.  The configuration is also written to a file so that
+    INI and reloads can read it.  The sockets are only opened if the test
+    calls start().
+    """
+
+    filename = tmp_path / 'defaults.json'
+    filename.write_text(json.dumps(shelter.config))
+
+    comm = MCSCommunicate(shelter, shelter.config, argparse.Namespace(config=str(filename)))
+    yield comm
+
+    if comm.poller is not None:
+        comm.stop()
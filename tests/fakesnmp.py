@@ -0,0 +1,221 @@
+"""
+Minimal stand-ins for pysnmp and the other third party modules imported by
+the shelter code.  Only the parts of the APIs used by shlThreads are
+provided.  GET and SET requests are answered from AGENT, a dictionary that
+maps a (ip, port) address to a dictionary of OID tuple -> value.  Requests
+to an address that is not in AGENT time out.  A GET for more OIDs than the
+limit set for its address in LIMITS is answered with a tooBig error.  Walks
+are recorded as 'BULK' or 'NEXT' depending on the command used.  Every
+request is recorded in REQUESTS and the number of SNMP engines and variable
+binding compilations are counted in STATS.
+"""
+
+import sys
+import types
+
+AGENT = {}
+LIMITS = {}
+REQUESTS = []
+STATS = {'engines': 0, 'makeVarBinds': 0, 'compiled': 0}
+
+
+def reset():
+    AGENT.clear()
+    LIMITS.clear()
+    del REQUESTS[:]
+    for key in STATS:
+        STATS[key] = 0
+
+
+# pysnmp.proto.rfc1902 and rfc1905
+class Integer(int):
+    pass
+
+
+class OctetString(str):
+    pass
+
+
+class NoSuchObject(object):
+    pass
+
+
+class NoSuchInstance(object):
+    pass
+
+
+class EndOfMibView(object):
+    pass
+
+
+class ErrorStatus(int):
+    names = {1: 'tooBig', 2: 'noSuchName'}
+
+    def prettyPrint(self):
+        return self.names.get(int(self), str(int(self)))
+
+
+# pysnmp.hlapi
+class SnmpEngine(object):
+    def __init__(self):
+        STATS['engines'] += 1
+
+
+class ContextData(object):
+    pass
+
+
+class CommunityData(object):
+    def __init__(self, communityIndex, communityName=None, mpModel=1):
+        self.communityIndex = communityIndex
+        self.communityName = communityName
+        self.mpModel = mpModel
+
+
+class UdpTransportTarget(object):
+    def __init__(self, transportAddr, timeout=1.0, retries=5):
+        self.transportAddr = transportAddr
+        self.timeout = timeout
+        self.retries = retries
+
+
+class ObjectIdentity(object):
+    def __init__(self, oid):
+        self.oid = tuple(oid)
+
+
+class ObjectType(object):
+    def __init__(self, objectIdentity, objectSyntax=None):
+        self.objectIdentity = objectIdentity
+        self.objectSyntax = objectSyntax
+        self.resolved = False
+
+
+class CommandGeneratorVarBinds(object):
+    def makeVarBinds(self, snmpEngine, varBinds):
+        STATS['makeVarBinds'] += 1
+        for varBind in varBinds:
+            varBind.resolved = True
+            STATS['compiled'] += 1
+        return list(varBinds)
+
+
+def _get(transportTarget, oids):
+    REQUESTS.append(('GET', transportTarget.transportAddr, tuple(oids)))
+    try:
+        values = AGENT[transportTarget.transportAddr]
+    except KeyError:
+        return 'No SNMP response received before timeout', 0, 0, []
+    if len(oids) > LIMITS.get(transportTarget.transportAddr, len(oids)):
+        return None, ErrorStatus(1), 0, []
+    return None, 0, 0, [(oid, values.get(oid, NoSuchObject())) for oid in oids]
+
+
+def _set(transportTarget, pairs):
+    REQUESTS.append(('SET', transportTarget.transportAddr, tuple(pairs)))
+    try:
+        values = AGENT[transportTarget.transportAddr]
+    except KeyError:
+        return 'No SNMP response received before timeout', 0, 0, []
+    for oid,value in pairs:
+        values[tuple(oid)] = value
+    return None, 0, 0, list(pairs)
+
+
+def _walk(kind, transportTarget, varNames):
+    REQUESTS.append((kind, transportTarget.transportAddr, tuple(varNames)))
+    try:
+        values = AGENT[transportTarget.transportAddr]
+    except KeyError:
+        return 'No SNMP response received before timeout', 0, 0, []
+    root = tuple(varNames[0])
+    return None, 0, 0, [[(oid, value)] for oid,value in sorted(values.items()) if oid[:len(root)] == root]
+
+
+def _getOIDs(varBinds):
+    oids = []
+    for varBind in varBinds:
+        assert isinstance(varBind, ObjectType) and varBind.resolved, "variable binding was not compiled"
+        oids.append(varBind.objectIdentity.oid)
+    return oids
+
+
+def getCmd(snmpEngine, authData, transportTarget, contextData, *varBinds, **options):
+    yield _get(transportTarget, _getOIDs(varBinds))
+
+
+async def getCmdAsync(snmpEngine, authData, transportTarget, contextData, *varBinds, **options):
+    return _get(transportTarget, _getOIDs(varBinds))
+
+
+# pysnmp.entity.rfc3413.oneliner.cmdgen
+class CommandGenerator(object):
+    def __init__(self, snmpEngine=None):
+        self.snmpEngine = snmpEngine if snmpEngine is not None else SnmpEngine()
+
+    def getCmd(self, authData, transportTarget, *varNames, **options):
+        return _get(transportTarget, [tuple(oid) for oid in varNames])
+
+    def setCmd(self, authData, transportTarget, *varBinds, **options):
+        return _set(transportTarget, varBinds)
+
+    def nextCmd(self, authData, transportTarget, *varNames, **options):
+        return _walk('NEXT', transportTarget, varNames)
+
+    def bulkCmd(self, authData, transportTarget, nonRepeaters, maxRepetitions, *varNames, **options):
+        return _walk('BULK', transportTarget, varNames)
+
+
+def _module(name, **attrs):
+    module = types.ModuleType(name)
+    for key,value in attrs.items():
+        setattr(module, key, value)
+    sys.modules[name] = module
+    return module
+
+
+def install():
+    """
+    Install the stand-in modules into sys.modules.
+    """
+
+    rfc1902 = _module('pysnmp.proto.rfc1902', Integer=Integer, OctetString=OctetString)
+    rfc1905 = _module('pysnmp.proto.rfc1905', NoSuchObject=NoSuchObject, NoSuchInstance=NoSuchInstance,
+                      EndOfMibView=EndOfMibView)
+    proto = _module('pysnmp.proto', rfc1902=rfc1902, rfc1905=rfc1905)
+
+    cmdgen = _module('pysnmp.entity.rfc3413.oneliner.cmdgen', CommandGenerator=CommandGenerator,
+                     CommunityData=CommunityData, UdpTransportTarget=UdpTransportTarget)
+    oneliner = _module('pysnmp.entity.rfc3413.oneliner', cmdgen=cmdgen)
+    rfc3413 = _module('pysnmp.entity.rfc3413', oneliner=oneliner)
+    entity = _module('pysnmp.entity', rfc3413=rfc3413)
+
+    varbinds = _module('pysnmp.hlapi.varbinds', CommandGeneratorVarBinds=CommandGeneratorVarBinds)
+    hlasyncio = _module('pysnmp.hlapi.asyncio', getCmd=getCmdAsync, SnmpEngine=SnmpEngine,
+                        ContextData=ContextData, UdpTransportTarget=UdpTransportTarget,
+                        ObjectType=ObjectType, ObjectIdentity=ObjectIdentity)
+    hlapi = _module('pysnmp.hlapi', getCmd=getCmd, SnmpEngine=SnmpEngine, ContextData=ContextData,
+                    CommunityData=CommunityData, UdpTransportTarget=UdpTransportTarget,
+                    ObjectType=ObjectType, ObjectIdentity=ObjectIdentity, varbinds=varbinds,
+                    asyncio=hlasyncio)
+
+    _module('pysnmp', hlapi=hlapi, entity=entity, proto=proto)
+
+    # Other third party modules
+    if 'requests' not in sys.modules:
+        try:
+            import requests
+        except ImportError:
+            _module('requests', get=None, post=None, exceptions=types.SimpleNamespace(RequestException=Exception))
+    if 'json_minify' not in sys.modules:
+        try:
+            import json_minify
+        except ImportError:
+            _module('json_minify', json_minify=lambda text: text)
+    if 'git' not in sys.modules:
+        try:
+            import git
+        except ImportError:
+            class GitError(Exception):
+                pass
+            _module('git', Repo=None, exc=types.SimpleNamespace(GitError=GitError))
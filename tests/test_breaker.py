@@ -0,0 +1,86 @@
+"""
+Tests for the circuit breaker in SNMPControl.
+"""
+
+import time
+
+import pytest
+
+import fakesnmp
+import shlThreads
+from shlThreads import SNMPControl, SNMPUnreachableError, SNMP_PROBE_OID
+
+
+OID = (1,3,6,1,2,1,33,1,4,2,0)
+
+
+def _control():
+    return SNMPControl('10.1.0.1', 161, fakesnmp.CommunityData('shelter', 'public'), timeout=0.1, retries=1)
+
+
+def _expire(snmp):
+    snmp.openUntil = time.time() - 1.0
+
+
+def _sent():
+    return [request[2] for request in fakesnmp.REQUESTS]
+
+
+def test_failure_opens_breaker(agent):
+    snmp = _control()
+    with pytest.raises(SNMPUnreachableError):
+        snmp.get(OID)
+
+    state = snmp.getBreakerState()
+    assert state['state'] == 'open'
+    assert state['nfailure'] == 1
+    assert state['backoff'] == shlThreads.SNMP_BACKOFF_MIN
+    assert 'timeout' in state['lastFailure']
+
+    ## Requests fail right away while the breaker is open
+    with pytest.raises(SNMPUnreachableError, match='retrying'):
+        snmp.get_many([OID])
+    assert len(fakesnmp.REQUESTS) == 1
+
+
+def test_backoff_doubles_up_to_maximum(agent, monkeypatch):
+    monkeypatch.setattr(shlThreads, 'SNMP_BACKOFF_MIN', 100.0)
+    monkeypatch.setattr(shlThreads, 'SNMP_BACKOFF_MAX', 300.0)
+    snmp = _control()
+
+    backoffs = []
+    for i in range(4):
+        _expire(snmp)
+        with pytest.raises(SNMPUnreachableError):
+            snmp.get(OID)
+        backoffs.append(snmp.getBreakerState()['backoff'])
+
+    assert backoffs == [100.0, 200.0, 300.0, 300.0]
+    assert snmp.nfailure == 4
+    assert _sent() == [(OID,)] + [(SNMP_PROBE_OID,)]*3
+
+
+def test_probe_closes_breaker(agent):
+    snmp = _control()
+    with pytest.raises(SNMPUnreachableError):
+        snmp.get(OID)
+
+    agent[('10.1.0.1', 161)] = {SNMP_PROBE_OID: fakesnmp.Integer(1), OID: fakesnmp.Integer(600)}
+    _expire(snmp)
+    assert snmp.getBreakerState()['state'] == 'probing'
+    assert snmp.get(OID) == (OID, 600)
+
+    assert _sent() == [(OID,), (SNMP_PROBE_OID,), (OID,)]
+    state = snmp.getBreakerState()
+    assert (state['state'], state['nfailure'], state['backoff']) == ('closed', 0, 0.0)
+
+
+def test_only_one_caller_probes(agent):
+    snmp = _control()
+    with pytest.raises(SNMPUnreachableError):
+        snmp.get(OID)
+
+    _expire(snmp)
+    assert snmp._checkBreaker() is True
+    with pytest.raises(SNMPUnreachableError):
+        snmp._checkBreaker()
@@ -0,0 +1,98 @@
+"""
+Tests for the compiled variable bindings that SNMPControl reuses between
+polls and a benchmark of the CPU time spent per poll.
+"""
+
+import time
+import asyncio
+
+import pytest
+
+import fakesnmp
+from shlThreads import SNMPControl, TrippLite
+
+
+def _fillAgent(agent, pdu):
+    values = agent.setdefault((pdu.ip, pdu.port), {})
+    values[pdu.oidFirmwareEntry] = fakesnmp.OctetString('12.04.0055')
+    values[pdu.oidFrequencyEntry] = fakesnmp.Integer(600)
+    values[pdu.oidVoltageEntry] = fakesnmp.Integer(120)
+    values[pdu.oidCurrentEntry] = fakesnmp.Integer(3)
+    for i in range(1, pdu.nOutlets+1):
+        values[pdu.oidOutletStatusBaseEntry+(i,)] = fakesnmp.Integer(2)
+
+
+def _control(agent, oids):
+    snmp = SNMPControl('10.1.0.1', 161, fakesnmp.CommunityData('shelter', 'public'))
+    agent[('10.1.0.1', 161)] = dict((oid, fakesnmp.Integer(i)) for i,oid in enumerate(oids))
+    return snmp
+
+
+def test_varbinds_compiled_once(agent):
+    oids = [(1,3,6,1,4,1,850,100,1,10,2,1,2,i) for i in range(1, 25)]
+    snmp = _control(agent, oids)
+
+    for i in range(50):
+        results = snmp.get_many(oids, max_varbinds=10)
+        assert [results[oid] for oid in oids] == list(range(len(oids)))
+
+    assert fakesnmp.STATS['compiled'] == len(oids)
+    assert sorted(snmp.varBinds.keys()) == sorted(oids)
+    assert len(fakesnmp.REQUESTS) == 50*3
+
+
+def test_new_oids_compiled_incrementally(agent):
+    oids = [(1,3,6,1,2,1,33,1,4,4,1,i,1) for i in range(1, 5)]
+    snmp = _control(agent, oids)
+
+    snmp.get_many(oids[:2])
+    assert fakesnmp.STATS['compiled'] == 2
+    snmp.get(oids[0])
+    snmp.get_many(oids)
+    assert fakesnmp.STATS['compiled'] == len(oids)
+
+    snmp.compile(oids)
+    assert fakesnmp.STATS['compiled'] == len(oids)
+
+
+def test_async_varbinds_compiled_once(agent):
+    oids = [(1,3,6,1,2,1,33,1,4,4,1,i,1) for i in range(1, 9)]
+    snmp = _control(agent, oids)
+    engine = fakesnmp.SnmpEngine()
+
+    async def poll():
+        for i in range(20):
+            results = await snmp.get_many_async(oids, engine, max_varbinds=5)
+            assert [results[oid] for oid in oids] == list(range(len(oids)))
+
+    asyncio.run(poll())
+    assert fakesnmp.STATS['compiled'] == len(oids)
+    assert len(fakesnmp.REQUESTS) == 20*2
+
+
+def test_poll_compiles_once(agent, datalog):
+    pdu = TrippLite('10.1.0.1', 161, fakesnmp.CommunityData('shelter', 'public'), 1)
+    _fillAgent(agent, pdu)
+
+    for i in range(20):
+        pdu.poll()
+
+    assert pdu.status[1] == 'ON' and pdu.lastError is None
+    assert fakesnmp.STATS['compiled'] == len(pdu.getPollOIDs())
+    assert fakesnmp.STATS['makeVarBinds'] == 1
+
+
+@pytest.mark.benchmark
+def test_cpu_per_poll(agent, datalog, report):
+    pdu = TrippLite('10.1.0.1', 161, fakesnmp.CommunityData('shelter', 'public'), 1)
+    _fillAgent(agent, pdu)
+
+    nPolls = 2000
+    pdu.poll()
+    tStart, cStart = time.perf_counter(), time.process_time()
+    for i in range(nPolls):
+        pdu.poll()
+    elapsed, cpu = time.perf_counter() - tStart, time.process_time() - cStart
+
+    report("TrippLite poll: %.1f us wall, %.1f us CPU per poll", elapsed/nPolls*1e6, cpu/nPolls*1e6)
+    assert pdu.lastError is None
@@ -0,0 +1,63 @@
+"""
+Tests for rendering the status and info strings from the ConditionRegistry.
+"""
+
+from shlFunctions import ConditionRegistry
+
+
+def test_render_nothing_active():
+    conditions = ConditionRegistry()
+    assert conditions.render() is None
+
+
+def test_render_warnings_in_order_raised():
+    conditions = ConditionRegistry()
+    assert conditions.set('TEMPERATURE', 'WARNING', 'Shelter temperature at 92.0 F')
+    assert conditions.set('SUMMARY', 'WARNING', 'PDU-1 unreachable')
+
+    assert conditions.render() == ('WARNING', 'TEMPERATURE! SUMMARY! Shelter temperature at 92.0 F; PDU-1 unreachable')
+
+    ## Updating a condition keeps its place, setting the same value is not
+    ## a change
+    assert conditions.set('TEMPERATURE', 'WARNING', 'Shelter temperature at 93.0 F')
+    assert not conditions.set('TEMPERATURE', 'WARNING', 'Shelter temperature at 93.0 F')
+    assert conditions.render() == ('WARNING', 'TEMPERATURE! SUMMARY! Shelter temperature at 93.0 F; PDU-1 unreachable')
+
+    assert conditions.clear('TEMPERATURE')
+    assert not conditions.clear('TEMPERATURE')
+    assert conditions.render() == ('WARNING', 'SUMMARY! PDU-1 unreachable')
+
+
+def test_render_error_hides_warnings():
+    conditions = ConditionRegistry()
+    conditions.set('SUMMARY', 'WARNING', 'PDU-1 unreachable')
+    conditions.set('SMOKE', 'ERROR', 'Shelter smoke detector activated')
+
+    assert conditions.getError() == 'SMOKE'
+    assert conditions.render() == ('ERROR', 'SMOKE! Shelter smoke detector activated')
+    assert len(conditions) == 2
+
+    conditions.clearAll()
+    assert conditions.render() is None
+    assert 'SMOKE' not in conditions
+
+
+def test_shelter_status_follows_conditions(shelter):
+    with shelter._updateState() as state:
+        state['status'] = 'NORMAL'
+
+    shelter._handleShelterTemperature(92.0)
+    shelter._handleUnreachable('PDU-1')
+    snapshot = shelter.getSnapshot()
+    assert snapshot.status == 'WARNING'
+    assert snapshot.info.startswith('TEMPERATURE! SUMMARY! Shelter temperature at 92.0 F; ')
+
+    ## An ERROR replaces all of the warnings
+    shelter._handleSmokeDetector(True)
+    snapshot = shelter.getSnapshot()
+    assert (snapshot.status, snapshot.info) == ('ERROR', 'SMOKE! Shelter smoke detector activated')
+    assert len(shelter.conditions) == 1
+
+    shelter._handleSmokeDetector(False)
+    snapshot = shelter.getSnapshot()
+    assert (snapshot.status, snapshot.info) == ('NORMAL', 'Error condition cleared, system operating normally')
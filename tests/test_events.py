@@ -0,0 +1,176 @@
+"""
+Tests for the EventQueue and the ShippingContainer.process* methods that
+post to it.
+"""
+
+from conftest import waitFor
+from shlFunctions import EventQueue
+
+
+def _drain(events):
+    """
+    Run every pending event and return the list of (handler name, args).
+    """
+
+    seen = []
+    while True:
+        event = events.get(timeout=0)
+        if event is None:
+            break
+        handler, args, tPost = event
+        handler(*args)
+        events.done(tPost)
+        seen.append((handler.__name__, args))
+    return seen
+
+
+def _record(sc, monkeypatch, *names):
+    """
+    Wrap the named _handle* methods of a ShippingContainer so that each call
+    is recorded as a three-element tuple of the name, the arguments, and the
+    system status after the call.  Returns the list of calls.
+    """
+
+    calls = []
+    def recorder(name, handler):
+        def wrapper(*args):
+            result = handler(*args)
+            calls.append((name, args, sc.currentState['status']))
+            return result
+        wrapper.__name__ = handler.__name__
+        return wrapper
+
+    for name in names:
+        monkeypatch.setattr(sc, name, recorder(name, getattr(sc, name)))
+    return calls
+
+
+def _settle(sc):
+    """
+    Wait for the event thread to process everything that has been posted.
+    """
+
+    def settled():
+        stats = sc.getEventStats()
+        return stats['depth'] == 0 and stats['processed'] + stats['coalesced'] == stats['posted']
+    assert waitFor(settled)
+
+
+def _operating(sc):
+    """
+    Put an un-initialized ShippingContainer into the NORMAL state so that
+    warnings can be raised.
+    """
+
+    with sc._updateState() as state:
+        state['status'] = 'NORMAL'
+        state['info'] = 'SHL ready'
+
+
+def test_coalesce_equal_args_keeps_first_position():
+    events = EventQueue()
+    seen = []
+    events.post('A', seen.append, 1)
+    events.post('B', seen.append, 2)
+    events.post('A', seen.append, 1)
+
+    _drain(events)
+    assert seen == [1, 2]
+    assert events.getStats()['coalesced'] == 1
+    assert events.getStats()['processed'] == 2
+
+
+def test_different_args_are_queued_in_order():
+    events = EventQueue()
+    seen = []
+    events.post('A', seen.append, 1)
+    events.post('B', seen.append, 2)
+    events.post('A', seen.append, 3)
+    events.post('A', seen.append, 3)
+
+    _drain(events)
+    assert seen == [1, 2, 3]
+    assert events.getStats()['coalesced'] == 1
+    assert len(events.latest) == 0
+
+
+def test_critical_temperature_not_replaced_by_other_device(shelter, monkeypatch):
+    _operating(shelter)
+    calls = _record(shelter, monkeypatch, '_handleShelterTemperature')
+    with shelter.events.lock:
+        shelter.processShelterTemperature(120.0, source='Comet-1')
+        shelter.processShelterTemperature(70.0, source='HWg-2')
+
+    _settle(shelter)
+    assert calls == [('_handleShelterTemperature', (120.0,), 'ERROR'),
+                     ('_handleShelterTemperature', (70.0,), 'NORMAL')]
+
+
+def test_temperature_from_same_device(shelter, monkeypatch):
+    _operating(shelter)
+    calls = _record(shelter, monkeypatch, '_handleShelterTemperature')
+    with shelter.events.lock:
+        shelter.processShelterTemperature(80.0, source='Comet-1')
+        shelter.processShelterTemperature(80.0, source='Comet-1')
+        shelter.processShelterTemperature(95.0, source='Comet-1')
+
+    _settle(shelter)
+    assert calls == [('_handleShelterTemperature', (80.0,), 'NORMAL'),
+                     ('_handleShelterTemperature', (95.0,), 'WARNING')]
+    assert shelter.getEventStats()['coalesced'] == 1
+
+
+def test_unreachable_states_processed_in_order(shelter, monkeypatch):
+    _operating(shelter)
+    calls = _record(shelter, monkeypatch, '_handleUnreachable')
+    with shelter.events.lock:
+        shelter.processUnreachable('PDU-1')
+        shelter.processUnreachable('PDU-1')
+        shelter.processUnreachable('cleared-PDU-1')
+        shelter.processUnreachable('PDU-1')
+
+    _settle(shelter)
+    assert calls == [('_handleUnreachable', ('PDU-1',), 'WARNING'),
+                     ('_handleUnreachable', ('cleared-PDU-1',), 'NORMAL'),
+                     ('_handleUnreachable', ('PDU-1',), 'WARNING')]
+    assert list(shelter.currentState['unreachableDevices'].keys()) == ['PDU-1']
+
+
+def test_smoke_raised_then_cleared(shelter, monkeypatch):
+    _operating(shelter)
+    calls = _record(shelter, monkeypatch, '_handleSmokeDetector')
+    with shelter.events.lock:
+        shelter.processSmokeDetector(True)
+        shelter.processSmokeDetector(False)
+
+    _settle(shelter)
+    assert calls == [('_handleSmokeDetector', (True,), 'ERROR'),
+                     ('_handleSmokeDetector', (False,), 'NORMAL')]
+    assert 'SMOKE' not in shelter.conditions
+
+
+def test_power_outage_raised_then_cleared(shelter, monkeypatch):
+    _operating(shelter)
+    calls = _record(shelter, monkeypatch, '_handlePowerOutage')
+    with shelter.events.lock:
+        shelter.processPowerOutage(True)
+        shelter.processPowerOutage(True)
+        shelter.processPowerOutage(False)
+
+    _settle(shelter)
+    assert calls == [('_handlePowerOutage', (True,), 'ERROR'),
+                     ('_handlePowerOutage', (False,), 'NORMAL')]
+    assert shelter.getSnapshot().info == 'Power restored, system operating normally'
+
+
+def test_unreachable_devices_are_independent(shelter, monkeypatch):
+    _operating(shelter)
+    calls = _record(shelter, monkeypatch, '_handleUnreachable')
+    with shelter.events.lock:
+        shelter.processUnreachable('PDU-1')
+        shelter.processUnreachable('cleared-PDU-2')
+
+    _settle(shelter)
+    assert calls == [('_handleUnreachable', ('PDU-1',), 'WARNING'),
+                     ('_handleUnreachable', ('cleared-PDU-2',), 'WARNING')]
+    assert list(shelter.currentState['unreachableDevices'].keys()) == ['PDU-1']
@@ -0,0 +1,123 @@
+"""
+Golden-packet tests and a throughput benchmark for the MCS packet codec.
+"""
+
+import time
+
+import pytest
+
+from MCS import decodePacket, encodeResponse, Communicate, MCS_HEADER_BYTES
+
+
+def _legacyResponse(destination, sender, command, reference, mjd, mpm, status, systemStatus, data):
+    """
+    Response built the way Communicate.sendResponse() did before the codec.
+    """
+
+    payload = "%3s%3s%3s%9i" % (destination, sender, command, reference)
+    payload += "%4i%6i%9i" % (len(data)+8, mjd, mpm)
+    payload += ' ' + ('A' if status else 'R') + ("%7s" % systemStatus) + data
+    return bytes(payload, 'ascii')
+
+
+def _legacyParse(data):
+    """
+    Command parsing the way Communicate.parsePacket() did before the codec.
+    """
+
+    data = data.decode('ascii')
+    return (data[:3], data[3:6], data[6:9], int(data[9:18]), int(data[18:22]),
+            int(data[22:28]), int(data[28:37]), data[38:38+int(data[18:22])])
+
+
+GOLDEN_COMMANDS = [
+    (b'SHLMCSRPT        1  11 60231 43200123 TEMPERATURE',
+     ('SHL', 'MCS', 'RPT', 1, 11, 60231, 43200123, 'TEMPERATURE')),
+    (b'SHLMCSPWR123456789   6 60231        0 1 2 ON',
+     ('SHL', 'MCS', 'PWR', 123456789, 6, 60231, 0, '1 2 ON')),
+    (b'ALLMCSPNG       42   0 59000 86399999 ',
+     ('ALL', 'MCS', 'PNG', 42, 0, 59000, 86399999, '')),
+    (b'SHLMCSRPT        2   7 60231     1000 SUMMARYtrailing',
+     ('SHL', 'MCS', 'RPT', 2, 7, 60231, 1000, 'SUMMARY')),
+]
+
+GOLDEN_RESPONSES = [
+    (('MCS', 'SHL', 'RPT', 123456789, 60231, 43200123, True, 'NORMAL', '75.25'),
+     b'MCSSHLRPT123456789  13 60231 43200123 A NORMAL75.25'),
+    (('MCS', 'SHL', 'PWR', 7, 60231, 0, False, 'WARNING', ''),
+     b'MCSSHLPWR        7   8 60231        0 RWARNING'),
+]
+
+
+def test_decode_golden_commands():
+    for packet,expected in GOLDEN_COMMANDS:
+        assert decodePacket(packet) == expected
+        assert decodePacket(memoryview(bytearray(packet))) == expected
+        assert decodePacket(packet) == _legacyParse(packet)
+
+
+def test_decode_from_receive_buffer():
+    buffer = bytearray(1024)
+    packet = GOLDEN_COMMANDS[1][0]
+    buffer[:len(packet)] = packet
+    assert decodePacket(memoryview(buffer)[:len(packet)]) == GOLDEN_COMMANDS[1][1]
+
+
+def test_parse_packet_accepts_str_and_bytes():
+    comm = Communicate.__new__(Communicate)
+    for packet,expected in GOLDEN_COMMANDS:
+        assert comm.parsePacket(packet) == expected
+        assert comm.parsePacket(packet.decode('ascii')) == expected
+
+
+def test_encode_golden_responses():
+    buffer = bytearray(1024)
+    for args,expected in GOLDEN_RESPONSES:
+        nBytes = encodeResponse(buffer, *args)
+        assert bytes(buffer[:nBytes]) == expected
+        assert bytes(buffer[:nBytes]) == _legacyResponse(*args)
+
+
+def test_encode_matches_legacy():
+    buffer = bytearray(4096)
+    for systemStatus in ('NORMAL', 'WARNING', 'ERROR', 'BOOTING', 'SHUTDWN', 'UNK'):
+        for reference in (0, 1, 999999999):
+            for data in ('', 'A', '75.25', 'X'*1000, b'bytes data'):
+                args = ('MCS', 'SHL', 'RPT', reference, 60231, 86399999, reference % 2 == 0, systemStatus, data)
+                nBytes = encodeResponse(buffer, *args)
+                legacyData = data.decode('ascii') if isinstance(data, bytes) else data
+                assert bytes(buffer[:nBytes]) == _legacyResponse(*(args[:-1] + (legacyData,)))
+
+
+def test_round_trip_header_size():
+    buffer = bytearray(1024)
+    nBytes = encodeResponse(buffer, 'MCS', 'SHL', 'RPT', 5, 60231, 1, True, 'NORMAL', 'value')
+    assert nBytes == MCS_HEADER_BYTES + 8 + len('value')
+    destination, sender, command, reference, datalen, mjd, mpm, data = decodePacket(buffer[:nBytes])
+    assert (destination, sender, command, reference, mjd, mpm) == ('MCS', 'SHL', 'RPT', 5, 60231, 1)
+    assert datalen == 13
+    assert data == 'A NORMALvalue'
+
+
+@pytest.mark.benchmark
+def test_packets_per_second(report):
+    nPackets = 20000
+    packet = GOLDEN_COMMANDS[0][0]
+    receive = memoryview(bytearray(1024))
+    receive[:len(packet)] = packet
+    view = receive[:len(packet)]
+    send = bytearray(1024)
+
+    tStart = time.perf_counter()
+    for i in range(nPackets):
+        decodePacket(view)
+        encodeResponse(send, 'MCS', 'SHL', 'RPT', i, 60231, 43200123, True, 'NORMAL', '75.25')
+    tCodec = time.perf_counter() - tStart
+
+    tStart = time.perf_counter()
+    for i in range(nPackets):
+        _legacyParse(packet)
+        _legacyResponse('MCS', 'SHL', 'RPT', i, 60231, 43200123, True, 'NORMAL', '75.25')
+    tLegacy = time.perf_counter() - tStart
+
+    report("%.0f packets/s, legacy string handling: %.0f packets/s", nPackets/tCodec, nPackets/tLegacy)
@@ -0,0 +1,112 @@
+"""
+Tests and a dispatch-cost benchmark for the MIB dispatcher used for RPT.
+"""
+
+import time
+
+import pytest
+
+from MCS import MIBDispatcher
+from shlFunctions import RACK_MIBS, UPS_MIBS, WEATHER_MIBS
+
+
+def _icdNames(nRacks=6, nOutlets=8):
+    """
+    Return the MIB entry names from the SHL ICD for a station with the
+    given number of racks and outlets.
+    """
+
+    names = ['SUMMARY', 'INFO', 'LASTLOG', 'SUBSYSTEM', 'SERIALNO', 'VERSION',
+             'POWER-FLICKER', 'POWER-OUTAGE', 'LIGHTNING-RADIUS', 'LIGHTNING-10MIN',
+             'LIGHTNING-30MIN', 'SET-POINT', 'DIFFERENTIAL', 'TEMPERATURE',
+             'TEMPERATURE-MIN', 'TEMPERATURE-MAX', 'TEMPERATURE-MEAN', 'SMOKE', 'WATER',
+             'DOOR', 'PWR-SEQUENCE']
+    for rack in range(1, nRacks+1):
+        for prefix,getter,missing,format in RACK_MIBS + UPS_MIBS:
+            names.append('%s%i' % (prefix, rack))
+        for port in range(1, nOutlets+1):
+            names.append('PWR-R%i-%i' % (rack, port))
+    names.extend([name for name,getter,missing,format in WEATHER_MIBS])
+    names.extend(['TEMPERATURE-S%i' % sensor for sensor in range(1, 9)])
+    names.extend(['AGE-%s' % name for name in ('CURRENT-R1', 'WX-WIND', 'PWR-R2-3')])
+    return names
+
+
+def _timeLookups(mibs, names, repeats=5, loops=20):
+    best = None
+    for r in range(repeats):
+        tStart = time.perf_counter()
+        for l in range(loops):
+            for name in names:
+                mibs.lookup(name)
+        elapsed = (time.perf_counter() - tStart) / (loops*len(names))
+        best = elapsed if best is None else min([best, elapsed])
+    return best
+
+
+def test_every_icd_name_has_a_handler(communicator):
+    mibs = communicator.mibs
+    for name in _icdNames():
+        handler, param = mibs.lookup(name)
+        assert handler is not None, name
+
+
+def test_parameters(communicator):
+    mibs = communicator.mibs
+    assert mibs.lookup('CURRENT-R3')[1] == '3'
+    assert mibs.lookup('PWR-R2-11')[1] == '2-11'
+    assert mibs.lookup('TEMPERATURE-S4')[1] == '4'
+    assert mibs.lookup('AGE-WX-WIND')[1] == 'WX-WIND'
+    assert mibs.lookup('TEMPERATURE')[1] == ''
+    assert mibs.lookup('TEMPERATURE-MAX')[1] == ''
+    assert mibs.lookup('NOT-A-MIB') == (None, None)
+
+
+def test_longest_prefix_wins():
+    mibs = MIBDispatcher()
+    mibs.registerPrefix('A-', lambda name, param: (True, 'short'))
+    mibs.registerPrefix('A-B-', lambda name, param: (True, 'long'))
+
+    assert mibs.dispatch('A-B-1') == (True, 'long')
+    assert mibs.dispatch('A-C-1') == (True, 'short')
+
+
+@pytest.mark.benchmark
+def test_dispatch_cost_does_not_grow_with_registry_size(communicator, report):
+    names = _icdNames()
+    mibs = communicator.mibs
+    tBase = _timeLookups(mibs, names)
+
+    for i in range(2000):
+        mibs.register('EXTRA-%i' % i, lambda name, param: (True, ''))
+        mibs.registerPrefix('EXTRA-P%i-' % i, lambda name, param: (True, ''))
+    tLarge = _timeLookups(mibs, names)
+
+    report("%.2f us/lookup for %i ICD names, %.2f us/lookup with 4000 extra entries", tBase*1e6, len(names), tLarge*1e6)
+
+
+@pytest.mark.benchmark
+def test_dispatch_cost_against_linear_chain(communicator, report):
+    names = _icdNames()
+    mibs = communicator.mibs
+
+    # Stand-in for the old if/elif chain - the registered prefixes and names
+    # checked in order
+    chain = sorted(mibs.exact.keys()) + sorted([prefix for prefix in mibs.expanders.keys()], key=len, reverse=True)
+    def chainLookup(name):
+        for entry in chain:
+            if name == entry or name.startswith(entry):
+                return entry
+        return None
+
+    tChain = None
+    for r in range(5):
+        tStart = time.perf_counter()
+        for l in range(20):
+            for name in names:
+                chainLookup(name)
+        elapsed = (time.perf_counter() - tStart) / (20*len(names))
+        tChain = elapsed if tChain is None else min([tChain, elapsed])
+    tTable = _timeLookups(mibs, names)
+
+    report("%.2f us/lookup with the table, %.2f us/lookup with a linear chain", tTable*1e6, tChain*1e6)
@@ -0,0 +1,49 @@
+"""
+Tests for expanding wildcard MIB entries in batched RPT requests.
+"""
+
+from MCS import MIBDispatcher
+
+
+def _dispatcher(store=None):
+    racks = list(range(1, 13))
+    mibs = MIBDispatcher(store=store)
+    mibs.register('TEMPERATURE', lambda name, param: (True, '70.00'))
+    mibs.register('TEMPERATURE-MIN', lambda name, param: (True, '65.00'))
+    mibs.registerPrefix('CURRENT-R', lambda name, param: (True, param), expander=lambda: racks)
+    mibs.registerPrefix('PWR-R', lambda name, param: (True, 'ON'),
+                        expander=lambda: ['%i-%i' % (r, p) for r in racks for p in (1, 2, 10)])
+    return mibs
+
+
+def test_rack_wildcard_matches_whole_number():
+    mibs = _dispatcher()
+    assert mibs.expand('PWR-R1*') == ['PWR-R1-1', 'PWR-R1-2', 'PWR-R1-10']
+    assert mibs.expand('PWR-R1-1*') == ['PWR-R1-1']
+    assert mibs.expand('CURRENT-R1*') == ['CURRENT-R1']
+    assert mibs.expand('PWR-R12-*') == ['PWR-R12-1', 'PWR-R12-2', 'PWR-R12-10']
+
+
+def test_wildcard_on_text():
+    mibs = _dispatcher()
+    assert mibs.expand('TEMPERATURE*') == ['TEMPERATURE', 'TEMPERATURE-MIN']
+    assert mibs.expand('TEMP*') == ['TEMPERATURE', 'TEMPERATURE-MIN']
+    assert len(mibs.expand('PWR-R*')) == 36
+    assert mibs.expand('SUMMARY') == ['SUMMARY']
+
+
+def test_age_wildcard(communicator):
+    store = communicator.SubSystemInstance.mibStore
+    for name in ('CURRENT-R1', 'CURRENT-R10', 'PWR-R1-1', 'TEMPERATURE'):
+        store.update(name, '1', 60.0)
+
+    mibs = _dispatcher(store=store)
+    mibs.registerPrefix('AGE-', lambda name, param: (True, '0.0'),
+                        expander=communicator._listPublished)
+
+    assert mibs.expand('AGE-*') == ['AGE-CURRENT-R1', 'AGE-CURRENT-R10', 'AGE-PWR-R1-1', 'AGE-TEMPERATURE']
+    assert mibs.expand('AGE-CURRENT-R1*') == ['AGE-CURRENT-R1']
+
+    status, response = mibs.dispatchMany('AGE-PWR*')
+    assert status
+    assert response.startswith('AGE-PWR-R1-1=')
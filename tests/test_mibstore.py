@@ -0,0 +1,94 @@
+"""
+Tests for the MIBStore and how the published values are served and cleared.
+"""
+
+from MCS import MIBDispatcher
+from shlFunctions import RACK_MIBS, WEATHER_MIBS, MIBStore
+
+
+def test_store_expires_values():
+    store = MIBStore()
+    store.update('CURRENT-R1', '1.5', 60.0)
+    store.update('OLD', 'x', -1.0)
+
+    assert store.get('CURRENT-R1') == '1.5'
+    assert store.get('OLD') is None
+    assert [entry[0] for entry in store.getEntries()] == ['CURRENT-R1']
+
+
+def test_remove_prefix():
+    store = MIBStore()
+    for name in ('PWR-R1-1', 'PWR-R1-2', 'PWR-R10-1'):
+        store.update(name, 'ON', 60.0)
+    store.removePrefix('PWR-R1-')
+
+    assert store.get('PWR-R1-1') is None
+    assert store.get('PWR-R10-1') == 'ON'
+
+
+def test_dispatch_prefers_store():
+    store = MIBStore()
+    mibs = MIBDispatcher(store=store)
+    mibs.register('TEMPERATURE', lambda name, param: (False, 'not ready'))
+
+    assert mibs.dispatch('TEMPERATURE') == (False, 'not ready')
+    store.update('TEMPERATURE', '75.00', 60.0)
+    assert mibs.dispatch('TEMPERATURE') == (True, '75.00')
+    store.clear()
+    assert mibs.dispatch('TEMPERATURE') == (False, 'not ready')
+
+
+def test_stopped_device_is_not_published(ready):
+    device = ready.devices[('thermometers', 'thermometer1')]
+    device.stop(wait=True)
+    ready.mibStore.clear()
+
+    assert ready.processSample(device) is False
+    assert ready.mibStore.getEntries() == []
+
+
+def test_sht_clears_store(ready, monkeypatch):
+    saved = []
+    saveSnapshot = ready.saveSnapshot
+    def recorder():
+        saved.append(ready.mibStore.getEntries())
+        return saveSnapshot()
+    monkeypatch.setattr(ready, 'saveSnapshot', recorder)
+
+    assert ready.shutdown(timeout=10.0)
+    assert 'PWR-R1-1' in [entry[0] for entry in saved[0]]
+    assert ready.mibStore.get('PWR-R1-1') is None
+    assert ready.mibStore.getEntries() == []
+
+
+def test_publishing_does_not_touch_last_log(ready):
+    ready.currentState['lastLog'] = 'PWR: finished'
+    for key in (('thermometers', 'thermometer1'), ('enviromux', 'enviromux1')):
+        device = ready.devices[key]
+        device.temp = [None for value in device.temp]
+        ready.processSample(device)
+
+    assert ready.currentState['lastLog'] == 'PWR: finished'
+    assert ready.mibStore.get('TEMPERATURE') is None
+    assert ready.mibStore.get('CURRENT-R1') == '0.3'
+
+
+def test_published_values_match_getters(ready):
+    wx = ready.currentState['wxThread']
+    wx.MonitorPeriod = 60.0
+    wx.updatetime = 1.7e9
+    wx.usUnits = True
+    wx.temperature, wx.humidity, wx.pressure = 71.25, 45.0, 29.92
+    wx.windSpeed, wx.windDir, wx.windGust, wx.windGustDir = 5.0, 270, 12.5, 280
+    wx.rainRate, wx.rain = 0.1, 1.25
+    wx.alive.set()
+    try:
+        assert ready.processSample(wx) is True
+        for name,getter,missing,format in WEATHER_MIBS:
+            assert ready.mibStore.get(name) == getattr(ready, getter)()[1]
+    finally:
+        wx.alive.clear()
+
+    for name,getter,missing,format in RACK_MIBS:
+        status, value = getattr(ready, getter)(1)
+        assert ready.mibStore.get('%s1' % name) == (missing if value is None else format % (value,))
@@ -0,0 +1,98 @@
+"""
+Tests for the cached MJD/MPM clock in MCS.
+"""
+
+import math
+import time
+from datetime import datetime, timezone
+
+import MCS
+
+
+def _referenceTime(t):
+    """
+    MJD and MPM for a UNIX time in ns using the Gregorian calendar arithmetic
+    from the original MCS.getTime().
+    """
+
+    dt = datetime.fromtimestamp(t // 1000000000, tz=timezone.utc)
+    microsecond = (t // 1000) % 1000000
+
+    a = (14 - dt.month) // 12
+    y = dt.year + 4800 - a
+    m = dt.month + (12 * a) - 3
+    p = dt.day + (((153 * m) + 2) // 5) + (365 * y)
+    q = (y // 4) - (y // 100) + (y // 400) - 32045
+    mjd = int(math.floor( (p+q) - 2400000.5))
+    mpm = int(math.floor( (dt.hour*3600 + dt.minute*60 + dt.second)*1000 + microsecond / 1000 ))
+    return (mjd, mpm)
+
+
+def _ns(*args):
+    return int(datetime(*args, tzinfo=timezone.utc).timestamp()) * 1000000000
+
+
+BOUNDARIES = [
+    (1970, 1, 2),     # first day boundary after the epoch
+    (2024, 5, 17),    # ordinary day
+    (2024, 6, 1),     # 31 day month
+    (2024, 7, 1),     # 30 day month
+    (2025, 1, 1),     # year
+    (2024, 2, 29),    # leap day
+    (2024, 3, 1),     # end of a leap February
+    (2023, 3, 1),     # end of a non-leap February
+    (2000, 2, 29),    # leap century
+    (2000, 3, 1),
+    (2100, 3, 1),     # non-leap century
+    (2038, 1, 19),    # 32-bit time_t rollover day
+]
+
+OFFSETS_MS = [-86400000, -3600000, -1001, -1, 0, 1, 999, 1000, 43200000, 86399999]
+
+
+def test_day_boundary_sweep(monkeypatch):
+    monkeypatch.setattr(MCS, '_DAY_CACHE', (0, 0, 0))
+    for boundary in BOUNDARIES:
+        tBoundary = _ns(*boundary)
+        for offset in OFFSETS_MS:
+            for extra in (0, 1, 999999):
+                t = tBoundary + offset*1000000 + extra
+                assert MCS._getTime(t) == _referenceTime(t), (boundary, offset, extra)
+
+
+def test_every_day_for_years(monkeypatch):
+    monkeypatch.setattr(MCS, '_DAY_CACHE', (0, 0, 0))
+    tStart = _ns(1999, 12, 1)
+    for day in range(0, 366*6):
+        t = tStart + day*86400000000000
+        for offset in (-1, 0, 1):
+            tOffset = t + offset*1000000
+            assert MCS._getTime(tOffset) == _referenceTime(tOffset)
+
+
+def test_cache_going_backwards(monkeypatch):
+    monkeypatch.setattr(MCS, '_DAY_CACHE', (0, 0, 0))
+    t = _ns(2024, 3, 1)
+    assert MCS._getTime(t) == _referenceTime(t)
+    assert MCS._getTime(t - 1) == _referenceTime(t - 1)
+    assert MCS._getTime(t) == _referenceTime(t)
+
+
+def test_mpm_range():
+    t = _ns(2024, 3, 1)
+    assert MCS._getTime(t)[1] == 0
+    assert MCS._getTime(t - 1)[1] == 86399999
+
+
+def test_get_time_matches_clock():
+    mjd, mpm = MCS.getTime()
+    t = time.time_ns()
+    refMJD, refMPM = _referenceTime(t)
+    assert mjd == refMJD or (refMPM < 1000 and mjd == refMJD - 1)
+    assert abs((refMPM - mpm) % 86400000) < 1000
+
+
+def test_monotonic_time_tracks_wall_clock():
+    mjd, mpm = MCS.getMonotonicTime()
+    refMJD, refMPM = MCS.getTime()
+    assert abs((refMJD*86400000 + refMPM) - (mjd*86400000 + mpm)) < 1000
@@ -0,0 +1,103 @@
+"""
+Tests for walking a table column and discovering the number of outlets on a
+PDU.
+"""
+
+import fakesnmp
+from conftest import initialize
+from shlThreads import SNMPControl, TrippLite
+from fakesnmp import CommunityData
+
+
+def _pdu(agent, nFound, nOutlets=8, community=None):
+    if community is None:
+        community = CommunityData('public')
+    pdu = TrippLite('127.0.0.1', 161, community, 2, nOutlets=nOutlets)
+    agent[('127.0.0.1', 161)] = dict([(pdu.oidOutletStatusBaseEntry+(i,), 2) for i in range(1, nFound+1)])
+    return pdu
+
+
+def _column(agent):
+    root = (1,3,6,1,4,1,850,100,1,10,2,1,2)
+    agent[('127.0.0.1', 161)] = {root+(1,): 2, root+(2,): 1, root+(3,1): 3,
+                                 (1,3,6,1,4,1,850,100,1,10,2,1,4,1): 2,
+                                 root[:-1]+(1,1): 1}
+    return root
+
+
+def test_walk_uses_bulk_for_v2c(agent):
+    root = _column(agent)
+    snmp = SNMPControl('127.0.0.1', 161, CommunityData('public'))
+
+    assert snmp.walk(root) == {(1,): 2, (2,): 1, (3,1): 3}
+    assert [request[0] for request in fakesnmp.REQUESTS] == ['BULK']
+
+
+def test_walk_uses_next_for_v1(agent):
+    root = _column(agent)
+    snmp = SNMPControl('127.0.0.1', 161, CommunityData('public', mpModel=0))
+
+    assert snmp.walk(root) == {(1,): 2, (2,): 1, (3,1): 3}
+    assert [request[0] for request in fakesnmp.REQUESTS] == ['NEXT']
+
+
+def test_walk_skips_end_of_mib(agent):
+    root = _column(agent)
+    agent[('127.0.0.1', 161)][root+(4,)] = fakesnmp.EndOfMibView()
+    snmp = SNMPControl('127.0.0.1', 161, CommunityData('public'))
+
+    assert (4,) not in snmp.walk(root)
+
+
+def test_discovery_shrinks_outlets(agent):
+    pdu = _pdu(agent, 4)
+    assert pdu.discoverOutlets() == 4
+    assert pdu.nOutlets == 4
+    assert pdu.status == {1: 'ON', 2: 'ON', 3: 'ON', 4: 'ON'}
+    assert pdu.getPollOIDs()[-1] == pdu.oidOutletStatusBaseEntry+(4,)
+
+
+def test_discovery_grows_outlets_with_gaps(agent):
+    pdu = _pdu(agent, 10, nOutlets=8)
+    values = agent[('127.0.0.1', 161)]
+    del values[pdu.oidOutletStatusBaseEntry+(9,)]
+    values[pdu.oidOutletStatusBaseEntry+(3,)] = 1
+    values[pdu.oidOutletStatusBaseEntry+(5,)] = 7
+
+    assert pdu.discoverOutlets() == 10
+    assert pdu.status[3] == 'OFF'
+    assert pdu.status[5] == 'UNK'
+    assert pdu.status[9] == 'UNK'
+    assert pdu.status[10] == 'ON'
+
+
+def test_discovery_over_v1(agent):
+    pdu = _pdu(agent, 6, community=CommunityData('public', mpModel=0))
+    assert pdu.discoverOutlets() == 6
+    assert [request[0] for request in fakesnmp.REQUESTS] == ['NEXT']
+
+
+def test_discovery_failure_keeps_configuration(agent):
+    pdu = _pdu(agent, 0)
+    assert pdu.discoverOutlets() is None
+    assert pdu.nOutlets == 8
+
+    del agent[('127.0.0.1', 161)]
+    assert pdu.discoverOutlets() is None
+    assert pdu.nOutlets == 8
+
+
+def test_ini_prunes_published_outlets(shelter, agent):
+    config = shelter.config['pdus']['devices']['pdu002']
+    base = TrippLite(config['ip'], config['port'], None, 2).oidOutletStatusBaseEntry
+    for port in range(5, 9):
+        del agent[(config['ip'], config['port'])][base+(port,)]
+    for port in range(1, 9):
+        shelter.mibStore.update('PWR-R2-%i' % port, 'ON', 600.0)
+    shelter.mibStore.update('PWR-R20-8', 'ON', 600.0)
+
+    initialize(shelter)
+    assert shelter.currentState['pduThreads'][1].nOutlets == 4
+    assert sorted(shelter.mibStore.getNames('PWR-R2-')) == ['PWR-R2-%i' % port for port in range(1, 5)]
+    assert shelter.mibStore.get('PWR-R20-8') == 'ON'
+    assert len(shelter.mibStore.getNames('PWR-R1-')) == 8
@@ -0,0 +1,76 @@
+"""
+Tests for the adaptive polling policy of the PDUs.
+"""
+
+import time
+import threading
+
+import fakesnmp
+from shlThreads import AdaptivePollPolicy, TrippLite
+
+
+def _expireHold(policy):
+    policy.tTrigger = time.time() - policy.hold - 1.0
+
+
+def test_fixed_period_without_fast_period():
+    policy = AdaptivePollPolicy(60.0)
+    assert not policy.trigger('outlet 1 command')
+    assert policy.nextPeriod() == 60.0
+    assert policy.getState()['lastTrigger'] is None
+
+
+def test_period_decays_after_hold():
+    policy = AdaptivePollPolicy(60.0, fastPeriod=5.0, hold=30.0)
+    assert policy.nextPeriod() == 60.0
+
+    assert policy.trigger('outlet 1 command')
+    assert [policy.nextPeriod() for i in range(3)] == [5.0]*3
+
+    _expireHold(policy)
+    assert [policy.nextPeriod() for i in range(6)] == [10.0, 20.0, 40.0, 60.0, 60.0, 60.0]
+    assert policy.getPeriod() == 60.0
+
+    ## A new trigger starts over from the fast period
+    policy.trigger('current step')
+    assert policy.nextPeriod() == 5.0
+    state = policy.getState()
+    assert (state['lastReason'], state['nTrigger']) == ('current step', 2)
+
+
+def test_configure_keeps_state():
+    policy = AdaptivePollPolicy(60.0, fastPeriod=5.0)
+    policy.trigger('outlet 1 command')
+
+    policy.configure(60.0, fastPeriod=10.0)
+    assert policy.getPeriod() == 10.0
+    policy.configure(30.0, fastPeriod=None)
+    assert policy.getPeriod() == 30.0
+
+
+def test_get_period_takes_lock():
+    policy = AdaptivePollPolicy(60.0, fastPeriod=5.0)
+    periods = []
+    thread = threading.Thread(target=lambda: periods.append(policy.getPeriod()))
+    with policy.lock:
+        thread.start()
+        thread.join(0.1)
+        assert thread.is_alive()
+        policy.period = 5.0
+    thread.join(1.0)
+    assert periods == [5.0]
+
+
+def test_current_step_speeds_up_pdu(agent, datalog):
+    pdu = TrippLite('10.1.0.1', 161, fakesnmp.CommunityData('shelter', 'public'), 1, MonitorPeriod=60.0)
+    pdu.setPollPolicy(60.0, fastPeriod=5.0, currentStep=1.0)
+    values = agent.setdefault((pdu.ip, pdu.port), {})
+    for oid in pdu.getPollOIDs():
+        values[oid] = fakesnmp.Integer(2)
+    values[pdu.oidCurrentEntry] = fakesnmp.Integer(30)
+
+    assert pdu.poll() > 5.0
+    values[pdu.oidCurrentEntry] = fakesnmp.Integer(50)
+    assert pdu.poll() <= 5.0
+    assert pdu.getPollPeriod() == 5.0
+    assert pdu.pollPolicy.getState()['lastReason'] == 'current step'
@@ -0,0 +1,252 @@
+"""
+Tests for the polling generations of the monitoring classes and for the
+threaded and asyncio polling engines.
+"""
+
+import sys
+import time
+import asyncio
+import threading
+
+import pytest
+
+import fakesnmp
+import shlThreads
+from conftest import waitFor, makeConfig
+from shlThreads import _PolledDevice, AsyncPollEngine, PollScheduler, TrippLite
+from shlFunctions import ShippingContainer
+
+
+class FakeEngine(object):
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.registered = []
+
+    def register(self, device, generation, delay=0.0):
+        with self.lock:
+            self.registered.append(generation)
+
+
+class Device(_PolledDevice):
+    MonitorPeriod = 1.0
+
+    def __init__(self):
+        self._setupPolling()
+
+    def poll(self, results=None):
+        return None
+
+
+def test_start_stop_generations(monkeypatch):
+    engine = FakeEngine()
+    monkeypatch.setattr(shlThreads, '_POLL_ENGINE', engine)
+
+    device = Device()
+    device.start()
+    assert device.alive.is_set()
+    assert engine.registered == [1]
+
+    device.stop()
+    assert not device.alive.is_set()
+    assert device.pollGeneration == 2
+
+    device.wake()
+    assert engine.registered == [1]
+
+
+def test_concurrent_wake_does_not_lose_generations(monkeypatch):
+    engine = FakeEngine()
+    monkeypatch.setattr(shlThreads, '_POLL_ENGINE', engine)
+
+    device = Device()
+    device.start()
+
+    nThreads, nWakes = 8, 500
+    def waker():
+        for i in range(nWakes):
+            device.wake()
+
+    threads = [threading.Thread(target=waker) for i in range(nThreads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert device.pollGeneration == 1 + nThreads*nWakes
+    assert sorted(engine.registered) == list(range(1, 2 + nThreads*nWakes))
+
+
+class Counter(_PolledDevice):
+    """
+    Device that records the generation of every poll and can be made slow or
+    made to fail.
+    """
+
+    def __init__(self, period, duration=0.0, fail=False):
+        self._setupPolling()
+        self.MonitorPeriod = period
+        self.duration = duration
+        self.fail = fail
+        self.polls = []
+        self.running = [0, 0]
+        self.runningLock = threading.Lock()
+
+    def poll(self):
+        with self.runningLock:
+            self.running[0] += 1
+            self.running[1] = max([self.running[1], self.running[0]])
+        time.sleep(self.duration)
+        self.polls.append(self.pollGeneration)
+        with self.runningLock:
+            self.running[0] -= 1
+        if self.fail:
+            raise RuntimeError('poll failed')
+        return None
+
+
+def test_scheduler_polls_every_period(monkeypatch):
+    scheduler = PollScheduler(nWorkers=2)
+    monkeypatch.setattr(shlThreads, '_POLL_ENGINE', scheduler)
+
+    device = Counter(0.05)
+    device.start()
+    assert waitFor(lambda: len(device.polls) >= 4)
+    device.stop(wait=True)
+    nPolls = len(device.polls)
+    time.sleep(0.2)
+    assert len(device.polls) == nPolls
+    assert device.polls == [1]*nPolls
+
+
+def test_scheduler_drops_stale_generations(monkeypatch):
+    scheduler = PollScheduler(nWorkers=2)
+    monkeypatch.setattr(shlThreads, '_POLL_ENGINE', scheduler)
+
+    device = Counter(60.0)
+    device.alive.set()
+    generation = device._nextGeneration()
+    scheduler.register(device, generation - 1)
+    scheduler.register(device, generation, delay=0.05)
+    assert waitFor(lambda: len(device.polls) == 1)
+    time.sleep(0.1)
+    assert device.polls == [generation]
+
+    ## A wake replaces the schedule and a stop drops it
+    device.wake()
+    assert waitFor(lambda: len(device.polls) == 2)
+    assert device.polls[-1] == generation + 1
+    scheduler.register(device, device.pollGeneration, delay=0.05)
+    device.stop()
+    time.sleep(0.15)
+    assert len(device.polls) == 2
+
+
+def test_scheduler_workers_are_bounded(monkeypatch):
+    scheduler = PollScheduler(nWorkers=2)
+    monkeypatch.setattr(shlThreads, '_POLL_ENGINE', scheduler)
+
+    devices = [Counter(60.0, duration=0.05) for i in range(6)]
+    running = [0, 0]
+    lock = threading.Lock()
+    for device in devices:
+        device.running = running
+        device.runningLock = lock
+        device.start()
+
+    assert waitFor(lambda: all(len(device.polls) == 1 for device in devices))
+    assert running[1] == 2
+    assert len(scheduler.workers) == 2
+
+
+def test_scheduler_keeps_polling_after_failure(monkeypatch):
+    scheduler = PollScheduler(nWorkers=1)
+    monkeypatch.setattr(shlThreads, '_POLL_ENGINE', scheduler)
+
+    device = Counter(0.05, fail=True)
+    device.start()
+    assert waitFor(lambda: len(device.polls) >= 3)
+    device.stop(wait=True)
+
+
+def _gets(pdu):
+    return len([request for request in fakesnmp.REQUESTS if request[0] == 'GET' and request[1] == (pdu.ip, pdu.port)])
+
+
+def _tasks(engine):
+    """
+    Return the number of pollDevice coroutines running in the engine's loop.
+    """
+
+    async def count():
+        return len([task for task in asyncio.all_tasks() if task is not asyncio.current_task()])
+    return asyncio.run_coroutine_threadsafe(count(), engine.loop).result(5.0)
+
+
+def test_async_engine_polls_until_stopped(agent, datalog, monkeypatch):
+    engine = AsyncPollEngine()
+    monkeypatch.setattr(shlThreads, '_POLL_ENGINE', engine)
+
+    pdu = TrippLite('10.1.0.1', 161, fakesnmp.CommunityData('shelter', 'public'), 1, MonitorPeriod=0.05)
+    values = agent.setdefault((pdu.ip, pdu.port), {})
+    for oid in pdu.getPollOIDs():
+        values[oid] = fakesnmp.Integer(2)
+
+    ## register -> pollDevice -> runPoll, repeated every MonitorPeriod
+    pdu.start()
+    assert waitFor(lambda: _gets(pdu) >= 3)
+    assert pdu.status[1] == 'ON' and pdu.lastError is None
+    assert _tasks(engine) == 1
+
+    ## A wake hands the device to a new coroutine and the old one exits
+    pdu.wake()
+    nGets = _gets(pdu)
+    assert waitFor(lambda: _gets(pdu) >= nGets + 3)
+    assert waitFor(lambda: _tasks(engine) == 1)
+
+    ## Stopping the device ends the polling
+    pdu.stop()
+    assert waitFor(lambda: _tasks(engine) == 0)
+    nGets = _gets(pdu)
+    time.sleep(0.2)
+    assert _gets(pdu) == nGets
+
+
+def test_async_run_poll_drops_stale_generation():
+    engine = AsyncPollEngine()
+    polls = []
+
+    class Recorder(_PolledDevice):
+        MonitorPeriod = 1.0
+
+        def __init__(self):
+            self._setupPolling()
+
+        def poll(self, results=None):
+            polls.append(results)
+            return 0.5
+
+    device = Recorder()
+    device.alive.set()
+    generation = device._nextGeneration()
+    assert engine.runPoll(device, generation, {'a': 1}) == (True, 0.5)
+    assert engine.runPoll(device, generation - 1, {'a': 2}) == (False, None)
+    device.alive.clear()
+    assert engine.runPoll(device, generation, {'a': 3}) == (False, None)
+    assert polls == [{'a': 1}]
+
+
+def test_asyncio_engine_needs_pysnmp_asyncio(monkeypatch):
+    assert shlThreads.isAsyncPollingAvailable()
+
+    ## Stand-in for pysnmp 4.4.x under Python 3.11+ where the import fails
+    monkeypatch.setitem(sys.modules, 'pysnmp.hlapi.asyncio', None)
+    monkeypatch.setattr(shlThreads, '_POLL_ENGINE', PollScheduler())
+    assert not shlThreads.isAsyncPollingAvailable()
+
+    config = makeConfig()
+    config['polling']['engine'] = 'asyncio'
+    with pytest.raises(ValueError):
+        ShippingContainer.validateConfig(config)
+
+    shlThreads.setPollEngine('asyncio')
+    assert isinstance(shlThreads._POLL_ENGINE, PollScheduler)
@@ -0,0 +1,102 @@
+"""
+Tests for multi-outlet power sequences.
+"""
+
+import time
+
+import pytest
+
+import fakesnmp
+from shlThreads import SNMPControl
+from fakesnmp import CommunityData, Integer
+
+
+def _sets(sc):
+    """
+    Return the outlet SETs sent to each rack as a dictionary of rack number
+    to a list of {outlet: status} dictionaries, one per SET request.
+    """
+
+    racks = dict([((pdu.ip, pdu.port), r+1) for r,pdu in enumerate(sc.currentState['pduThreads'])])
+    sets = {}
+    for request in list(fakesnmp.REQUESTS):
+        if request[0] != 'SET':
+            continue
+        pdu = sc.currentState['pduThreads'][racks[request[1]]-1]
+        changes = {}
+        for oid,value in request[2]:
+            assert oid[:-1] == pdu.oidOutletChangeBaseEntry
+            changes[oid[-1]] = pdu.outletStatusCodes[int(value)]
+        sets.setdefault(racks[request[1]], []).append(changes)
+    return sets
+
+
+def _wait(sc, state, timeout=5.0):
+    tStart = time.time()
+    while time.time() - tStart < timeout:
+        with sc.sequenceLock:
+            if sc.sequence['state'] == state:
+                return sc.sequence
+        time.sleep(0.01)
+    raise AssertionError("sequence did not reach %s" % state)
+
+
+def _waitForSet(sc, timeout=5.0):
+    tStart = time.time()
+    while time.time() - tStart < timeout:
+        if len(_sets(sc)) > 0:
+            return
+        time.sleep(0.01)
+    raise AssertionError("no SET was sent")
+
+
+def test_sequence_runs_steps(ready):
+    assert ready.pwrSequence('SEQ ON 0 1-1,2-1;1-2') == (True, 0)
+    _wait(ready, 'DONE')
+
+    assert _sets(ready) == {1: [{1: 'ON'}, {2: 'ON'}], 2: [{1: 'ON'}]}
+    assert ready.getPowerSequence() == (True, 'DONE ON 2/2 1-1=OK,2-1=OK,1-2=OK')
+
+
+def test_repeated_outlet_rejected(ready):
+    assert ready.pwrSequence('SEQ ON 0 1-1;1-1') == (False, 0x06)
+    assert ready.pwrSequence('SEQ ON 0 1-1,1-1') == (False, 0x06)
+    assert ready.sequence is None
+    assert _sets(ready) == {}
+
+
+def test_new_sequence_aborts_delay(ready):
+    assert ready.pwrSequence('SEQ ON 60 1-1;1-2') == (True, 0)
+    first = _wait(ready, 'RUNNING')
+    _waitForSet(ready)
+
+    tStart = time.time()
+    assert ready.pwrSequence('SEQ OFF 0 1-3') == (True, 0)
+    _wait(ready, 'DONE')
+    assert time.time() - tStart < 5.0
+
+    assert first['state'] == 'ABORTED'
+    assert first['results'][(1,2)] == 'PENDING'
+    assert _sets(ready) == {1: [{1: 'ON'}, {3: 'OFF'}]}
+
+
+def test_abort_for_sht(ready):
+    assert ready.pwrSequence('SEQ ON 60 1-1;1-2') == (True, 0)
+    _waitForSet(ready)
+
+    tStart = time.time()
+    assert ready.shutdown(timeout=10.0) is True
+    assert time.time() - tStart < 5.0
+    assert ready.sequence['state'] == 'ABORTED'
+    assert not ready.sequence['thread'].is_alive()
+    assert _sets(ready) == {1: [{1: 'ON'}]}
+
+
+def test_set_many_rejects_repeated_oid(agent):
+    agent[('127.0.0.1', 161)] = {}
+    snmp = SNMPControl('127.0.0.1', 161, CommunityData('public'))
+    with pytest.raises(ValueError):
+        snmp.set_many([((1,3,6,1,1), Integer(1)), ((1,3,6,1,1), Integer(2))])
+
+    results = snmp.set_many([((1,3,6,1,1), Integer(1)), ((1,3,6,1,2), Integer(2))])
+    assert sorted(results.keys()) == [(1,3,6,1,1), (1,3,6,1,2)]
@@ -0,0 +1,108 @@
+"""
+Tests for the read-back of the outlets after a PWR command.
+"""
+
+import time
+
+import fakesnmp
+import shlThreads
+from shlThreads import TrippLite
+from fakesnmp import CommunityData
+
+
+class SlowOutlet(dict):
+    """
+    Agent values where an outlet reports OFF until 'latency' seconds after
+    the command and then ON.
+    """
+
+    def __init__(self, oid, latency):
+        super(SlowOutlet, self).__init__()
+        self.oid = oid
+        self.latency = latency
+        self.tCommand = time.time()
+
+    def get(self, oid, default=None):
+        if oid == self.oid:
+            return 2 if time.time() - self.tCommand >= self.latency else 1
+        return super(SlowOutlet, self).get(oid, default)
+
+
+def _pdu(monkeypatch, window):
+    monkeypatch.setattr(shlThreads, 'READBACK_DELAY', 0.01)
+    monkeypatch.setattr(shlThreads, 'READBACK_CYC_DELAY', 0.02)
+    pdu = TrippLite('127.0.0.1', 161, CommunityData('public'), 1, nOutlets=2)
+    pdu.readBackWindow = window
+    pdu.readBackCycWindow = 1.0
+    pdu.alive.set()
+    return pdu
+
+
+def test_confirmed_within_window(agent, monkeypatch):
+    pdu = _pdu(monkeypatch, 0.5)
+    values = SlowOutlet(pdu.oidOutletStatusBaseEntry+(1,), 0.05)
+    agent[('127.0.0.1', 161)] = values
+
+    assert pdu._readBack({1: 'ON'}, values.tCommand) == {1: True}
+    assert pdu.status[1] == 'ON'
+    assert pdu.getCommandStats()['confirmed'] == 1
+
+
+def test_slow_pdu_widens_window(agent, monkeypatch):
+    pdu = _pdu(monkeypatch, 0.1)
+    assert pdu.getReadBackWindow('ON') == 0.1
+
+    values = SlowOutlet(pdu.oidOutletStatusBaseEntry+(1,), 0.3)
+    agent[('127.0.0.1', 161)] = values
+    assert pdu._readBack({1: 'ON'}, values.tCommand) == {1: True}
+
+    stats = pdu.getCommandStats()
+    assert stats['confirmed'] == 1 and stats['unconfirmed'] == 0
+    assert pdu.getReadBackWindow('ON') >= 2*0.3
+    assert pdu.getReadBackWindow('CYC') == 1.0
+
+
+def test_not_confirmed(agent, monkeypatch):
+    pdu = _pdu(monkeypatch, 0.05)
+    pdu.readBackCycWindow = 0.2
+    values = SlowOutlet(pdu.oidOutletStatusBaseEntry+(1,), 60.0)
+    agent[('127.0.0.1', 161)] = values
+
+    assert pdu._readBack({1: 'ON'}, values.tCommand) == {1: False}
+    assert pdu.getCommandStats()['unconfirmed'] == 1
+    assert pdu.getReadBackWindow('ON') == 0.05
+
+
+def test_one_request_per_pass_for_all_outlets(ready, agent, monkeypatch):
+    monkeypatch.setattr(shlThreads, 'READBACK_DELAY', 0.01)
+    pdu = ready.currentState['pduThreads'][0]
+    pdu.readBackWindow = 0.5
+    pdu.readBackCycWindow = 0.3
+    published = []
+    processOutletStates = ready.processOutletStates
+    def recorder(device, outlets):
+        published.append(dict(outlets))
+        return processOutletStates(device, outlets)
+    monkeypatch.setattr(ready, 'processOutletStates', recorder)
+
+    values = SlowOutlet(pdu.oidOutletStatusBaseEntry+(1,), 0.1)
+    values.update(agent[(pdu.ip, pdu.port)])
+    values[pdu.oidOutletStatusBaseEntry+(1,)] = 1
+    agent[(pdu.ip, pdu.port)] = values
+    ready.mibStore.update('PWR-R1-2', 'ON', 60.0)
+    del fakesnmp.REQUESTS[:]
+
+    assert pdu._readBack({1: 'ON', 2: 'ON', 3: 'CYC'}, values.tCommand - 0.01) == {1: True, 2: True, 3: False}
+    base = pdu.oidOutletStatusBaseEntry
+    gets = [request[2] for request in fakesnmp.REQUESTS
+            if request[0] == 'GET' and all(oid[:len(base)] == base for oid in request[2])]
+    assert len(gets[0]) == 3
+    assert all(len(oids) == 2 for oids in gets[1:3])
+    assert gets[-1] == (base+(3,),)
+
+    ## Only the outlet that changed is published
+    assert published[0] == {1: 'OFF'}
+    assert {1: 'ON'} in published
+    assert all(list(outlets.keys()) == [1] for outlets in published)
+    assert ready.mibStore.get('PWR-R1-1') == 'ON'
+    assert pdu.getCommandStats()['confirmed'] == 2
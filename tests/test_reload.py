@@ -0,0 +1,96 @@
+"""
+Tests for reloading the configuration on SIGHUP and for shutting down on
+SIGTERM.
+"""
+
+import json
+import time
+
+
+def _writeConfig(comm, config):
+    with open(comm.opts.config, 'w') as fh:
+        fh.write(json.dumps(config))
+
+
+def test_communicator_updated_after_reload(communicator):
+    shelter = communicator.SubSystemInstance
+    config = json.loads(json.dumps(shelter.config))
+    config['mcs']['dedup_entries'] = 16
+    _writeConfig(communicator, config)
+
+    assert communicator.reloadConfig() is True
+    assert shelter.config == config
+    assert communicator.config == config
+    assert communicator.responseCache.maxEntries == 16
+    assert shelter.currentState['lastLog'].startswith('RELOAD: finished')
+
+
+def test_failed_reload_keeps_communicator_config(communicator):
+    shelter = communicator.SubSystemInstance
+    original = communicator.config
+    config = json.loads(json.dumps(shelter.config))
+    config['mcs']['dedup_entries'] = 16
+    _writeConfig(communicator, config)
+
+    shelter.currentState['activeProcess'].append('SHT')
+    try:
+        assert communicator.reloadConfig() is False
+    finally:
+        shelter.currentState['activeProcess'].remove('SHT')
+    assert communicator.config is original
+    assert shelter.config is original
+    assert shelter.currentState['lastLog'].startswith('RELOAD: Blocking operation in progress')
+
+
+def test_unreadable_config_rejected(communicator, tmp_path):
+    shelter = communicator.SubSystemInstance
+    original = communicator.config
+    communicator.opts.config = str(tmp_path / 'missing.json')
+
+    assert communicator.reloadConfig() is False
+    assert communicator.config is original
+    assert shelter.config is original
+    assert shelter.currentState['lastLog'].startswith('RELOAD: rejected')
+
+
+def test_shutdown_waits_for_ini(shelter):
+    assert shelter.ini('72&1.0&11') == (True, 0)
+    assert shelter.shutdown(mode='SCRAM', timeout=10.0) is True
+
+    assert shelter.currentState['ready'] is False
+    assert shelter.currentState['activeProcess'] == []
+    assert shelter.getSnapshot().status == 'SHUTDWN'
+    assert not any(device.alive.isSet() for device in shelter._getMonitors())
+
+
+def test_shutdown_times_out_when_blocked(shelter):
+    shelter.currentState['activeProcess'].append('RELOAD')
+    try:
+        tStart = time.time()
+        assert shelter.shutdown(timeout=0.3) is False
+        assert 0.3 <= time.time() - tStart < 5.0
+    finally:
+        shelter.currentState['activeProcess'].remove('RELOAD')
+    assert not shelter.shutdownComplete.is_set()
+
+
+def test_shutdown_rejects_unknown_mode(shelter):
+    assert shelter.shutdown(mode='NOW', timeout=1.0) is False
+    assert shelter.currentState['lastLog'].startswith('SHT: Invalid command arguments')
+
+
+def test_reload_rebuilds_only_changed_devices(ready):
+    config = json.loads(json.dumps(ready.config))
+    config['pdus']['devices']['pdu002']['description'] = 'Renamed PDU'
+    pdu1, pdu2 = ready.currentState['pduThreads']
+    thermometer = ready.devices[('thermometers', 'thermometer1')]
+    tUpdate = ready.mibStore.entries['CURRENT-R1'][1]
+
+    assert ready.reload(config) is True
+    assert ready.currentState['lastLog'].endswith('1 monitor(s) rebuilt')
+    assert ready.currentState['pduThreads'][0] is pdu1
+    assert ready.currentState['pduThreads'][1] is not pdu2
+    assert ready.devices[('thermometers', 'thermometer1')] is thermometer
+    assert not pdu2.alive.isSet()
+    assert pdu1.alive.isSet() and thermometer.alive.isSet()
+    assert ready.mibStore.entries['CURRENT-R1'][1] == tUpdate
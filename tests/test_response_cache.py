@@ -0,0 +1,142 @@
+"""
+Tests for the ResponseCache used to answer retransmitted MCS commands.
+"""
+
+import socket
+
+import fakesnmp
+from conftest import waitFor
+from MCS import ResponseCache, decodePacket
+
+
+def _packet(command, reference, data='', mjd=60000, mpm=1000):
+    return ("%3s%3s%3s%9i%4i%6i%9i %s" % ('SHL', 'MCS', command, reference, len(data), mjd, mpm, data)).encode('ascii')
+
+
+def test_rpt_retransmission_hits():
+    cache = ResponseCache()
+    key = cache.getKey(_packet('RPT', 1, 'SUMMARY'))
+    cache.put(key, b'response')
+
+    assert cache.get(cache.getKey(_packet('RPT', 1, 'SUMMARY'))) == b'response'
+    assert cache.hits == 1
+
+
+def test_state_changing_commands_are_cached():
+    cache = ResponseCache()
+    for command,data in (('INI', '72&1.0&11'), ('SHT', ''), ('PWR', '101OFF'), ('TMP', '75.0')):
+        key = cache.getKey(_packet(command, 1, data))
+        assert key is not None
+        cache.put(key, command.encode('ascii'))
+    assert len(cache.entries) == 4
+    assert cache.get(cache.getKey(_packet('PWR', 1, '101OFF'))) == b'PWR'
+
+
+def test_reused_reference_is_not_a_retransmission():
+    cache = ResponseCache()
+    cache.put(cache.getKey(_packet('RPT', 7, 'SUMMARY', mpm=1000)), b'old')
+
+    assert cache.get(cache.getKey(_packet('RPT', 7, 'SUMMARY', mpm=2000))) is None
+    assert cache.get(cache.getKey(_packet('RPT', 7, 'INFO', mpm=1000))) is None
+    assert cache.get(cache.getKey(_packet('RPT', 7, 'SUMMARY', mjd=60001, mpm=1000))) is None
+
+
+def test_short_packet():
+    assert ResponseCache.getKey(b'SHLMCSRPT') is None
+
+
+def test_eviction_and_expiry():
+    cache = ResponseCache(maxEntries=2, window=30.0)
+    keys = [cache.getKey(_packet('RPT', i, 'SUMMARY')) for i in range(3)]
+    for key in keys:
+        cache.put(key, key)
+    assert cache.get(keys[0]) is None
+    assert cache.get(keys[2]) == keys[2]
+
+    cache.window = -1.0
+    assert cache.get(keys[2]) is None
+    assert keys[2] not in cache.entries
+
+
+def test_disabled_cache():
+    cache = ResponseCache(maxEntries=0)
+    key = cache.getKey(_packet('RPT', 1, 'SUMMARY'))
+    cache.put(key, b'response')
+    assert cache.get(key) is None
+
+
+def _exchange(comm, packets, timeout=5.0):
+    """
+    Send command packets to a started communicator, process them, and
+    return the responses it sends back to MCS.
+    """
+
+    listener = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    listener.bind(('127.0.0.1', comm.config['mcs']['message_out_port']))
+    listener.settimeout(timeout)
+    sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        for packet in packets:
+            sender.sendto(packet, ('127.0.0.1', comm.config['mcs']['message_in_port']))
+
+        nSent = [0]
+        def processed():
+            nSent[0] += comm.receiveCommand()[0]
+            return nSent[0] >= len(packets)
+        assert waitFor(processed, timeout)
+
+        return [listener.recv(65536) for packet in packets]
+    finally:
+        listener.close()
+        sender.close()
+
+
+def _count(obj, name, monkeypatch):
+    """
+    Count the calls to a method of an object.
+    """
+
+    calls = []
+    method = getattr(obj, name)
+    def wrapper(*args, **kwds):
+        calls.append(args)
+        return method(*args, **kwds)
+    monkeypatch.setattr(obj, name, wrapper)
+    return calls
+
+
+def _outletSets(sc):
+    return [request for request in fakesnmp.REQUESTS if request[0] == 'SET']
+
+
+def test_duplicate_ini_answered_from_cache(communicator, monkeypatch):
+    shelter = communicator.SubSystemInstance
+    calls = _count(shelter, 'ini', monkeypatch)
+    communicator.start()
+
+    packet = _packet('INI', 5, '72&1.0&11')
+    responses = _exchange(communicator, [packet, packet])
+    assert len(calls) == 1
+    assert responses[0] == responses[1]
+    assert decodePacket(responses[0])[7][0] == 'A'
+    assert communicator.responseCache.hits == 1
+
+    assert waitFor(lambda: shelter.currentState['ready'] and 'INI' not in shelter.currentState['activeProcess'])
+
+
+def test_duplicate_pwr_answered_from_cache(ready, communicator, monkeypatch):
+    calls = _count(ready, 'pwr', monkeypatch)
+    communicator.start()
+
+    packet = _packet('PWR', 6, '101OFF')
+    responses = _exchange(communicator, [packet, packet])
+    assert calls == [(1, 1, 'OFF')]
+    assert responses[0] == responses[1]
+    assert decodePacket(responses[0])[7][0] == 'A'
+    assert waitFor(lambda: len(_outletSets(ready)) == 1)
+
+    ## A new command for the same outlet is run again
+    responses = _exchange(communicator, [_packet('PWR', 7, '101OFF')])
+    assert decodePacket(responses[0])[7][0] == 'A'
+    assert len(calls) == 2
+    assert waitFor(lambda: len(_outletSets(ready)) == 2)
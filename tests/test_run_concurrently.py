@@ -0,0 +1,48 @@
+"""
+Tests for starting and stopping the monitoring threads concurrently.
+"""
+
+import logging
+import threading
+
+from shlFunctions import ShippingContainer
+
+
+def test_functions_run_in_parallel():
+    barrier = threading.Barrier(4, timeout=5.0)
+    done = []
+    def worker():
+        barrier.wait()
+        done.append(True)
+
+    ## Each function waits for all of the others so this only finishes if 
+    ## they run at the same time
+    ShippingContainer._runConcurrently([worker for i in range(4)])
+    assert done == [True]*4
+    assert not barrier.broken
+
+
+def test_failures_are_logged(caplog):
+    done = []
+    def boom():
+        raise RuntimeError('device unreachable')
+
+    with caplog.at_level(logging.ERROR):
+        ShippingContainer._runConcurrently([boom, lambda: done.append(1), lambda: done.append(2)])
+
+    assert sorted(done) == [1, 2]
+    assert [record.getMessage() for record in caplog.records] == ['Failed to run boom: device unreachable']
+
+
+def test_sht_stops_monitors_in_parallel(ready, monkeypatch):
+    monitors = ready._getMonitors()
+    barrier = threading.Barrier(len(monitors), timeout=5.0)
+    for device in monitors:
+        def stop(stop=device.stop):
+            barrier.wait()
+            stop()
+        monkeypatch.setattr(device, 'stop', stop)
+
+    assert ready.shutdown(timeout=10.0)
+    assert not barrier.broken
+    assert not any(device.alive.isSet() for device in monitors)
@@ -0,0 +1,71 @@
+"""
+Tests for saving the state snapshot at SHT and restoring it after a restart.
+"""
+
+import json
+import time
+from datetime import datetime, timedelta, timezone
+
+import shlFunctions
+from conftest import initialize, waitFor
+
+
+def test_snapshot_round_trip(makeShelter, tmp_path):
+    first = initialize(makeShelter())
+    tStrike = datetime.now(timezone.utc) - timedelta(minutes=5)
+    tFlicker = datetime.now(timezone.utc) - timedelta(minutes=2)
+    with first.currentState['strikeThread'].lock:
+        first.currentState['strikeThread'].strikes[tStrike] = 12.5
+    first.currentState['outageThread'].flicker_120 = tFlicker
+    first._handleUnreachable('PDU-9')
+    tUnreachable = first.currentState['unreachableDevices']['PDU-9']
+    entries = dict((name, (value, tUpdate)) for name,value,tUpdate,maxAge in first.mibStore.getEntries())
+    assert first.shutdown(timeout=10.0)
+    assert (tmp_path / 'snapshot.json').exists()
+
+    ## The MIB values are back, with their original ages, before INI
+    second = makeShelter()
+    for name,(value,tUpdate) in entries.items():
+        assert second.mibStore.get(name) == value
+        assert second.mibStore.entries[name][1] == tUpdate
+    assert second.restored['unreachable'] == {'PDU-9': tUnreachable}
+
+    ## The rest is applied by INI
+    initialize(second)
+    assert second.restored == {}
+    assert second.currentState['strikeThread'].strikes[tStrike] == 12.5
+    assert second.currentState['outageThread'].flicker_120 == tFlicker
+    assert second.currentState['unreachableDevices']['PDU-9'] == tUnreachable
+
+
+def test_old_snapshot_ignored(shelter, tmp_path):
+    snapshot = {'time': time.time() - 2*shlFunctions.SNAPSHOT_MAX_AGE,
+                'mibs': [('CURRENT-R1', '0.3', time.time(), 60.0)]}
+    (tmp_path / 'snapshot.json').write_text(json.dumps(snapshot))
+
+    assert shelter.loadSnapshot() is False
+    assert shelter.mibStore.getEntries() == []
+
+
+def test_corrupt_snapshot_ignored(shelter, tmp_path):
+    (tmp_path / 'snapshot.json').write_text('{"time": ')
+    assert shelter.loadSnapshot() is False
+
+    snapshot = {'time': time.time(), 'mibs': [('CURRENT-R1', '0.3', time.time(), 60.0)],
+                'strikes': [('not a time', 1.0)]}
+    (tmp_path / 'snapshot.json').write_text(json.dumps(snapshot))
+    assert shelter.loadSnapshot() is False
+    assert shelter.mibStore.getEntries() == []
+    assert shelter.restored == {}
+
+
+def test_expire_clears_devices_not_reported_again(shelter):
+    restored = {'PDU-1': 100.0, 'PDU-2': 200.0}
+    shelter.currentState['unreachableDevices'].update(restored)
+
+    ## PDU-2 was reported again after the restart
+    shelter.currentState['unreachableDevices']['PDU-2'] = 300.0
+    shelter._expireSnapshot(restored)
+
+    assert waitFor(lambda: 'PDU-1' not in shelter.currentState['unreachableDevices'])
+    assert shelter.currentState['unreachableDevices'] == {'PDU-2': 300.0}
@@ -0,0 +1,75 @@
+"""
+Tests for the batched GETs in SNMPControl.get_many().
+"""
+
+import asyncio
+
+import pytest
+
+import fakesnmp
+from shlThreads import SNMPControl
+
+
+def _control(agent, oids):
+    snmp = SNMPControl('10.1.0.1', 161, fakesnmp.CommunityData('shelter', 'public'))
+    agent[('10.1.0.1', 161)] = dict((oid, fakesnmp.Integer(i)) for i,oid in enumerate(oids))
+    return snmp
+
+
+def _gets():
+    return [len(request[2]) for request in fakesnmp.REQUESTS if request[0] == 'GET']
+
+
+OIDS = [(1,3,6,1,4,1,850,100,1,10,2,1,2,i) for i in range(1, 31)]
+
+
+def test_batched_get(agent):
+    snmp = _control(agent, OIDS)
+
+    results = snmp.get_many(OIDS, max_varbinds=24)
+    assert [results[oid] for oid in OIDS] == list(range(len(OIDS)))
+    assert _gets() == [24, 6]
+
+
+def test_missing_oid_does_not_fail_batch(agent):
+    snmp = _control(agent, OIDS[:3])
+
+    results = snmp.get_many(OIDS[:4])
+    assert [results[oid] for oid in OIDS[:3]] == [0, 1, 2]
+    assert isinstance(results[OIDS[3]], RuntimeError)
+    assert _gets() == [4]
+
+
+def test_too_big_splits_batch(agent):
+    snmp = _control(agent, OIDS)
+    fakesnmp.LIMITS[('10.1.0.1', 161)] = 7
+
+    results = snmp.get_many(OIDS, max_varbinds=24)
+    assert [results[oid] for oid in OIDS] == list(range(len(OIDS)))
+    assert _gets() == [24, 12, 6, 6, 12, 6, 6, 6]
+
+
+def test_too_big_single_oid_fails(agent):
+    snmp = _control(agent, OIDS[:2])
+    fakesnmp.LIMITS[('10.1.0.1', 161)] = 0
+
+    results = snmp.get_many(OIDS[:2])
+    assert all(isinstance(results[oid], RuntimeError) for oid in OIDS[:2])
+    assert 'tooBig' in str(results[OIDS[0]])
+    assert _gets() == [2, 1, 1]
+
+
+def test_async_too_big_splits_batch(agent):
+    snmp = _control(agent, OIDS[:10])
+    fakesnmp.LIMITS[('10.1.0.1', 161)] = 4
+
+    results = asyncio.run(snmp.get_many_async(OIDS[:10], fakesnmp.SnmpEngine()))
+    assert [results[oid] for oid in OIDS[:10]] == list(range(10))
+    assert _gets() == [10, 5, 2, 3, 5, 2, 3]
+
+
+def test_unreachable_raises(agent):
+    snmp = SNMPControl('10.1.0.2', 161, fakesnmp.CommunityData('shelter', 'public'))
+
+    with pytest.raises(RuntimeError):
+        snmp.get_many(OIDS)
@@ -0,0 +1,155 @@
+"""
+Tests for the shared pool of SNMP command generators and the cost of
+creating a large number of PDUs.
+"""
+
+import io
+import time
+import threading
+import tracemalloc
+
+import pytest
+
+import fakesnmp
+from conftest import initialize, shutdownShelter
+import shlThreads
+from shlThreads import _GeneratorPool, TrippLite, POLL_WORKERS, SNMP_SPARE_ENGINES
+
+
+def _fillAgent(agent, pdu):
+    values = agent.setdefault((pdu.ip, pdu.port), {})
+    values[pdu.oidFirmwareEntry] = fakesnmp.OctetString('12.04.0055')
+    values[pdu.oidFrequencyEntry] = fakesnmp.Integer(600)
+    values[pdu.oidVoltageEntry] = fakesnmp.Integer(120)
+    values[pdu.oidCurrentEntry] = fakesnmp.Integer(3)
+    for i in range(1, pdu.nOutlets+1):
+        values[pdu.oidOutletStatusBaseEntry+(i,)] = fakesnmp.Integer(2)
+
+
+def _buildPDUs(n):
+    community = fakesnmp.CommunityData('shelter', 'public')
+    return [TrippLite('10.1.%i.%i' % (i // 250, i % 250 + 1), 161, community, i+1) for i in range(n)]
+
+
+def _pollAll(pdus, nThreads):
+    def worker(i):
+        for pdu in pdus[i::nThreads]:
+            pdu.poll()
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(nThreads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def _constructionCost(n):
+    tracemalloc.start()
+    pdus = _buildPDUs(n)
+    size, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return pdus, size
+
+
+def test_engines_do_not_grow_with_devices(agent, monkeypatch):
+    ## PDU.poll() appends to a data log under /data
+    monkeypatch.setattr(shlThreads, 'open', lambda filename, mode: io.StringIO(), raising=False)
+
+    size = POLL_WORKERS + SNMP_SPARE_ENGINES
+    for n in (7, 100):
+        fakesnmp.reset()
+        pool = _GeneratorPool(size)
+        monkeypatch.setattr(shlThreads, '_GENERATORS', pool)
+
+        pdus = _buildPDUs(n)
+        assert fakesnmp.STATS['engines'] == 0
+        for pdu in pdus:
+            _fillAgent(agent, pdu)
+
+        _pollAll(pdus, 16)
+        assert all(pdu.status[1] == 'ON' and pdu.lastError is None for pdu in pdus)
+        assert fakesnmp.STATS['engines'] == pool.nCreated
+        assert pool.nCreated <= size
+        assert pool.getStats()['idle'] == pool.nCreated
+
+
+def test_memory_per_pdu():
+    ## Warm up the imports and caches used by the constructors
+    _buildPDUs(1)
+
+    pdus7, size7 = _constructionCost(7)
+    pdus100, size100 = _constructionCost(100)
+
+    ## No per-device SNMP engines means the cost per PDU stays small and
+    ## roughly constant
+    assert fakesnmp.STATS['engines'] == 0
+    assert size100/100.0 < 2.0*size7/7.0
+    assert size100/100.0 < 64*1024
+
+
+@pytest.mark.benchmark
+def test_ini_cost(makeShelter, report):
+    results = []
+    for n in (7, 100):
+        sc = makeShelter(nPDUs=n)
+        tStart = time.perf_counter()
+        initialize(sc, timeout=60.0)
+        elapsed = time.perf_counter() - tStart
+        assert all(pdu.alive.isSet() for pdu in sc.currentState['pduThreads'])
+        shutdownShelter(sc)
+        results.extend([elapsed*1000, elapsed*1000/n])
+
+    report("7 PDUs: INI in %.1f ms (%.2f ms/PDU); 100 PDUs: INI in %.1f ms (%.2f ms/PDU)",
+           *results)
+
+
+def test_borrow_waits_for_a_free_generator():
+    pool = _GeneratorPool(1)
+    order = []
+
+    def borrower():
+        with pool.borrow() as generator:
+            order.append(('second', generator))
+
+    with pool.borrow() as generator:
+        thread = threading.Thread(target=borrower)
+        thread.start()
+        thread.join(0.2)
+        assert thread.is_alive()
+        order.append(('first', generator))
+    thread.join(1.0)
+
+    assert not thread.is_alive()
+    assert [name for name,generator in order] == ['first', 'second']
+    assert order[0][1] is order[1][1]
+    assert pool.nCreated == 1
+
+
+def test_resize_releases_waiters():
+    pool = _GeneratorPool(1)
+    done = threading.Event()
+
+    def borrower():
+        with pool.borrow():
+            done.set()
+
+    with pool.borrow():
+        thread = threading.Thread(target=borrower)
+        thread.start()
+        assert not done.wait(0.2)
+        pool.resize(2)
+        assert done.wait(1.0)
+    thread.join(1.0)
+    assert pool.getStats() == {'size': 2, 'created': 2, 'idle': 2}
+
+    pool.resize(0)
+    assert pool.size == 1
+
+
+def test_set_poll_engine_resizes_pool(monkeypatch):
+    pool = _GeneratorPool(1)
+    monkeypatch.setattr(shlThreads, '_GENERATORS', pool)
+    monkeypatch.setattr(shlThreads, '_POLL_ENGINE', None)
+    shlThreads.setPollEngine('threads', nWorkers=3)
+    assert shlThreads._POLL_ENGINE.nWorkers == 3
+    assert pool.size == 3 + SNMP_SPARE_ENGINES
@@ -0,0 +1,85 @@
+"""
+Tests, including a concurrency stress test, for the SystemState snapshots.
+"""
+
+import threading
+
+from shlFunctions import SystemState
+
+
+def test_snapshot_keys_and_plain_keys():
+    state = SystemState()
+    state['ready'] = False
+    state['status'] = 'BOOTING'
+
+    snapshot = state.getSnapshot()
+    assert snapshot.status == 'BOOTING'
+    assert snapshot.version == 1
+    assert state['status'] == 'BOOTING'
+    assert state['ready'] is False
+    assert 'status' not in dict(state)
+
+
+def test_transaction_publishes_once():
+    state = SystemState()
+    with state.transaction() as current:
+        current['status'] = 'WARNING'
+        current['info'] = 'Something happened'
+    snapshot = state.getSnapshot()
+    assert (snapshot.version, snapshot.status, snapshot.info) == (1, 'WARNING', 'Something happened')
+
+    with state.transaction() as current:
+        pass
+    assert state.getSnapshot().version == 1
+
+
+def test_concurrent_writers_and_reader(communicator):
+    state = communicator.SubSystemInstance.currentState
+    with state.transaction() as current:
+        current['status'] = 'NORMAL'
+        current['info'] = 'NORMAL'
+    version = state.getSnapshot().version
+
+    nWriters, nWrites = 8, 500
+    stop = threading.Event()
+    errors = []
+    nReads = [0]
+
+    def writer(w):
+        for i in range(nWrites):
+            status = ('NORMAL', 'WARNING', 'ERROR')[(w + i) % 3]
+            with state.transaction() as current:
+                current['status'] = status
+                current['info'] = '%s from writer %i' % (status, w)
+            state['lastLog'] = 'writer %i write %i' % (w, i)
+
+    def reader():
+        lastVersion = 0
+        while not stop.is_set():
+            snapshot = state.getSnapshot()
+            if not snapshot.info.startswith(snapshot.status):
+                errors.append(snapshot)
+            if snapshot.version < lastVersion:
+                errors.append(('version went backwards', lastVersion, snapshot.version))
+            lastVersion = snapshot.version
+
+            ## RPT SUMMARY and INFO handlers
+            status, summary = communicator._rptSummary('SUMMARY', '')
+            status, info = communicator._rptInfo('INFO', '')
+            if summary not in ('NORMAL', 'WARNING', 'ERROR') or not info.startswith(('NORMAL', 'WARNING', 'ERROR')):
+                errors.append((summary, info))
+            nReads[0] += 1
+
+    readers = [threading.Thread(target=reader) for i in range(2)]
+    writers = [threading.Thread(target=writer, args=(w,)) for w in range(nWriters)]
+    for thread in readers + writers:
+        thread.start()
+    for thread in writers:
+        thread.join()
+    stop.set()
+    for thread in readers:
+        thread.join()
+
+    assert errors == []
+    assert nReads[0] > 0
+    assert state.getSnapshot().version == version + 2*nWriters*nWrites
@@ -0,0 +1,106 @@
+"""
+Tests for the shelter temperature index, the mean-max temperature, and the
+rolling window in TemperatureTracker.
+"""
+
+import time
+
+import pytest
+
+from shlThreads import HWg, Comet
+from shlFunctions import TemperatureTracker
+
+
+def _thermometer(id, *temps):
+    if len(temps) == 1:
+        device = Comet('10.0.0.%i' % id, 161, None, id)
+    else:
+        device = HWg('10.0.0.%i' % id, 161, None, id, nSensors=len(temps))
+    device.temp = list(temps)
+    device.alive.set()
+    return device
+
+
+def _update(tracker, device, *temps, maxAge=60.0):
+    device.temp = list(temps)
+    assert tracker.update(device, maxAge)
+
+
+def test_sensor_index():
+    first, second = _thermometer(1, 20.0, 21.0), _thermometer(2, 22.0)
+    tracker = TemperatureTracker()
+    tracker.setDevices([first, second])
+
+    assert tracker.getSensorCount() == 3
+    assert tracker.getDeviceSensors(first) == [1, 2]
+    assert tracker.getDeviceSensors(second) == [3]
+    assert not tracker.update(_thermometer(3, 20.0), 60.0)
+
+    _update(tracker, second, 22.0)
+    assert tracker.getSensor(3, DegreesF=False) == 22.0
+    assert tracker.getSensor(1) is None
+    with pytest.raises(IndexError):
+        tracker.getSensor(0)
+
+    ## Values are kept for devices still in the index
+    tracker.setDevices([second])
+    assert tracker.getSensor(1, DegreesF=False) == 22.0
+
+
+def test_mean_max():
+    first, second = _thermometer(1, 20.0, 22.0), _thermometer(2, 24.0)
+    tracker = TemperatureTracker()
+    tracker.setDevices([first, second])
+
+    _update(tracker, first, 20.0, 22.0)
+    _update(tracker, second, 24.0)
+    assert tracker.getMeanMax(DegreesF=False) == pytest.approx(22.0)
+    assert tracker.getMeanMax() == pytest.approx(71.6)
+
+    ## More than 10 F between the sensors reports the maximum
+    _update(tracker, second, 30.0)
+    assert tracker.getMeanMax(DegreesF=False) == 30.0
+
+    ## A stopped device no longer contributes
+    second.alive.clear()
+    _update(tracker, second, 30.0)
+    assert tracker.getMeanMax(DegreesF=False) == pytest.approx(21.0)
+
+
+def test_stale_values_expire():
+    device = _thermometer(1, 20.0)
+    tracker = TemperatureTracker()
+    tracker.setDevices([device])
+
+    _update(tracker, device, 20.0, maxAge=0.05)
+    assert tracker.getMeanMax(DegreesF=False) == 20.0
+    time.sleep(0.1)
+    assert tracker.getMeanMax() is None
+    assert tracker.getSensor(1) is None
+
+
+def test_window_min_max_mean():
+    device = _thermometer(1, 20.0)
+    tracker = TemperatureTracker()
+    tracker.setDevices([device])
+    assert tracker.getWindow() is None
+
+    for temp in (20.0, 25.0, 22.0, 21.0):
+        _update(tracker, device, temp)
+    assert tracker.getWindow(DegreesF=False) == pytest.approx((20.0, 25.0, 22.0))
+    assert tracker.getWindow() == pytest.approx((68.0, 77.0, 71.6))
+
+
+def test_window_drops_old_values():
+    device = _thermometer(1, 20.0)
+    tracker = TemperatureTracker(window=0.2)
+    tracker.setDevices([device])
+
+    _update(tracker, device, 30.0)
+    _update(tracker, device, 18.0)
+    time.sleep(0.25)
+    _update(tracker, device, 25.0)
+    _update(tracker, device, 24.0)
+
+    assert tracker.getWindow(DegreesF=False) == pytest.approx((24.0, 25.0, 24.5))
+    assert len(tracker.history) == 2